@@ -1,52 +1,115 @@
-import io
 import os
+import hmac
 import json
-import joblib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 import pandas as pd
 import numpy as np
-from PIL import Image
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, got_request_exception, request, jsonify, stream_with_context
 from flask_cors import CORS
-import tensorflow as tf
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import config
+from crop_batch import CropBatchError, iter_crop_results, parse_crop_rows, score_crop_rows
+from disease_backends import load_disease_backend
+from disease_batch import DiseaseBatchError, collect_uploads, preprocess_uploads, summarize_survey
+from disease_batcher import DynamicBatcher
+from disease_outputs import DiseaseLabels, apply_temperature, load_temperature, top_k
+from disease_result_cache import DiseaseResultCache, content_hash, perceptual_hash
+from feature_encoding import canonicalize, load_encoder
+from fertilizer_dose_index import DoseIndexLoader
+from forest_artifacts import forest_path_for, load_model
+from image_preprocessing import crop_resize, open_image, thread_buffer, to_float32
+from inference_executor import BoundedExecutor, ConcurrencyLimiter, Overloaded, limit_concurrency
+from model_registry import ModelRegistry, ModelUnavailable
+from request_metrics import Metrics
+from request_profiler import RequestProfiler
+from response_cache import ResponseCache, make_key, quantize
 
 app = Flask(__name__)
 CORS(app)
-def extract_crop_name(label):
-    label = label.lower()
+# Largest body any route accepts (a full crop batch or a field survey);
+# /predict_crop/batch lowers it to CROP_BATCH_MAX_BYTES for itself
+app.config["MAX_CONTENT_LENGTH"] = max(config.CROP_BATCH_MAX_BYTES,
+                                       int(config.DISEASE_SURVEY_MAX_MB * 1024 * 1024) + (1 << 20))
 
-    if "potato" in label: return "potato"
-    if "tomato" in label: return "tomato"
-    if "pepper" in label or "bell" in label: return "pepper"
-    if "grape" in label: return "grapes"
-    if "citrus" in label or "orange" in label: return "orange"
-    if "corn" in label or "maize" in label: return "maize"
 
-    return "unknown"
+# ---------------- Model Registry ----------------
+# Artifacts load in parallel background threads; routes wait for the ones
+# they need. TensorFlow is only imported when the disease model loads.
+# Each artifact is versioned by its files; changed ones are reloaded in the
+# background and swapped in atomically (MODEL_WATCH_ENABLED or
+# POST /admin/reload). Every request reads its artifacts from one registry
+# snapshot and reports their versions in the X-Model-Version header.
+models = ModelRegistry(max_workers=config.MODEL_LOAD_WORKERS)
+
+
+def forest_watch(pickle_path):
+    # The pickle plus its .forest export, which load_model prefers
+    return pickle_path, os.path.join(forest_path_for(pickle_path), "manifest.json")
 
 
 # ---------------- Crop Model ----------------
 CROP_MODEL_PATH = "models/crop_model.pkl"
-crop_model = joblib.load(CROP_MODEL_PATH)
+models.register("crop", lambda: load_model(CROP_MODEL_PATH, config.COMPACT_FORESTS),
+                watch=forest_watch(CROP_MODEL_PATH))
 
 # ---------------- Disease Model ----------------
 DISEASE_MODEL_PATH = "models/plant_disease_prediction_model.h5"
 CLASS_INDICES_PATH = "class_indices.json"
 DISEASE_SOLUTIONS_PATH = "disease_solutions.json"
 
-disease_model = tf.keras.models.load_model(DISEASE_MODEL_PATH) if os.path.exists(DISEASE_MODEL_PATH) else None
+DISEASE_BACKEND_PATHS = {
+    "keras": DISEASE_MODEL_PATH,
+    "tflite": config.DISEASE_TFLITE_PATH,
+    "onnx": config.DISEASE_ONNX_PATH,
+}
+
+DISEASE_ACTIVE_PATH = DISEASE_BACKEND_PATHS.get(config.DISEASE_BACKEND, DISEASE_MODEL_PATH)
+
+models.register("disease", lambda: load_disease_backend(
+    config.DISEASE_BACKEND,
+    DISEASE_MODEL_PATH,
+    tflite_path=config.DISEASE_TFLITE_PATH,
+    onnx_path=config.DISEASE_ONNX_PATH,
+    num_threads=config.DISEASE_BACKEND_THREADS,
+    intra_op_threads=config.TF_INTRA_OP_THREADS,
+    inter_op_threads=config.TF_INTER_OP_THREADS,
+), eager=not config.FAST_STARTUP, watch=(DISEASE_ACTIVE_PATH,), group="disease")
 
-if os.path.exists(CLASS_INDICES_PATH):
-    with open(CLASS_INDICES_PATH, "r") as f:
-        class_indices = json.load(f)
-    label_map = {v: k for k, v in class_indices.items()}
-else:
-    label_map = {}
 
-if os.path.exists(DISEASE_SOLUTIONS_PATH):
+def load_disease_solutions():
+    if not os.path.exists(DISEASE_SOLUTIONS_PATH):
+        return {}
     with open(DISEASE_SOLUTIONS_PATH, "r") as f:
-        disease_solutions = json.load(f)
-else:
-    disease_solutions = {}
+        return json.load(f)
+
+
+# Class names and the fitted temperature reload together with the model they belong to
+models.register("disease_labels", lambda: DiseaseLabels.from_file(CLASS_INDICES_PATH),
+                watch=(CLASS_INDICES_PATH,), group="disease")
+models.register("disease_calibration",
+                lambda: load_temperature(config.DISEASE_CALIBRATION_PATH) if config.DISEASE_CALIBRATION_ENABLED else None,
+                watch=(config.DISEASE_CALIBRATION_PATH,), group="disease")
+models.register("disease_solutions", load_disease_solutions, watch=(DISEASE_SOLUTIONS_PATH,))
+
+disease_batcher = DynamicBatcher(
+    lambda batch, model: model.predict(batch),
+    max_batch_size=config.DISEASE_BATCH_MAX_SIZE if config.DISEASE_BATCH_ENABLED else 1,
+    max_wait_ms=config.DISEASE_BATCH_MAX_WAIT_MS if config.DISEASE_BATCH_ENABLED else 0,
+    max_queue=config.DISEASE_QUEUE_MAX,
+    retry_after=config.OVERLOAD_RETRY_AFTER_S,
+)
+
+# Keyed to the registry's disease version; the swap listener below moves it on
+disease_cache = DiseaseResultCache(
+    max_bytes=config.DISEASE_CACHE_MAX_MB * 1024 * 1024,
+    use_phash=config.DISEASE_CACHE_PERCEPTUAL,
+    phash_max_distance=config.DISEASE_CACHE_PHASH_MAX_DISTANCE,
+    version=models.version("disease"),
+) if config.DISEASE_CACHE_ENABLED else None
 
 # ---------------- Fertilizer Model ----------------
 FERTILIZER_MODEL_PATH = "models/fertilizer_model.pkl"
@@ -54,97 +117,374 @@ SOIL_ENCODER_PATH = "models/soil_encoder.pkl"
 CROP_ENCODER_PATH = "models/crop_encoder.pkl"
 DOSE_CSV_PATH = "data/Fertilizer_dose.csv"
 
-fertilizer_model = joblib.load(FERTILIZER_MODEL_PATH)
-soil_encoder = joblib.load(SOIL_ENCODER_PATH)
-crop_encoder = joblib.load(CROP_ENCODER_PATH)
-dose_df = pd.read_csv(DOSE_CSV_PATH)
+# The model and its encoders are one unit: they always reload together
+models.register("fertilizer", lambda: load_model(FERTILIZER_MODEL_PATH, config.COMPACT_FORESTS),
+                watch=forest_watch(FERTILIZER_MODEL_PATH), group="fertilizer")
+# Encoders are compiled into dict lookups at load time (see feature_encoding.py)
+models.register("soil_encoder", lambda: load_encoder(SOIL_ENCODER_PATH, "soil"), watch=(SOIL_ENCODER_PATH,), group="fertilizer")
+models.register("crop_encoder", lambda: load_encoder(CROP_ENCODER_PATH, "crop"), watch=(CROP_ENCODER_PATH,), group="fertilizer")
+# Rebuilt on its own when the CSV changes (see fertilizer_dose_index.py)
+dose_index = DoseIndexLoader(DOSE_CSV_PATH, check_interval=config.DOSE_INDEX_CHECK_INTERVAL_S)
+
+
+def on_models_swapped(snapshot, names):
+    # Cached rows are raw softmax outputs: only the model itself invalidates them
+    if disease_cache and "disease" in names:
+        disease_cache.set_version(snapshot.version("disease"))
+
+
+models.on_swap(on_models_swapped)
+models.start()
+if config.MODEL_WATCH_ENABLED:
+    models.watch(config.MODEL_WATCH_INTERVAL_S)
+
+# ---------------- Backpressure ----------------
+# scikit-learn predictions run on a bounded executor per model (the disease
+# model has the batcher's bounded queue), and each route has its own
+# in-flight limit, so a burst of image uploads cannot starve the light
+# routes of request threads.
+inference_pools = {
+    "crop": BoundedExecutor("crop", config.CROP_INFERENCE_WORKERS, config.CROP_QUEUE_MAX,
+                            retry_after=config.OVERLOAD_RETRY_AFTER_S),
+    "fertilizer": BoundedExecutor("fertilizer", config.FERTILIZER_INFERENCE_WORKERS, config.FERTILIZER_QUEUE_MAX,
+                                  retry_after=config.OVERLOAD_RETRY_AFTER_S),
+}
+
+route_limits = {
+    name: ConcurrencyLimiter(name, limit, retry_after=config.OVERLOAD_RETRY_AFTER_S)
+    for name, limit in (
+        ("predict_crop", config.ROUTE_LIMIT_PREDICT_CROP),
+        ("predict_crop_batch", config.ROUTE_LIMIT_PREDICT_CROP_BATCH),
+        ("get_fertilizer", config.ROUTE_LIMIT_GET_FERTILIZER),
+        ("predict_disease", config.ROUTE_LIMIT_PREDICT_DISEASE),
+        ("predict_disease_batch", config.ROUTE_LIMIT_PREDICT_DISEASE_BATCH),
+    )
+}
+
+
+def run_inference(model_name, fn):
+    return inference_pools[model_name].run(fn, timeout=config.INFERENCE_TIMEOUT_S)
+
+
+# Image decoding for field-survey uploads (PIL releases the GIL while decoding)
+survey_pool = ThreadPoolExecutor(max_workers=config.DISEASE_SURVEY_WORKERS, thread_name_prefix="survey-preprocess")
+
+
+# ---------------- Prediction Cache ----------------
+prediction_cache = ResponseCache(
+    max_entries=config.PREDICTION_CACHE_MAX_ENTRIES,
+    ttl_s=config.PREDICTION_CACHE_TTL_S,
+    disk_path=config.PREDICTION_CACHE_DISK_PATH or None,
+) if config.PREDICTION_CACHE_ENABLED else None
+
+
+def cached_prediction(key, compute):
+    if prediction_cache is None:
+        return compute()
+    return prediction_cache.get_or_compute(key, compute)
+
+
+# ---------------- Metrics ----------------
+# Per-route and per-stage latency histograms plus error / mismatch
+# counters, served with the other components' stats on /metrics in
+# Prometheus text format.
+metrics = Metrics(enabled=config.METRICS_ENABLED)
+metrics.describe("request_seconds", "histogram", "Request latency by route")
+metrics.describe("stage_seconds", "histogram", "Latency of one stage of a route")
+metrics.describe("requests_total", "counter", "Requests by route and status code")
+metrics.describe("errors_total", "counter", "Errors by route and exception type")
+metrics.describe("crop_mismatches_total", "counter", "Disease predictions for a different crop than selected, by predicted crop")
+
+
+# ---------------- Profiling ----------------
+# Opt-in (PROFILING_ENABLED): samples the stacks of the prediction routes
+# and of the model worker threads serving them. Keeps a random
+# PROFILING_SAMPLE_RATE of requests plus every request slower than
+# PROFILING_SLOW_MS, with model versions and input size attached.
+# See GET /admin/profiles.
+profiler = RequestProfiler(
+    config.PROFILING_DIR,
+    sample_rate=config.PROFILING_SAMPLE_RATE,
+    slow_ms=config.PROFILING_SLOW_MS,
+    interval_ms=config.PROFILING_INTERVAL_MS,
+    max_profiles=config.PROFILING_MAX_PROFILES,
+) if config.PROFILING_ENABLED else None
+PROFILED_ROUTES = {r.strip() for r in config.PROFILING_ROUTES.split(",") if r.strip()}
+
+
+def profile_input():
+    # Request size, plus the row / image counts batch routes put in g.input_size
+    size = {"bytes": request.content_length or 0, "queryBytes": len(request.query_string)}
+    size.update(g.get("input_size", {}))
+    return size
+
+
+def stage(name):
+    return metrics.timer("stage_seconds", route=request.endpoint, stage=name)
+
+
+def count_error(e):
+    metrics.inc("errors_total", route=request.endpoint or "unmatched", type=type(e).__name__)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Everything this request reads from the registry comes from one generation
+    g.models = models.snapshot()
+    if profiler is not None and request.endpoint in PROFILED_ROUTES:
+        g.profile = profiler.begin()
+
+
+@app.after_request
+def record_request(response):
+    snapshot = g.get("models")
+    if snapshot is not None and snapshot.used:
+        response.headers["X-Model-Version"] = ", ".join(f"{n}={v}" for n, v in sorted(snapshot.used.items()))
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.endpoint or "unmatched"
+        metrics.observe("request_seconds", time.perf_counter() - started, route=route)
+        metrics.inc("requests_total", route=route, status=response.status_code)
+    capture = g.get("profile")
+    if capture is not None:
+        capture.meta.update(status=response.status_code, modelVersion=response.headers.get("X-Model-Version"))
+    return response
+
+
+@app.teardown_request
+def finish_profile(exc):
+    # Runs after a streamed body has been sent, so the profile covers it
+    capture = g.pop("profile", None)
+    if capture is not None:
+        profiler.end(capture, route=request.endpoint, method=request.method, path=request.path,
+                     input=profile_input(), **({"error": type(exc).__name__} if exc else {}))
+
+
+# Exceptions no route or errorhandler caught (Flask's plain 500)
+got_request_exception.connect(lambda sender, exception, **extra: count_error(exception), app, weak=False)
+
+
+def collect_component_metrics():
+    families = []
+    status = models.status()
+    families.append(("model_ready", "gauge", "1 once the model has loaded",
+                     [({"model": name}, int(m["state"] == "ready")) for name, m in status.items()]))
+    families.append(("model_load_seconds", "gauge", "Time the model took to load",
+                     [({"model": name}, m.get("loadSeconds")) for name, m in status.items()]))
+    families.append(("model_version_info", "gauge", "Version (file fingerprint) of the model being served",
+                     [({"model": name, "version": m["version"]}, 1) for name, m in status.items()]))
+    families.append(("model_reloads_total", "counter", "Hot reloads swapped in per model",
+                     [({"model": name}, models.reloads.get(name, 0)) for name in status]))
+    families.append(("model_reload_failures_total", "counter", "Hot reloads that failed and kept the old version",
+                     [({"model": name}, models.reload_failures.get(name, 0)) for name in status]))
+    families.append(("model_generation", "gauge", "Registry generation, bumped by every swap",
+                     [({}, models.generation)]))
+
+    lookups, evictions, entries = [], [], []
+    for cache_name, cache in (("predictions", prediction_cache), ("disease", disease_cache)):
+        if cache is None:
+            continue
+        st = cache.stats()
+        for result, field in (("hit", "hits"), ("disk_hit", "diskHits"), ("perceptual_hit", "perceptualHits"),
+                              ("miss", "misses")):
+            if field in st:
+                lookups.append(({"cache": cache_name, "result": result}, st[field]))
+        evictions.append(({"cache": cache_name}, st["evictions"]))
+        entries.append(({"cache": cache_name}, st["entries"]))
+    families.append(("cache_lookups_total", "counter", "Cache lookups by result", lookups))
+    families.append(("cache_evictions_total", "counter", "Entries evicted to stay within the cache size", evictions))
+    families.append(("cache_entries", "gauge", "Entries currently cached", entries))
+
+    batcher = disease_batcher.stats()
+    families.append(("disease_batches_total", "counter", "Forward passes run by the disease batcher",
+                     [({}, batcher["batches"])]))
+    families.append(("disease_batch_items_total", "counter", "Images classified by the disease batcher",
+                     [({}, batcher["items"])]))
+    families.append(("disease_batches_by_size_total", "counter", "Disease forward passes by batch size",
+                     [({"size": size}, count) for size, count in batcher["batchSizeHistogram"].items()]))
+    families.append(("disease_queue_depth", "gauge", "Images waiting for the disease batcher",
+                     [({}, batcher["queueDepth"])]))
+    families.append(("disease_queue_rejected_total", "counter", "Images rejected because the disease queue was full",
+                     [({}, batcher["rejected"])]))
+
+    pools = {name: pool.stats() for name, pool in inference_pools.items()}
+    families.append(("inference_in_flight", "gauge", "Queued plus running jobs per inference executor",
+                     [({"model": name}, st["inFlight"]) for name, st in pools.items()]))
+    families.append(("inference_rejected_total", "counter", "Jobs rejected because the executor queue was full",
+                     [({"model": name}, st["rejected"]) for name, st in pools.items()]))
+    families.append(("inference_timeouts_total", "counter", "Jobs that did not finish within INFERENCE_TIMEOUT_S",
+                     [({"model": name}, st["timeouts"]) for name, st in pools.items()]))
+
+    limits = {name: limiter.stats() for name, limiter in route_limits.items()}
+    families.append(("route_active_requests", "gauge", "Requests in flight per limited route",
+                     [({"route": name}, st["active"]) for name, st in limits.items()]))
+    families.append(("route_rejected_total", "counter", "Requests rejected by the route concurrency limit",
+                     [({"route": name}, st["rejected"]) for name, st in limits.items()]))
+
+    if profiler is not None:
+        families.append(("profiles_captured_total", "counter", "Request profiles kept, by reason (sampled / slow)",
+                         [({"reason": reason}, n) for reason, n in profiler.stats()["kept"].items()]))
+    return families
+
+
+metrics.add_collector(collect_component_metrics)
+
 
 # ---------------- Routes ----------------
+@app.errorhandler(ModelUnavailable)
+def model_unavailable(e):
+    count_error(e)
+    response = jsonify({"error": str(e), "model": e.name, "state": e.state})
+    response.headers["Retry-After"] = str(config.MODEL_RETRY_AFTER_S)
+    return response, 503
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    count_error(e)
+    return jsonify({"error": "Request body too large", "maxBytes": request.max_content_length}), 413
+
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    count_error(e)
+    response = jsonify({"error": str(e), "name": e.name})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, e.status
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    status = models.status()
+    required_ready = all(m["state"] == "ready" for m in status.values() if m["eager"])
+    failed = any(m["state"] == "failed" for m in status.values())
+    return jsonify({
+        "status": "degraded" if failed else "ok" if required_ready else "loading",
+        "models": status
+    }), 200 if required_ready else 503
+
+
 @app.route("/predict_crop", methods=["POST"])
+@limit_concurrency(route_limits["predict_crop"])
 def predict_crop():
-    data = request.get_json()
     required = ['N', 'P', 'K', 'temperature', 'humidity', 'ph']
-    if not data or any(k not in data for k in required):
-        return jsonify({"error": "Missing fields", "required": required}), 400
+    with stage("parse"):
+        data = request.get_json()
+        if not data or any(k not in data for k in required):
+            return jsonify({"error": "Missing fields", "required": required}), 400
+
+        values = [quantize(data[k], config.PREDICTION_CACHE_DECIMALS) for k in required]
+
+    # Wait for the model here, not on an inference worker: during a cold
+    # start or reload that would tie up the executor with idle waiters
+    crop_model = g.models.get("crop", timeout=config.MODEL_WAIT_TIMEOUT_S)
+
+    def compute():
+        if hasattr(crop_model, "predict_row"):
+            # Compact forest: single-row fast path, no DataFrame
+            return str(crop_model.predict_row(values))
+        row = pd.DataFrame([dict(zip(required, values))])
+        return str(crop_model.predict(row)[0])
+
+    with stage("inference"):
+        pred = cached_prediction(make_key("crop", g.models.version("crop"), *values),
+                                 lambda: run_inference("crop", compute))
+    with stage("serialize"):
+        return jsonify({"prediction": pred})
+
+
+@app.route("/predict_crop/batch", methods=["POST"])
+@limit_concurrency(route_limits["predict_crop_batch"])
+def predict_crop_batch():
+    request.max_content_length = config.CROP_BATCH_MAX_BYTES
+    try:
+        with stage("parse"):
+            top_k = int(request.args.get('top_k', config.CROP_BATCH_DEFAULT_TOP_K))
+            X = parse_crop_rows(request.get_data(), request.content_type, config.CROP_BATCH_MAX_ROWS)
+            g.input_size = {"rows": len(X)}
+    except CropBatchError as e:
+        count_error(e)
+        return jsonify({"error": str(e), **e.details}), e.status
+    except ValueError as e:
+        count_error(e)
+        return jsonify({"error": f"Invalid top_k: {str(e)}"}), 400
 
-    row = pd.DataFrame([{
-        'N': float(data['N']),
-        'P': float(data['P']),
-        'K': float(data['K']),
-        'temperature': float(data['temperature']),
-        'humidity': float(data['humidity']),
-        'ph': float(data['ph'])
-    }])
+    crop_model = g.models.get("crop", timeout=config.MODEL_WAIT_TIMEOUT_S)
+    with stage("inference"):
+        predictions, top_labels, top_proba = run_inference("crop", lambda: score_crop_rows(crop_model, X, top_k))
 
-    pred = crop_model.predict(row)
-    return jsonify({"prediction": str(pred[0])})
+    # NDJSON unless the client asks for a single JSON document
+    as_ndjson = request.args.get('format', 'ndjson').lower() != 'json'
+    return Response(
+        stream_with_context(iter_crop_results(predictions, top_labels, top_proba, as_ndjson)),
+        mimetype="application/x-ndjson" if as_ndjson else "application/json"
+    )
 
 
 @app.route("/get_fertilizer", methods=["GET"])
+@limit_concurrency(route_limits["get_fertilizer"])
 def get_fertilizer():
-    crop_type = request.args.get('crop', '').strip().lower()
-    soil_type = request.args.get('soil', 'loam').strip().lower()
-    land_size = float(request.args.get('landSize', 1))
-    land_unit = request.args.get('landUnit', 'hectares').lower()
-    
-    # Get actual NPK values from request
-    nitrogen = float(request.args.get('nitrogen', 60))
-    phosphorus = float(request.args.get('phosphorus', 40))
-    potassium = float(request.args.get('potassium', 30))
-
-    # Convert land size to hectares
-    if land_unit == "acres":
-        land_ha = land_size * 0.404686
-    elif land_unit == "sq_m":
-        land_ha = land_size / 10000
-    else:
-        land_ha = land_size
+    with stage("parse"):
+        crop_type = request.args.get('crop', '').strip().lower()
+        soil_type = request.args.get('soil', 'loam').strip().lower()
+        land_size = float(request.args.get('landSize', 1))
+        land_unit = request.args.get('landUnit', 'hectares').lower()
+
+        # Get actual NPK values from request
+        nitrogen = quantize(request.args.get('nitrogen', 60), config.PREDICTION_CACHE_DECIMALS)
+        phosphorus = quantize(request.args.get('phosphorus', 40), config.PREDICTION_CACHE_DECIMALS)
+        potassium = quantize(request.args.get('potassium', 30), config.PREDICTION_CACHE_DECIMALS)
+
+        # Convert land size to hectares
+        if land_unit == "acres":
+            land_ha = land_size * 0.404686
+        elif land_unit == "sq_m":
+            land_ha = land_size / 10000
+        else:
+            land_ha = land_size
+
+    fertilizer_model = g.models.get("fertilizer", timeout=config.MODEL_WAIT_TIMEOUT_S)
+    soil_encoder = g.models.get("soil_encoder", timeout=config.MODEL_WAIT_TIMEOUT_S)
+    crop_encoder = g.models.get("crop_encoder", timeout=config.MODEL_WAIT_TIMEOUT_S)
+    fertilizer_version = g.models.version("fertilizer", "soil_encoder", "crop_encoder")
 
     try:
-        # Encode categorical variables
-        encoded_soil = soil_encoder.transform([soil_type])[0]
-        encoded_crop = crop_encoder.transform([crop_type])[0]
-        
-        # Use actual NPK values from farmer's soil data
-        X_new = [[encoded_soil, encoded_crop, nitrogen, phosphorus, potassium]]
-        
-        # Predict fertilizer
-        predicted_fertilizer = fertilizer_model.predict(X_new)[0]
-
-        # Get ALL fertilizer options for this crop from CSV
-        all_crop_fertilizers = dose_df[
-            dose_df['Crop Type'].str.lower().str.strip() == crop_type
-        ]
-
-        if all_crop_fertilizers.empty:
-            return jsonify({
-                "error": f"No fertilizer data available for crop: {crop_type}",
-                "availableCrops": dose_df['Crop Type'].unique().tolist()
-            }), 404
-
-        # Separate organic and chemical fertilizers
-        organic_options = []
-        chemical_options = []
-
-        for _, row in all_crop_fertilizers.iterrows():
-            fert_type = str(row.get('Fertilizer Type', '')).strip().lower()
-            
-            fert_data = {
-                "name": row['Fertilizer Name'],
-                "type": row.get('Fertilizer Type', 'N/A'),
-                "N": round(row['N (kg/ha)'] * land_ha, 2),
-                "P": round(row['P (kg/ha)'] * land_ha, 2),
-                "K": round(row['K (kg/ha)'] * land_ha, 2),
-                "notes": row.get('Notes', ''),
-                "nPerHa": row['N (kg/ha)'],
-                "pPerHa": row['P (kg/ha)'],
-                "kPerHa": row['K (kg/ha)']
-            }
-            
-            if fert_type == 'organic':
-                organic_options.append(fert_data)
-            else:
-                chemical_options.append(fert_data)
+        # Encode categorical variables: dict lookups that also accept spelling
+        # variants and aliases ("sandy_loam", "corn"); from here on the
+        # names are the ones the model was trained on
+        encoded_soil = soil_encoder.encode(soil_type)
+        encoded_crop = crop_encoder.encode(crop_type)
+        soil_type = soil_encoder.classes[encoded_soil]
+        crop_type = crop_encoder.classes[encoded_crop]
+
+        def compute():
+            # Use actual NPK values from farmer's soil data
+            X_new = [[encoded_soil, encoded_crop, nitrogen, phosphorus, potassium]]
+
+            # Predict fertilizer
+            if hasattr(fertilizer_model, "predict_row"):
+                return str(fertilizer_model.predict_row(X_new[0]))
+            return str(fertilizer_model.predict(X_new)[0])
+
+        with stage("inference"):
+            predicted_fertilizer = cached_prediction(
+                make_key("fertilizer", fertilizer_version, soil_type, crop_type, nitrogen, phosphorus, potassium),
+                lambda: run_inference("fertilizer", compute)
+            )
+
+        # Get ALL fertilizer options for this crop from the dose index
+        # One dose_lookup observation per request. Organic and chemical
+        # fertilizers are pre-split in the index.
+        with stage("dose_lookup"):
+            doses_by_crop = dose_index.get()
+            doses = doses_by_crop.get(crop_type)
+            if doses is None:
+                return jsonify({
+                    "error": f"No fertilizer data available for crop: {crop_type}",
+                    "availableCrops": list(doses_by_crop.available_crops)
+                }), 404
+            organic_options, chemical_options = doses.scaled(land_ha)
 
         # Build comprehensive result
         result = {
@@ -165,58 +505,109 @@ def get_fertilizer():
                 "K": potassium
             }
         }
-        
-        return jsonify(result)
-        
+
+        with stage("serialize"):
+            return jsonify(result)
+
     except ValueError as e:
+        count_error(e)
         return jsonify({
             "error": f"Invalid crop or soil type: {str(e)}",
-            "validCrops": list(crop_encoder.classes_),
-            "validSoils": list(soil_encoder.classes_)
+            "validCrops": crop_encoder.valid_values,
+            "validSoils": soil_encoder.valid_values
         }), 400
+    except Overloaded:
+        raise
     except Exception as e:
+        count_error(e)
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
 
 
 
 @app.route("/predict_disease", methods=["POST"])
+@limit_concurrency(route_limits["predict_disease"])
 def predict_disease():
+    # Validate the request before waiting for the model: on a cold
+    # FAST_STARTUP worker that wait includes importing TensorFlow.
+    # top_k (query or form field) adds the k best classes as topPredictions
+    requested_k = request.values.get("top_k")
     try:
-        file = request.files["image"]
-        user_crop = request.form.get("user_crop", "").lower()
-
-        if not file or disease_model is None:
-            return jsonify({"error": "No image uploaded or disease model missing"}), 400
-
-        image = Image.open(io.BytesIO(file.read())).convert("RGB")
-
-        # FIXED Cropping
-        w, h = image.size
-        min_dim = min(w, h)
-        image = image.crop((
-            (w - min_dim) / 2,
-            (h - min_dim) / 2,
-            (w + min_dim) / 2,
-            (h + min_dim) / 2,
-        ))
-
-        image = image.resize((224, 224))
-        img_array = np.expand_dims(np.array(image) / 255.0, axis=0)
-
-        # Model Prediction
-        predictions = disease_model.predict(img_array)
-        predicted_class = str(np.argmax(predictions))
-        confidence = float(np.max(predictions) * 100)
-        disease_name = label_map.get(int(predicted_class), "Unknown")
+        k = int(requested_k) if requested_k else 1
+        if k < 1:
+            raise ValueError("must be at least 1")
+    except ValueError as e:
+        count_error(e)
+        return jsonify({"error": f"Invalid top_k: {str(e)}"}), 400
+
+    with stage("upload"):
+        file = request.files.get("image")
+        if not file:
+            return jsonify({"error": "No image uploaded"}), 400
+        # Same spelling rules (case, spacing, aliases such as corn -> maize) as the batch route
+        user_crop = canonicalize(request.form.get("user_crop", ""), "crop")
+        image_bytes = file.read()
+
+    disease_model = g.models.get("disease", timeout=config.DISEASE_MODEL_WAIT_TIMEOUT_S)
+    labels = g.models.get("disease_labels", timeout=config.MODEL_WAIT_TIMEOUT_S)
+    temperature = g.models.get("disease_calibration", timeout=config.MODEL_WAIT_TIMEOUT_S)
+    disease_version = g.models.version("disease")
+    if disease_model is None:
+        return jsonify({"error": "Disease model missing"}), 400
 
-        # Extract crop from prediction
-        predicted_crop = extract_crop_name(disease_name)
+    try:
+        with stage("cache_lookup"):
+            cache_key = content_hash(image_bytes) if disease_cache else None
+            predictions = disease_cache.get(cache_key, disease_version) if disease_cache else None
+
+        if predictions is None:
+            with stage("decode"):
+                image = open_image(image_bytes)
+
+            phash = None
+            if disease_cache and disease_cache.use_phash:
+                with stage("cache_lookup"):
+                    phash = perceptual_hash(image)
+                    predictions = disease_cache.get_similar(phash, disease_version)
+
+        if predictions is None:
+            # Center crop + resize in one pass, into this thread's float32 buffer
+            with stage("preprocess"):
+                img_array = to_float32(crop_resize(image), out=thread_buffer())
+
+            # Model Prediction (grouped with concurrent requests by the batcher)
+            with stage("inference"):
+                predictions = disease_batcher.submit(img_array, timeout=config.DISEASE_BATCH_TIMEOUT_S,
+                                                     model=disease_model)
+
+            if disease_cache:
+                disease_cache.record_miss()
+                disease_cache.put(cache_key, predictions, phash, disease_version)
+
+        # Temperature scaling keeps the ranking; one partial selection gives top-1 and top-k
+        probs = apply_temperature(predictions, temperature)
+        top_classes, top_probs = top_k(probs, min(k, config.DISEASE_MAX_TOP_K))
+        best = int(top_classes[0])
+        confidence = float(top_probs[0] * 100)
+        disease_name = labels.name(best)
+
+        # Crop of the predicted class (precomputed per class)
+        predicted_crop = labels.crop(best)
+
+        extra = {}
+        if requested_k:
+            extra["topPredictions"] = [
+                {"prediction": labels.name(c), "confidence": float(p * 100), "crop": labels.crop(c)}
+                for c, p in zip(top_classes.tolist(), top_probs)
+            ]
+        if temperature:
+            extra["calibrated"] = True
 
         # -------------------------------
         # CROP MISMATCH HANDLING
         # -------------------------------
         if user_crop and predicted_crop != user_crop:
+            metrics.inc("crop_mismatches_total", predicted=predicted_crop)
             return jsonify({
                 "error": "crop_mismatch",
                 "predictedCrop": predicted_crop,
@@ -228,13 +619,15 @@ def predict_disease():
                     "Model confusion due to similar symptoms",
                     "Unclear or blurry leaf image",
                     "Leaf from a different variety",
-                ]
+                ],
+                **extra
             }), 200
 
         # Normal prediction handling
+        disease_solutions = g.models.get("disease_solutions", timeout=config.MODEL_WAIT_TIMEOUT_S)
         if disease_name in disease_solutions:
             solution = disease_solutions[disease_name]
-        elif "healthy" in disease_name.lower():
+        elif labels.is_healthy(best):
             solution = {
                 "type": "None",
                 "solution": "Crop is healthy.",
@@ -247,15 +640,204 @@ def predict_disease():
                 "organic": ""
             }
 
-        return jsonify({
-            "prediction": disease_name,
-            "solution": solution,
-            "confidence": confidence,
-            "detectedCrop": predicted_crop 
-        })
+        with stage("serialize"):
+            return jsonify({
+                "prediction": disease_name,
+                "solution": solution,
+                "confidence": confidence,
+                "detectedCrop": predicted_crop,
+                **extra
+            })
 
+    except (Overloaded, ModelUnavailable):
+        raise
     except Exception as e:
+        count_error(e)
         return jsonify({"error": str(e)}), 500
 
+
+@app.route("/predict_disease/batch", methods=["POST"])
+@limit_concurrency(route_limits["predict_disease_batch"])
+def predict_disease_batch():
+    # Field survey: many leaf photos of one plot (files and/or zip archives).
+    # The upload is validated before waiting for the model, as in predict_disease.
+    try:
+        with stage("upload"):
+            user_crop = canonicalize(request.form.get("user_crop", ""), "crop")
+            k = int(request.values.get("top_k") or 1)
+            if k < 1:
+                raise ValueError("top_k must be at least 1")
+            files = [f for field in request.files for f in request.files.getlist(field)]
+            uploads = collect_uploads(files, config.DISEASE_SURVEY_MAX_IMAGES,
+                                      int(config.DISEASE_SURVEY_MAX_MB * 1024 * 1024))
+            g.input_size = {"images": len(uploads)}
+    except DiseaseBatchError as e:
+        count_error(e)
+        return jsonify({"error": str(e), **e.details}), e.status
+    except ValueError as e:
+        count_error(e)
+        return jsonify({"error": f"Invalid top_k: {str(e)}"}), 400
+
+    disease_model = g.models.get("disease", timeout=config.DISEASE_MODEL_WAIT_TIMEOUT_S)
+    labels = g.models.get("disease_labels", timeout=config.MODEL_WAIT_TIMEOUT_S)
+    temperature = g.models.get("disease_calibration", timeout=config.MODEL_WAIT_TIMEOUT_S)
+    disease_version = g.models.version("disease")
+
+    # Softmax rows in upload order; cached photos skip decoding and the model
+    rows = [None] * len(uploads)
+    if disease_cache:
+        with stage("cache_lookup"):
+            keys = [content_hash(data) for _, data in uploads]
+            rows = [disease_cache.get(key, disease_version) for key in keys]
+    todo = [i for i, row in enumerate(rows) if row is None]
+
+    errors = {}
+    if todo:
+        with stage("preprocess"):
+            block, ok, failed = preprocess_uploads([uploads[i] for i in todo], survey_pool)
+        errors = {todo[j]: message for j, message in failed.items()}
+        scored = [i for i, good in zip(todo, ok.tolist()) if good]
+        if scored:
+            # The whole survey is one forward pass
+            with stage("inference"):
+                outputs = disease_batcher.submit_batch(block, timeout=config.DISEASE_BATCH_TIMEOUT_S,
+                                                       model=disease_model)
+            for i, probs in zip(scored, outputs):
+                rows[i] = probs
+                if disease_cache:
+                    disease_cache.record_miss()
+                    disease_cache.put(keys[i], probs, None, disease_version)
+
+    readable = [i for i, row in enumerate(rows) if row is not None]
+    if not readable:
+        return jsonify({
+            "error": "None of the uploaded images could be read",
+            "results": [{"image": uploads[i][0], "error": errors[i]} for i in sorted(errors)],
+        }), 400
+
+    probs = apply_temperature(np.stack([rows[i] for i in readable]), temperature)
+    per_image, summary = summarize_survey(probs, labels, user_crop, min(k, config.DISEASE_MAX_TOP_K))
+    if user_crop:
+        mismatched = [r["crop"] for r in per_image if r["cropMismatch"]]
+        for crop, count in zip(*np.unique(mismatched, return_counts=True)) if mismatched else ():
+            metrics.inc("crop_mismatches_total", int(count), predicted=str(crop))
+
+    results = [{"image": name} for name, _ in uploads]
+    for i, result in zip(readable, per_image):
+        results[i].update(result)
+    for i, message in errors.items():
+        results[i]["error"] = message
+    summary["failed"] = len(errors)
+
+    with stage("serialize"):
+        response = {"results": results, "summary": summary}
+        if temperature:
+            response["calibrated"] = True
+        return jsonify(response)
+
+
+# ---------------- Admin ----------------
+def admin_only(view):
+    # X-Admin-Token must match ADMIN_TOKEN. Without a token: denied, or
+    # localhost only with ADMIN_ALLOW_LOCALHOST
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if config.ADMIN_TOKEN:
+            allowed = hmac.compare_digest(request.headers.get("X-Admin-Token", ""), config.ADMIN_TOKEN)
+        else:
+            allowed = config.ADMIN_ALLOW_LOCALHOST and request.remote_addr in ("127.0.0.1", "::1")
+        if not allowed:
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.route("/admin/reload", methods=["POST"])
+@admin_only
+def admin_reload():
+    # ?model=crop,fertilizer (default: all), ?force=1 reloads unchanged files too,
+    # ?wait=0 returns at once and reloads in the background
+    names = [n.strip() for n in request.args.get("model", "").split(",") if n.strip()] or None
+    unknown = sorted(set(names or []) - set(models.status()))
+    if unknown:
+        return jsonify({"error": f"Unknown model(s): {', '.join(unknown)}", "models": sorted(models.status())}), 400
+
+    force = request.args.get("force", "0").lower() in ("1", "true", "yes")
+    if request.args.get("wait", "1").lower() in ("0", "false", "no"):
+        threading.Thread(target=models.reload, kwargs={"names": names, "force": force},
+                         name="model-reload", daemon=True).start()
+        return jsonify({"status": "reloading"}), 202
+
+    result = models.reload(names, force=force, timeout=config.DISEASE_MODEL_WAIT_TIMEOUT_S)
+    return jsonify({**result, "models": models.status()}), 500 if result.get("error") else 200
+
+
+@app.route("/admin/profiles", methods=["GET"])
+@admin_only
+def admin_profiles():
+    # Newest first; ?limit=50, ?route=predict_disease, ?reason=slow|sampled
+    if profiler is None:
+        return jsonify({"error": "Profiling is disabled (PROFILING_ENABLED=0)"}), 404
+    try:
+        limit = int(request.args.get("limit", 50))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid limit: {str(e)}"}), 400
+    profiles = profiler.list(limit, route=request.args.get("route"), reason=request.args.get("reason"))
+    return jsonify({"profiles": profiles, **profiler.stats()})
+
+
+@app.route("/admin/profiles/<profile_id>", methods=["GET"])
+@admin_only
+def admin_profile(profile_id):
+    # ?format=speedscope (default; open in speedscope.app) or collapsed
+    # (flamegraph.pl / inferno input)
+    if profiler is None:
+        return jsonify({"error": "Profiling is disabled (PROFILING_ENABLED=0)"}), 404
+    fmt = request.args.get("format", "speedscope").lower()
+    if fmt not in ("speedscope", "collapsed"):
+        return jsonify({"error": f"Unknown format '{fmt}'", "formats": ["speedscope", "collapsed"]}), 400
+    loaded = profiler.load(profile_id, fmt)
+    if loaded is None:
+        return jsonify({"error": f"Unknown profile '{profile_id}'"}), 404
+
+    _, body = loaded
+    if fmt == "collapsed":
+        response = Response(body, mimetype="text/plain")
+        filename = f"{profile_id}.collapsed.txt"
+    else:
+        response = Response(body, mimetype="application/json")
+        filename = f"{profile_id}.speedscope.json"
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@app.route("/metrics/disease_batcher", methods=["GET"])
+def disease_batcher_metrics():
+    return jsonify(disease_batcher.stats())
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/metrics/inference", methods=["GET"])
+def inference_metrics():
+    return jsonify({
+        "executors": {name: pool.stats() for name, pool in inference_pools.items()},
+        "routes": {name: limiter.stats() for name, limiter in route_limits.items()},
+        "disease": {k: v for k, v in disease_batcher.stats().items() if k in ("maxQueue", "queueDepth", "rejected")}
+    })
+
+
+@app.route("/metrics/cache", methods=["GET"])
+def cache_metrics():
+    return jsonify({
+        "predictions": prediction_cache.stats() if prediction_cache else None,
+        "disease": disease_cache.stats() if disease_cache else None
+    })
+
 if __name__ == "__main__":
+    if not config.FAST_STARTUP:
+        models.wait()
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,399 @@
+# bench_api.py
+#
+# Reproducible benchmark of the three inference paths (/predict_crop,
+# /get_fertilizer, /predict_disease), through Flask's test client and over
+# real HTTP (serve.py). Reports p50/p95/p99 latency, throughput, peak RSS
+# and startup time, saves them as JSON and can fail on regressions against
+# an earlier run.
+#   python bench_api.py --output bench.json
+#   python bench_api.py --baseline bench.json --output bench_new.json
+#   python bench_api.py --transport http --concurrency 8 --requests 500
+#
+# Payloads are drawn with fixed seeds from data/*.csv and
+# potato-diseases.jpg (or a synthetic JPEG with --synthetic-image), and the
+# prediction caches are off unless --with-caches is given, so every request
+# reaches the models. Each transport runs in a fresh process so startup
+# time and peak RSS are measured from scratch.
+# Latency and throughput count successful requests only; failed ones are
+# checked separately against --max-error-rate (default 0).
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from load_test import crop_payloads, fertilizer_queries, multipart_image, wait_healthy
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ("crop", "fertilizer", "disease")
+
+# Regression checks: (metric, direction); "up" means larger is worse
+CHECKS = {
+    "p50Ms": ("latency", "up"),
+    "p95Ms": ("latency", "up"),
+    "p99Ms": ("latency", "up"),
+    "rps": ("throughput", "down"),
+}
+
+
+def peak_rss_mb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def process_tree(pid):
+    # gunicorn master plus its workers
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for child in f.read().split():
+                pids.extend(process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def build_payloads(endpoint, image_path, n=500):
+    if endpoint == "crop":
+        return [("POST", "/predict_crop", p.encode(), "application/json") for p in crop_payloads(n)]
+    if endpoint == "fertilizer":
+        return [("GET", f"/get_fertilizer?{q}", None, None) for q in fertilizer_queries(n)]
+    body, content_type = multipart_image(image_path)
+    return [("POST", "/predict_disease", body, content_type)]
+
+
+def drive(send, payloads, requests, concurrency):
+    # `requests` calls spread over `concurrency` threads, payloads round-robin.
+    # Latency and throughput count successful requests only: a fast 429 or
+    # 503 must not look like a speed-up.
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        local = []
+        local_errors = 0
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = send(payloads[i % len(payloads)])
+            except (urllib.error.URLError, OSError):
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - start)
+            else:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    stat = (lambda fn: float(fn(lat))) if lat.size else (lambda fn: None)
+    return {
+        "requests": requests,
+        "errors": errors[0],
+        "errorRate": errors[0] / requests if requests else 0.0,
+        "concurrency": concurrency,
+        "rps": lat.size / elapsed if elapsed else 0.0,
+        "p50Ms": stat(lambda x: np.percentile(x, 50)),
+        "p95Ms": stat(lambda x: np.percentile(x, 95)),
+        "p99Ms": stat(lambda x: np.percentile(x, 99)),
+        "meanMs": stat(np.mean),
+    }
+
+
+def run_endpoints(make_send, args, image_path):
+    results = {}
+    for endpoint in args.endpoints:
+        payloads = build_payloads(endpoint, image_path)
+        send = make_send()
+        requests = args.disease_requests if endpoint == "disease" else args.requests
+        drive(send, payloads, min(args.warmup, requests), 1)
+        results[endpoint] = drive(send, payloads, requests, args.concurrency)
+    return results
+
+
+# ---------------- Test client (in-process) ----------------
+def run_test_client(args, image_path):
+    start = time.perf_counter()
+    sys.path.insert(0, BASE_DIR)
+    os.chdir(BASE_DIR)
+    from app import app, models
+
+    models.wait()
+    startup = time.perf_counter() - start
+
+    local = threading.local()
+
+    def make_send():
+        def send(payload):
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = app.test_client()
+            method, path, body, content_type = payload
+            if method == "GET":
+                response = client.get(path)
+            else:
+                response = client.post(path, data=body, content_type=content_type)
+            return response.status_code < 400
+        return send
+
+    disease_warmup = None
+    if "disease" in args.endpoints:
+        t = time.perf_counter()
+        make_send()(build_payloads("disease", image_path)[0])
+        disease_warmup = time.perf_counter() - t
+
+    endpoints = run_endpoints(make_send, args, image_path)
+    return {
+        "startupS": startup,
+        "diseaseWarmupS": disease_warmup,
+        "peakRssMB": peak_rss_mb(),
+        "endpoints": endpoints,
+    }
+
+
+# ---------------- HTTP (serve.py) ----------------
+def run_http(args, image_path, env):
+    base_url = f"http://127.0.0.1:{args.port}"
+    cmd = [sys.executable, os.path.join(BASE_DIR, "serve.py"), "--bind", f"127.0.0.1:{args.port}",
+           "--workers", str(args.workers), "--threads", str(args.threads)]
+    start = time.perf_counter()
+    server = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_healthy(base_url)
+        startup = time.perf_counter() - start
+
+        def make_send():
+            def send(payload):
+                method, path, body, content_type = payload
+                headers = {"Content-Type": content_type} if content_type else {}
+                req = urllib.request.Request(base_url + path, data=body, method=method, headers=headers)
+                try:
+                    with urllib.request.urlopen(req, timeout=60) as resp:
+                        resp.read()
+                        return resp.status < 400
+                except urllib.error.HTTPError as e:
+                    e.read()
+                    return False
+            return send
+
+        disease_warmup = None
+        if "disease" in args.endpoints:
+            t = time.perf_counter()
+            make_send()(build_payloads("disease", image_path)[0])
+            disease_warmup = time.perf_counter() - t
+
+        endpoints = run_endpoints(make_send, args, image_path)
+        # Peak of the biggest process and the whole tree (master + workers)
+        peaks = [p for p in (peak_rss_mb(pid) for pid in process_tree(server.pid)) if p is not None]
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        "startupS": startup,
+        "diseaseWarmupS": disease_warmup,
+        "peakRssMB": max(peaks) if peaks else None,
+        "peakRssTotalMB": sum(peaks) if peaks else None,
+        "workers": args.workers,
+        "endpoints": endpoints,
+    }
+
+
+# ---------------- Regression check ----------------
+def error_rate(endpoint):
+    # Results saved before errorRate was recorded only have the counts
+    if "errorRate" in endpoint:
+        return endpoint["errorRate"]
+    return endpoint["errors"] / endpoint["requests"] if endpoint.get("requests") else 0.0
+
+
+def compare(baseline, current, tolerances, max_error_rate=0.0):
+    failures = []
+    rows = []
+    for transport, cur in current["results"].items():
+        # Failed requests are excluded from latency/throughput, so they are
+        # checked on their own, against an absolute limit
+        for ep, c in cur["endpoints"].items():
+            name = f"{transport}/{ep}/errorRate"
+            old = error_rate(baseline.get("results", {}).get(transport, {}).get("endpoints", {}).get(ep, c))
+            new = error_rate(c)
+            failed = new > max_error_rate
+            rows.append((name, old, new, new - old, failed))
+            if failed:
+                failures.append(name)
+
+        base = baseline.get("results", {}).get(transport)
+        if not base:
+            continue
+        pairs = [(f"{transport}/{ep}/{metric}", b.get(metric), c.get(metric), CHECKS[metric])
+                 for ep, c in cur["endpoints"].items()
+                 for b in [base["endpoints"].get(ep, {})]
+                 for metric in CHECKS]
+        # Memory and startup depend on which models were exercised
+        if set(base["endpoints"]) == set(cur["endpoints"]):
+            pairs.append((f"{transport}/peakRssMB", base.get("peakRssMB"), cur.get("peakRssMB"), ("rss", "up")))
+            pairs.append((f"{transport}/startupS", base.get("startupS"), cur.get("startupS"), ("startup", "up")))
+
+        for name, old, new, (kind, direction) in pairs:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change if direction == "up" else -change
+            failed = worse > tolerances[kind]
+            rows.append((name, old, new, change, failed))
+            if failed:
+                failures.append(name)
+    return rows, failures
+
+
+def print_results(results):
+    for transport, r in results.items():
+        extra = f", disease warm-up {r['diseaseWarmupS']:.2f} s" if r.get("diseaseWarmupS") is not None else ""
+        print(f"📊 {transport}: startup {r['startupS']:.2f} s{extra}, peak RSS {r['peakRssMB'] or 0:.0f} MB")
+        for endpoint, e in r["endpoints"].items():
+            if e["p50Ms"] is None:
+                print(f"   {endpoint:<11} every request failed ({e['errors']}/{e['requests']})")
+                continue
+            print(f"   {endpoint:<11} {e['rps']:8.1f} req/s  p50 {e['p50Ms']:7.2f}  p95 {e['p95Ms']:7.2f}  "
+                  f"p99 {e['p99Ms']:7.2f} ms  errors {e['errors']}/{e['requests']}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthetic_image(spec):
+    from PIL import Image
+
+    w, h = (int(v) for v in spec.lower().split("x"))
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG", quality=90)
+    fd, path = tempfile.mkstemp(suffix=".jpg")
+    with os.fdopen(fd, "wb") as f:
+        f.write(buf.getvalue())
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crop, fertilizer and disease endpoints")
+    parser.add_argument("--transport", choices=["test-client", "http", "both"], default="both")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=300, help="Measured requests per crop/fertilizer run")
+    parser.add_argument("--disease-requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1, help="Client threads")
+    parser.add_argument("--image", default=os.path.join(BASE_DIR, "potato-diseases.jpg"))
+    parser.add_argument("--synthetic-image", help="Use a generated WxH JPEG instead of --image, e.g. 1024x768")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the prediction/disease caches on")
+    parser.add_argument("--workers", type=int, default=1, help="serve.py workers for --transport http")
+    parser.add_argument("--threads", type=int, default=8, help="serve.py threads per worker")
+    parser.add_argument("--port", type=int, default=5098)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--max-latency-regression", type=float, default=0.25,
+                        help="Allowed relative increase of p50/p95/p99 (0.25 = +25%%)")
+    parser.add_argument("--max-throughput-regression", type=float, default=0.20)
+    parser.add_argument("--max-rss-regression", type=float, default=0.15)
+    parser.add_argument("--max-startup-regression", type=float, default=0.50)
+    parser.add_argument("--max-error-rate", type=float, default=0.0,
+                        help="Largest allowed share of failed requests per endpoint (0.01 = 1%%)")
+    parser.add_argument("--child", choices=["test-client"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    image_path = synthetic_image(args.synthetic_image) if args.synthetic_image else args.image
+    env = dict(os.environ)
+    if not args.with_caches:
+        env.update(PREDICTION_CACHE_ENABLED="0", DISEASE_CACHE_ENABLED="0")
+
+    if args.child == "test-client":
+        print(json.dumps(run_test_client(args, image_path)))
+        return
+
+    results = {}
+    try:
+        if args.transport in ("test-client", "both"):
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", "test-client", "--image", image_path,
+                   "--endpoints", *args.endpoints, "--requests", str(args.requests),
+                   "--disease-requests", str(args.disease_requests), "--warmup", str(args.warmup),
+                   "--concurrency", str(args.concurrency)]
+            out = subprocess.check_output(cmd, cwd=BASE_DIR, env=env)
+            results["test-client"] = json.loads(out.decode().strip().splitlines()[-1])
+        if args.transport in ("http", "both"):
+            results["http"] = run_http(args, image_path, env)
+    finally:
+        if args.synthetic_image:
+            os.remove(image_path)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpuCount": os.cpu_count(),
+            "caches": args.with_caches,
+            "args": {k: v for k, v in vars(args).items() if k not in ("child", "baseline", "output")},
+        },
+        "results": results,
+    }
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        tolerances = {
+            "latency": args.max_latency_regression,
+            "throughput": args.max_throughput_regression,
+            "rss": args.max_rss_regression,
+            "startup": args.max_startup_regression,
+        }
+        rows, failures = compare(baseline, report, tolerances, args.max_error_rate)
+        print(f"📊 vs {args.baseline} (commit {baseline.get('meta', {}).get('commit')})")
+        for name, old, new, change, failed in rows:
+            print(f"   {'❌' if failed else '✅'} {name:<34} {old:10.2f} -> {new:10.2f}  ({change:+.1%})")
+        if failures:
+            print(f"❌ {len(failures)} metric(s) regressed beyond the allowed threshold")
+            sys.exit(1)
+        print("✅ No regressions beyond the thresholds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# bench_forest_artifacts.py
+#
+# Load time, resident memory and prediction latency of the RandomForest
+# pickles against their memory-mapped .forest exports (export_forests.py).
+# Each (model, format) pair runs in a fresh interpreter so that imports and
+# memory are measured from scratch.
+#   python bench_forest_artifacts.py
+#   python bench_forest_artifacts.py --output forest_bench.json
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS = {
+    "crop": "models/crop_model.pkl",
+    "fertilizer": "models/fertilizer_model.pkl",
+}
+
+
+def rss_mb(field="VmRSS"):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def sample_rows(name, n):
+    import pandas as pd
+
+    if name == "crop":
+        df = pd.read_csv(os.path.join(BASE_DIR, "data", "Crop_recommendation.csv"))
+        X = df[['N', 'P', 'K', 'temperature', 'humidity', 'ph']].to_numpy(dtype=np.float64)
+    else:
+        df = pd.read_csv(os.path.join(BASE_DIR, "data", "Fertilizer_recommendation.csv"))
+        df.columns = [c.strip() for c in df.columns]
+        soil = df["Soil Type"].str.lower().astype("category").cat.codes
+        crop = df["Crop Type"].str.lower().astype("category").cat.codes
+        X = np.column_stack([soil, crop, df["Nitrogen"], df["Phosphorus"], df["Potassium"]]).astype(np.float64)
+    return X[np.random.default_rng(0).integers(0, len(X), n)]
+
+
+def run_variant(name, fmt, rows, iterations):
+    path = os.path.join(BASE_DIR, MODELS[name])
+    X = sample_rows(name, rows)
+    rss_before = rss_mb()
+
+    start = time.perf_counter()
+    if fmt == "pickle":
+        import joblib
+        model = joblib.load(path)
+    else:
+        from forest_artifacts import forest_path_for, load_forest
+        model = load_forest(forest_path_for(path), source_path=path)
+    load_ms = (time.perf_counter() - start) * 1000
+    rss_loaded = rss_mb()
+
+    import warnings
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    # One row the way app.py scores it
+    if hasattr(model, "predict_row"):
+        predict_one = lambda i: model.predict_row(X[i % len(X)])
+    else:
+        predict_one = lambda i: model.predict(X[i % len(X)][None, :])
+
+    predict_one(0)  # warm up
+    single = []
+    for i in range(iterations):
+        t = time.perf_counter()
+        predict_one(i)
+        single.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    model.predict(X)
+    batch_s = time.perf_counter() - t
+
+    return {
+        "model": name,
+        "format": fmt,
+        "loadMs": load_ms,
+        # Includes the imports the format needs (scikit-learn for the pickle)
+        "loadRssMB": rss_loaded - rss_before,
+        "peakRssMB": rss_mb("VmHWM"),
+        "rowP50Ms": float(np.percentile(single, 50) * 1000),
+        "rowP95Ms": float(np.percentile(single, 95) * 1000),
+        "batchRowsPerS": rows / batch_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pickled vs memory-mapped RandomForests")
+    parser.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--rows", type=int, default=10000, help="Rows in the batch prediction")
+    parser.add_argument("--iterations", type=int, default=300, help="Single-row predictions")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--variant", nargs=2, metavar=("MODEL", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant[0], args.variant[1], args.rows, args.iterations)))
+        return
+
+    results = []
+    for name in args.models:
+        path = os.path.join(BASE_DIR, MODELS[name])
+        from forest_artifacts import forest_path_for
+        if not os.path.isdir(forest_path_for(path)):
+            print(f"⚠️ {forest_path_for(path)} missing, run export_forests.py first")
+            continue
+
+        print(f"📊 {name}: {os.path.getsize(path) / (1024 * 1024):.1f} MB pickle")
+        for fmt in ("pickle", "forest"):
+            cmd = [sys.executable, __file__, "--variant", name, fmt,
+                   "--rows", str(args.rows), "--iterations", str(args.iterations)]
+            r = json.loads(subprocess.check_output(cmd, cwd=BASE_DIR).decode().strip().splitlines()[-1])
+            results.append(r)
+            print(f"   {fmt:<7} load {r['loadMs']:8.1f} ms  +RSS {r['loadRssMB']:6.1f} MB  "
+                  f"row p50 {r['rowP50Ms']:6.2f} ms  p95 {r['rowP95Ms']:6.2f} ms  "
+                  f"batch {r['batchRowsPerS']:9.0f} rows/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
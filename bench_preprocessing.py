@@ -0,0 +1,135 @@
+# bench_preprocessing.py
+#
+# Per-image time and peak memory of the old /predict_disease preprocessing
+# (full decode -> crop -> resize -> float64 / 255 -> expand_dims) against
+# image_preprocessing.py. Each variant runs in its own subprocess so peak
+# RSS is not shared between them.
+#   python bench_preprocessing.py                       # potato-diseases.jpg
+#   python bench_preprocessing.py --synthetic 4000x3000 # phone-sized JPEG
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import preprocess_image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def legacy(data):
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    w, h = image.size
+    min_dim = min(w, h)
+    image = image.crop(((w - min_dim) / 2, (h - min_dim) / 2, (w + min_dim) / 2, (h + min_dim) / 2))
+    image = image.resize((224, 224))
+    return np.expand_dims(np.array(image) / 255.0, axis=0)
+
+
+def fast(data, out):
+    return preprocess_image(data, out=out)
+
+
+def peak_rss_mb():
+    # VmHWM resets on exec; ru_maxrss on Linux would include the parent's peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_variant(mode, data, iterations):
+    out = np.empty((224, 224, 3), dtype=np.float32)
+    call = (lambda: legacy(data)) if mode == "legacy" else (lambda: fast(data, out))
+    call()  # warm up
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call()
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "msPerImage": elapsed / iterations * 1000,
+        "tracedPeakMB": traced_peak / (1024 * 1024),
+        "peakRssMB": peak_rss_mb(),
+    }
+
+
+def synthetic_jpeg(spec):
+    w, h = (int(v) for v in spec.lower().split("x"))
+    rng = np.random.default_rng(0)
+    # Smooth gradient plus noise so the JPEG has realistic entropy
+    base = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+    pixels = np.clip(base + rng.normal(0, 25, (h, w, 3)), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark disease image preprocessing")
+    parser.add_argument("--image", default="potato-diseases.jpg")
+    parser.add_argument("--synthetic", help="Generate a WxH JPEG instead of --image, e.g. 4000x3000")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--mode", choices=["legacy", "fast"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        with open(args.image, "rb") as f:
+            print(json.dumps(run_variant(args.mode, f.read(), args.iterations)))
+        return
+
+    image_path = args.image
+    if args.synthetic:
+        # Written to disk so the measuring subprocesses never hold the raw pixels
+        fd, image_path = tempfile.mkstemp(suffix=".jpg")
+        with os.fdopen(fd, "wb") as f:
+            f.write(synthetic_jpeg(args.synthetic))
+    with open(image_path, "rb") as f:
+        data = f.read()
+
+    # Parent: run both variants in fresh interpreters and compare
+    size = Image.open(io.BytesIO(data)).size
+    print(f"🖼️ {size[0]}x{size[1]} JPEG, {len(data) / 1024:.0f} KB, {args.iterations} iterations")
+    results = {}
+    for mode in ("legacy", "fast"):
+        cmd = [sys.executable, __file__, "--mode", mode, "--iterations", str(args.iterations), "--image", image_path]
+        results[mode] = json.loads(subprocess.check_output(cmd).decode().strip().splitlines()[-1])
+
+    for mode, r in results.items():
+        print(f"   {mode:<6} {r['msPerImage']:7.2f} ms/image   numpy/python peak {r['tracedPeakMB']:6.1f} MB   "
+              f"peak RSS {r['peakRssMB']:6.1f} MB")
+
+    # Output difference vs legacy, for the record
+    diff = np.abs(legacy(data)[0] - preprocess_image(data)).max()
+    print(f"   speed-up x{results['legacy']['msPerImage'] / results['fast']['msPerImage']:.1f}, "
+          f"max pixel difference {diff:.4f}")
+
+    if args.synthetic:
+        os.remove(image_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# build_image_shards.py
+#
+# One-time conversion of the leaf-image dataset (one folder per class) into
+# memory-mapped uint8 shards for training and evaluation (see image_shards.py).
+# Re-running against the same output folder only appends images and class
+# folders that are not in the manifest yet.
+#   python build_image_shards.py --dataset <dataset> --out data/disease_shards
+
+import argparse
+import os
+import time
+
+from image_preprocessing import IMAGE_SIZE
+from image_shards import append_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the disease dataset into memory-mapped shards")
+    parser.add_argument("--dataset", required=True, help="Dataset folder, one sub-folder per class")
+    parser.add_argument("--out", required=True, help="Output shard folder")
+    parser.add_argument("--shard-size", type=int, default=2048, help="Images per shard file")
+    parser.add_argument("--image-size", type=int, default=IMAGE_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    added, manifest = append_dataset(args.dataset, args.out, args.shard_size, args.image_size, args.workers)
+    total = sum(s["count"] for s in manifest["shards"])
+    print(f"✅ Added {added} images in {time.perf_counter() - start:.1f}s "
+          f"({total} images, {len(manifest['classIndices'])} classes, {len(manifest['shards'])} shards)")
+    print(f"✅ Label index saved to: {os.path.join(args.out, 'class_indices.json')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,531 @@
+# bulk_score.py
+#
+# Offline scoring of large inputs with the serving models, e.g. re-scoring
+# the whole farm registry overnight:
+#   crop        CSV/Parquet of soil readings (N, P, K, temperature, humidity, ph)
+#   fertilizer  CSV/Parquet with Soil Type (or soil), Crop Type (or crop),
+#               Nitrogen, Phosphorus, Potassium
+#   disease     a folder of leaf photos (searched recursively)
+#
+# The input is read in chunks, and each chunk is scored in a worker process
+# with the same code the API uses: load_model (compact forests),
+# score_crop_rows, the disease backend, temperature calibration and
+# summarize_survey. At most 2 x --jobs chunks are in flight or waiting to
+# be written, so memory stays bounded whatever the input size. Results are
+# appended to the output (.csv, or .ndjson / .jsonl) in input order.
+#
+# After every chunk, <output>.progress.json records how many input rows are
+# done and how many output bytes hold their results. A rerun of the same
+# command after an interruption cuts off anything written past that point
+# and carries on from the next row. It refuses to resume if the input, the
+# model files or the settings changed; --restart starts over.
+#   python bulk_score.py crop registry.csv scores/crop.csv
+#   python bulk_score.py fertilizer registry.parquet scores/fertilizer.ndjson --jobs 8
+#   python bulk_score.py disease surveys/ scores/disease.csv --top-k 3 --chunk-size 64
+
+import abc
+import argparse
+import hashlib
+import json
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+import config
+from crop_batch import CROP_FEATURES, score_crop_rows
+from disease_batch import IMAGE_EXTENSIONS, summarize_survey
+from disease_outputs import DiseaseLabels, apply_temperature, load_temperature
+from feature_encoding import load_encoder
+from forest_artifacts import forest_path_for, load_model
+from forest_training import DATASETS
+from image_preprocessing import IMAGE_SIZE, preprocess_image
+from response_cache import file_fingerprint
+
+# Same artifacts as app.py
+DISEASE_MODEL_PATH = "models/plant_disease_prediction_model.h5"
+CLASS_INDICES_PATH = "class_indices.json"
+DISEASE_BACKEND_PATHS = {
+    "keras": DISEASE_MODEL_PATH,
+    "tflite": config.DISEASE_TFLITE_PATH,
+    "onnx": config.DISEASE_ONNX_PATH,
+}
+
+# Input column -> accepted spellings (compared stripped and lower-cased)
+CROP_COLUMNS = {name: (name.lower(),) for name in CROP_FEATURES}
+FERTILIZER_COLUMNS = {
+    "Soil Type": ("soil type", "soil"),
+    "Crop Type": ("crop type", "crop"),
+    "Nitrogen": ("nitrogen",),
+    "Phosphorus": ("phosphorus",),
+    "Potassium": ("potassium",),
+}
+
+PROGRESS_VERSION = 1
+
+
+class BulkScoreError(RuntimeError):
+    pass
+
+
+def forest_files(pickle_path):
+    # What the registry watches for a forest: the pickle plus its .forest export
+    return pickle_path, os.path.join(forest_path_for(pickle_path), "manifest.json")
+
+
+def resolve_columns(columns, spec):
+    lookup = {str(c).strip().lower(): c for c in columns}
+    found, missing = {}, []
+    for name, spellings in spec.items():
+        match = next((lookup[s] for s in spellings if s in lookup), None)
+        if match is None:
+            missing.append(name)
+        found[name] = match
+    if missing:
+        raise BulkScoreError(f"Input is missing column(s) {missing} (has {list(columns)})")
+    return found
+
+
+def numeric(frame, columns):
+    return frame[columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def ranked_columns(n, ok, labels, values, value_name, k):
+    # prediction, <value>, prediction_2, <value>_2, ... with blanks for failed rows
+    out = {}
+    for j in range(k):
+        suffix = "" if j == 0 else f"_{j + 1}"
+        column = np.full(n, "", dtype=object)
+        column[ok] = labels[:, j]
+        scores = np.full(n, np.nan)
+        scores[ok] = values[:, j]
+        out[f"prediction{suffix}"] = column
+        out[f"{value_name}{suffix}"] = scores
+    return out
+
+
+# ---------------- Scorers ----------------
+# Built in the parent (settings only) and loaded once per worker process.
+class ForestScorer(abc.ABC):
+    value_name = "probability"
+
+    def __init__(self, name, top_k):
+        self.name = name
+        self.top_k = top_k
+        self.model_path = DATASETS[name]["model"]
+        self.feature_names = DATASETS[name]["features"]
+
+    def model_files(self):
+        return forest_files(self.model_path)
+
+    def load(self):
+        self.model = load_model(self.model_path, config.COMPACT_FORESTS)
+        self.k = max(1, min(self.top_k, len(self.model.classes_)))
+
+    @abc.abstractmethod
+    def encode(self, frame, columns):
+        """(X, ok, error) for a chunk: the model's feature matrix and which rows are usable."""
+
+    def score(self, frame):
+        columns = resolve_columns(frame.columns, self.columns)
+        X, ok, error = self.encode(frame, columns)
+        n = len(frame)
+        labels = np.empty((0, self.k), dtype=object)
+        proba = np.empty((0, self.k))
+        if ok.any():
+            _, labels, proba = score_crop_rows(self.model, X[ok], self.k, self.feature_names)
+            proba = np.round(proba, 4)
+        out = ranked_columns(n, ok, labels.astype(str).astype(object), proba, self.value_name, self.k)
+        out["error"] = np.where(ok, "", error)
+        return pd.DataFrame(out, index=frame.index)
+
+
+class CropScorer(ForestScorer):
+    columns = CROP_COLUMNS
+
+    def __init__(self, top_k):
+        super().__init__("crop", top_k)
+
+    def encode(self, frame, columns):
+        X = numeric(frame, [columns[c] for c in CROP_FEATURES])
+        ok = np.isfinite(X).all(axis=1)
+        return X, ok, np.full(len(X), "Non-numeric or missing values", dtype=object)
+
+
+class FertilizerScorer(ForestScorer):
+    columns = FERTILIZER_COLUMNS
+
+    def __init__(self, top_k):
+        super().__init__("fertilizer", top_k)
+        self.encoder_paths = DATASETS["fertilizer"]["soil_encoder"], DATASETS["fertilizer"]["crop_encoder"]
+
+    def model_files(self):
+        return forest_files(self.model_path) + self.encoder_paths
+
+    def load(self):
+        super().load()
+        self.soil_encoder, self.crop_encoder = (load_encoder(p, field)
+                                                for p, field in zip(self.encoder_paths, ("soil", "crop")))
+
+    def encode(self, frame, columns):
+        # Unknown values only flag their own row instead of failing the chunk
+        soil, soil_ok = self.soil_encoder.encode_many(frame[columns["Soil Type"]])
+        crop, crop_ok = self.crop_encoder.encode_many(frame[columns["Crop Type"]])
+        npk = numeric(frame, [columns[c] for c in ("Nitrogen", "Phosphorus", "Potassium")])
+        npk_ok = np.isfinite(npk).all(axis=1)
+        X = np.column_stack([soil, crop, npk]).astype(np.float64)
+        error = np.where(~soil_ok, "Unknown soil type",
+                         np.where(~crop_ok, "Unknown crop type", "Non-numeric or missing values"))
+        return X, soil_ok & crop_ok & npk_ok, error.astype(object)
+
+
+class DiseaseScorer:
+    value_name = "confidence"
+
+    def __init__(self, top_k, threads):
+        self.top_k = top_k
+        self.threads = threads
+        self.backend = config.DISEASE_BACKEND
+        self.model_path = DISEASE_BACKEND_PATHS.get(self.backend, DISEASE_MODEL_PATH)
+
+    def model_files(self):
+        return self.model_path, CLASS_INDICES_PATH, config.DISEASE_CALIBRATION_PATH
+
+    def load(self):
+        from disease_backends import load_disease_backend
+        self.model = load_disease_backend(
+            self.backend, DISEASE_MODEL_PATH,
+            tflite_path=config.DISEASE_TFLITE_PATH,
+            onnx_path=config.DISEASE_ONNX_PATH,
+            num_threads=self.threads,
+            intra_op_threads=self.threads,
+            inter_op_threads=1,
+        )
+        if self.model is None:
+            raise BulkScoreError(f"Disease model not found at {self.model_path}")
+        self.labels = DiseaseLabels.from_file(CLASS_INDICES_PATH)
+        self.temperature = (load_temperature(config.DISEASE_CALIBRATION_PATH)
+                            if config.DISEASE_CALIBRATION_ENABLED else None)
+        # Same columns in every chunk, even one where no image could be read
+        self.k = max(1, min(self.top_k, len(self.labels) or self.top_k))
+
+    def score(self, chunk):
+        root, names = chunk
+        block = np.empty((len(names), IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+        error = np.full(len(names), "", dtype=object)
+        for i, name in enumerate(names):
+            try:
+                preprocess_image(os.path.join(root, name), out=block[i])
+            except Exception as e:
+                error[i] = f"Could not read image: {e}"
+        ok = error == ""
+
+        k = self.k
+        out = {"image": np.array(names, dtype=object)}
+        labels = np.empty((0, k), dtype=object)
+        confidence = np.empty((0, k))
+        crops = np.empty(0, dtype=object)
+        if ok.any():
+            probs = apply_temperature(self.model.predict(block[ok] if not ok.all() else block), self.temperature)
+            per_image, _ = summarize_survey(probs, self.labels, "", k)
+            ranked = [r.get("topPredictions") or [r] for r in per_image]
+            labels = np.array([[p["prediction"] for p in r[:k]] for r in ranked], dtype=object)
+            confidence = np.array([[p["confidence"] for p in r[:k]] for r in ranked])
+            crops = np.array([r["crop"] for r in per_image], dtype=object)
+        out.update(ranked_columns(len(names), ok, labels, confidence, self.value_name, k))
+        out["crop"] = np.full(len(names), "", dtype=object)
+        out["crop"][ok] = crops
+        out["error"] = error
+        return pd.DataFrame(out)
+
+
+def make_scorer(args):
+    if args.model == "crop":
+        return CropScorer(args.top_k)
+    if args.model == "fertilizer":
+        return FertilizerScorer(args.top_k)
+    return DiseaseScorer(args.top_k, args.threads)
+
+
+# ---------------- Inputs ----------------
+def is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def list_images(root):
+    names = []
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for f in sorted(files):
+            if f.lower().endswith(IMAGE_EXTENSIONS) and not f.startswith("."):
+                names.append(os.path.relpath(os.path.join(directory, f), root))
+    return names
+
+
+def input_fingerprint(path, images=None):
+    if images is None:
+        return file_fingerprint(path)
+    h = hashlib.blake2b(digest_size=8)
+    for name in images:
+        h.update(f"{name};".encode())
+    return f"{len(images)}:{h.hexdigest()}"
+
+
+def parquet_file(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise BulkScoreError("Reading Parquet needs pyarrow (pip install pyarrow)")
+    return pq.ParquetFile(path)
+
+
+def count_rows(path):
+    # Known up front for Parquet (footer metadata); a CSV would need a full pass
+    if is_parquet(path):
+        return parquet_file(path).metadata.num_rows
+    return None
+
+
+def input_columns(path):
+    # Header only: the Parquet schema or the first line of the CSV
+    if is_parquet(path):
+        return list(parquet_file(path).schema_arrow.names)
+    try:
+        return list(pd.read_csv(path, nrows=0, dtype=str).columns)
+    except pd.errors.EmptyDataError:
+        raise BulkScoreError(f"{path} is empty")
+
+
+def check_columns(path, scorer, keep):
+    columns = input_columns(path)
+    resolve_columns(columns, scorer.columns)
+    if keep:
+        missing = [c for c in keep if c not in columns]
+        if missing:
+            raise BulkScoreError(f"--keep column(s) {missing} are not in the input")
+
+
+def iter_table(path, chunk_size, skip):
+    if is_parquet(path):
+        for batch in parquet_file(path).iter_batches(batch_size=chunk_size):
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            yield batch.slice(skip).to_pandas()
+            skip = 0
+        return
+    # Everything is read as text: pass-through columns (IDs, codes) come out
+    # exactly as they went in, and features are converted per chunk
+    yield from pd.read_csv(path, chunksize=chunk_size, skiprows=range(1, skip + 1),
+                           dtype=str, keep_default_na=False)
+
+
+def iter_chunks(args, images, skip):
+    if images is not None:
+        for start in range(skip, len(images), args.chunk_size):
+            yield args.input, images[start:start + args.chunk_size]
+        return
+    yield from iter_table(args.input, args.chunk_size, skip)
+
+
+# ---------------- Workers ----------------
+_scorer = None
+
+
+def _init_worker(scorer):
+    global _scorer
+    # Ctrl+C is handled by the parent, which lets running chunks finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    scorer.load()
+    _scorer = scorer
+
+
+def _score_chunk(index, chunk, keep, as_csv, header):
+    result = _scorer.score(chunk)
+    if not isinstance(chunk, tuple):
+        passthrough = chunk if keep is None else chunk[keep]
+        result = pd.concat([passthrough.reset_index(drop=True), result.reset_index(drop=True)], axis=1)
+    if as_csv:
+        text = result.to_csv(index=False, header=header)
+    else:
+        text = result.to_json(orient="records", lines=True, force_ascii=False)
+        if text and not text.endswith("\n"):
+            text += "\n"
+    return index, len(result), int((result["error"] != "").sum()), text.encode()
+
+
+# ---------------- Progress ----------------
+def progress_path(output):
+    return f"{output}.progress.json"
+
+
+def save_progress(path, progress):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(progress, f, indent=2)
+    os.replace(tmp, path)
+
+
+def open_output(args, settings):
+    """Output file positioned after the last finished chunk, plus the progress record."""
+    path = progress_path(args.output)
+    if args.restart or not os.path.exists(path):
+        if os.path.exists(args.output) and not args.restart:
+            raise BulkScoreError(f"{args.output} exists but has no progress file; use --restart to overwrite it")
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        progress = {**settings, "rows": 0, "errors": 0, "bytes": 0, "complete": False}
+        out = open(args.output, "wb")
+        save_progress(path, progress)
+        return out, progress
+
+    with open(path) as f:
+        progress = json.load(f)
+    changed = [k for k, v in settings.items() if progress.get(k) != v]
+    if changed:
+        raise BulkScoreError(f"Cannot resume {args.output}: {', '.join(changed)} changed since it was started "
+                             f"(use --restart to score everything again)")
+    size = os.path.getsize(args.output) if os.path.exists(args.output) else -1
+    if size < progress["bytes"]:
+        raise BulkScoreError(f"{args.output} is shorter than its progress file says; use --restart")
+    out = open(args.output, "r+b")
+    # Drops rows of chunks that were written after the last checkpoint
+    out.truncate(progress["bytes"])
+    out.seek(progress["bytes"])
+    return out, progress
+
+
+def checkpoint(out, path, progress):
+    out.flush()
+    os.fsync(out.fileno())
+    progress["bytes"] = out.tell()
+    save_progress(path, progress)
+
+
+# ---------------- Main ----------------
+def run(args):
+    scorer = make_scorer(args)
+    model_file = scorer.model_files()[0]
+    if not os.path.exists(model_file):
+        raise BulkScoreError(f"Model not found: {model_file}")
+
+    images = list_images(args.input) if args.model == "disease" else None
+    if images is not None and not images:
+        raise BulkScoreError(f"No images found under {args.input}")
+    as_csv = not args.output.lower().endswith((".ndjson", ".jsonl", ".json"))
+    keep = [c.strip() for c in args.keep.split(",")] if args.keep else None
+    if images is None:
+        # Fail on a wrong file before the output or its progress file exists
+        check_columns(args.input, scorer, keep)
+
+    settings = {
+        "formatVersion": PROGRESS_VERSION,
+        "model": args.model,
+        "input": os.path.abspath(args.input),
+        "inputFingerprint": input_fingerprint(args.input, images),
+        "modelVersion": file_fingerprint(*scorer.model_files()),
+        "topK": args.top_k,
+        "keep": keep,
+        "format": "csv" if as_csv else "ndjson",
+    }
+    out, progress = open_output(args, settings)
+    path = progress_path(args.output)
+    if progress["complete"]:
+        out.close()
+        print(f"✅ {args.output} is already complete ({progress['rows']} rows); use --restart to score again")
+        return progress
+
+    total = len(images) if images is not None else count_rows(args.input)
+    if progress["rows"]:
+        print(f"🔁 Resuming {args.output} after {progress['rows']} rows")
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    window = 2 * jobs
+    print(f"🚀 Scoring {args.input} with the {args.model} model ({settings['modelVersion']}) "
+          f"on {jobs} worker(s), {args.chunk_size} rows per chunk")
+
+    start = time.perf_counter()
+    started_rows = progress["rows"]
+    pending, finished = {}, {}
+    next_write = 0
+
+    def collect():
+        nonlocal next_write
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.pop(future)
+            index, rows, errors, text = future.result()
+            finished[index] = rows, errors, text
+        # Written strictly in input order, so the progress row count is exact
+        while next_write in finished:
+            rows, errors, text = finished.pop(next_write)
+            out.write(text)
+            progress["rows"] += rows
+            progress["errors"] += errors
+            checkpoint(out, path, progress)
+            next_write += 1
+            report(progress, total, start, started_rows)
+
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(scorer,))
+    try:
+        for index, chunk in enumerate(iter_chunks(args, images, progress["rows"])):
+            header = index == 0 and progress["bytes"] == 0
+            pending[pool.submit(_score_chunk, index, chunk, keep, as_csv, header)] = index
+            # Chunks in flight plus finished ones waiting for an earlier chunk
+            while len(pending) + len(finished) >= window:
+                collect()
+        while pending:
+            collect()
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        out.close()
+        print(f"\n⚠️ Interrupted after {progress['rows']} rows; run the same command again to resume")
+        raise SystemExit(130)
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        out.close()
+        raise
+    pool.shutdown()
+
+    progress["complete"] = True
+    checkpoint(out, path, progress)
+    out.close()
+    seconds = time.perf_counter() - start
+    scored = progress["rows"] - started_rows
+    print(f"✅ Wrote {progress['rows']} rows to {args.output} ({progress['errors']} with errors) "
+          f"in {seconds:.1f} s, {scored / max(seconds, 1e-9):.0f} rows/s")
+    return progress
+
+
+def report(progress, total, start, started_rows):
+    seconds = time.perf_counter() - start
+    rate = (progress["rows"] - started_rows) / max(seconds, 1e-9)
+    done = f"{progress['rows']}/{total}" if total else str(progress["rows"])
+    print(f"   {done} rows, {progress['errors']} errors, {rate:.0f} rows/s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score large CSV/Parquet files or image folders offline")
+    parser.add_argument("model", choices=["crop", "fertilizer", "disease"])
+    parser.add_argument("input", help="CSV or Parquet file (crop, fertilizer) or image folder (disease)")
+    parser.add_argument("output", help="Results file: .csv, or .ndjson/.jsonl")
+    parser.add_argument("--chunk-size", type=int, help="Rows (or images) per chunk "
+                        "(default: 50000, or 64 images)")
+    parser.add_argument("--jobs", type=int, default=-1, help="Worker processes (-1 = all cores)")
+    parser.add_argument("--top-k", type=int, default=1, help="Ranked predictions per row")
+    parser.add_argument("--keep", help="Comma-separated input columns to copy to the output (default: all)")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per disease model (one per worker)")
+    parser.add_argument("--restart", action="store_true", help="Ignore earlier progress and overwrite the output")
+    args = parser.parse_args()
+    args.chunk_size = args.chunk_size or (64 if args.model == "disease" else 50000)
+
+    try:
+        run(args)
+    except BulkScoreError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+
+# Runtime settings for app.py. Every value can be overridden with an
+# environment variable of the same name.
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ---------------- Disease Micro-batching ----------------
+# Concurrent /predict_disease requests are grouped into one forward pass.
+# A batch is flushed when it reaches DISEASE_BATCH_MAX_SIZE images or when
+# the oldest image has waited DISEASE_BATCH_MAX_WAIT_MS. A longer window
+# gives bigger batches (throughput), a shorter one lower latency.
+DISEASE_BATCH_ENABLED = _env_bool("DISEASE_BATCH_ENABLED", True)
+DISEASE_BATCH_MAX_SIZE = _env_int("DISEASE_BATCH_MAX_SIZE", 16)
+DISEASE_BATCH_MAX_WAIT_MS = _env_float("DISEASE_BATCH_MAX_WAIT_MS", 10.0)
+DISEASE_BATCH_TIMEOUT_S = _env_float("DISEASE_BATCH_TIMEOUT_S", 30.0)
+
+# ---------------- Crop Batch Scoring ----------------
+CROP_BATCH_MAX_ROWS = _env_int("CROP_BATCH_MAX_ROWS", 100000)
+# Larger request bodies are refused (413) before anything is parsed
+CROP_BATCH_MAX_BYTES = _env_int("CROP_BATCH_MAX_BYTES", CROP_BATCH_MAX_ROWS * 256)
+CROP_BATCH_DEFAULT_TOP_K = _env_int("CROP_BATCH_DEFAULT_TOP_K", 3)
+
+# ---------------- Fertilizer Dose Index ----------------
+# How often (seconds) data/Fertilizer_dose.csv is checked for changes.
+DOSE_INDEX_CHECK_INTERVAL_S = _env_float("DOSE_INDEX_CHECK_INTERVAL_S", 1.0)
+
+# ---------------- Prediction Cache ----------------
+# LRU cache for /predict_crop and /get_fertilizer model outputs. Inputs are
+# rounded to PREDICTION_CACHE_DECIMALS before both lookup and prediction.
+# TTL of 0 means entries only leave through LRU eviction. Set
+# PREDICTION_CACHE_DISK_PATH (e.g. cache/predictions.sqlite) to share
+# entries between worker processes; the file is held to the same entry
+# cap and TTL.
+PREDICTION_CACHE_ENABLED = _env_bool("PREDICTION_CACHE_ENABLED", True)
+PREDICTION_CACHE_MAX_ENTRIES = _env_int("PREDICTION_CACHE_MAX_ENTRIES", 4096)
+PREDICTION_CACHE_TTL_S = _env_float("PREDICTION_CACHE_TTL_S", 0)
+PREDICTION_CACHE_DISK_PATH = os.environ.get("PREDICTION_CACHE_DISK_PATH", "")
+PREDICTION_CACHE_DECIMALS = _env_int("PREDICTION_CACHE_DECIMALS", 3)
+
+# ---------------- Disease Result Cache ----------------
+# Softmax outputs keyed by a hash of the uploaded image bytes. With
+# DISEASE_CACHE_PERCEPTUAL on, re-encoded copies of a cached photo are
+# matched by a 64-bit dHash within DISEASE_CACHE_PHASH_MAX_DISTANCE bits.
+DISEASE_CACHE_ENABLED = _env_bool("DISEASE_CACHE_ENABLED", True)
+DISEASE_CACHE_MAX_MB = _env_float("DISEASE_CACHE_MAX_MB", 32)
+DISEASE_CACHE_PERCEPTUAL = _env_bool("DISEASE_CACHE_PERCEPTUAL", False)
+DISEASE_CACHE_PHASH_MAX_DISTANCE = _env_int("DISEASE_CACHE_PHASH_MAX_DISTANCE", 0)
+
+# ---------------- Model Loading ----------------
+# FAST_STARTUP: crop/fertilizer artifacts load in background threads and
+# the Keras model (and TensorFlow itself) is deferred until the first
+# /predict_disease request. Turn it off to preload everything in parallel
+# and have `python app.py` wait for it before serving.
+FAST_STARTUP = _env_bool("FAST_STARTUP", True)
+MODEL_LOAD_WORKERS = _env_int("MODEL_LOAD_WORKERS", 4)
+# How long a request waits for a model that is still loading before 503.
+MODEL_WAIT_TIMEOUT_S = _env_float("MODEL_WAIT_TIMEOUT_S", 30.0)
+DISEASE_MODEL_WAIT_TIMEOUT_S = _env_float("DISEASE_MODEL_WAIT_TIMEOUT_S", 120.0)
+MODEL_RETRY_AFTER_S = _env_int("MODEL_RETRY_AFTER_S", 5)
+# Load the crop/fertilizer forests from their memory-mapped .forest export
+# (python export_forests.py) when it is present and matches the pickle.
+COMPACT_FORESTS = _env_bool("COMPACT_FORESTS", True)
+
+# ---------------- Disease Inference Backend ----------------
+# keras (reference), tflite or onnx. Export the lighter formats with
+# export_disease_model.py and check them with evaluate_disease_backends.py.
+DISEASE_BACKEND = os.environ.get("DISEASE_BACKEND", "keras").strip().lower()
+DISEASE_TFLITE_PATH = os.environ.get("DISEASE_TFLITE_PATH", "models/plant_disease_prediction_model.tflite")
+DISEASE_ONNX_PATH = os.environ.get("DISEASE_ONNX_PATH", "models/plant_disease_prediction_model.onnx")
+# Interpreter threads for tflite/onnx (0 = runtime default)
+DISEASE_BACKEND_THREADS = _env_int("DISEASE_BACKEND_THREADS", 0)
+
+# ---------------- Disease Outputs ----------------
+# /predict_disease?top_k=N adds the N best classes (capped at
+# DISEASE_MAX_TOP_K). When train_disease_model.py has written a
+# temperature-scaling fit to DISEASE_CALIBRATION_PATH, confidences are
+# calibrated with it (the ranking never changes).
+DISEASE_MAX_TOP_K = _env_int("DISEASE_MAX_TOP_K", 10)
+DISEASE_CALIBRATION_ENABLED = _env_bool("DISEASE_CALIBRATION_ENABLED", True)
+DISEASE_CALIBRATION_PATH = os.environ.get("DISEASE_CALIBRATION_PATH", "models/disease_calibration.json")
+
+# ---------------- Disease Field Surveys ----------------
+# /predict_disease/batch: up to DISEASE_SURVEY_MAX_IMAGES photos (files
+# and/or zip archives, at most DISEASE_SURVEY_MAX_MB uncompressed) scored
+# in one forward pass. Decoding runs on DISEASE_SURVEY_WORKERS threads.
+DISEASE_SURVEY_MAX_IMAGES = _env_int("DISEASE_SURVEY_MAX_IMAGES", 64)
+DISEASE_SURVEY_MAX_MB = _env_float("DISEASE_SURVEY_MAX_MB", 100)
+DISEASE_SURVEY_WORKERS = _env_int("DISEASE_SURVEY_WORKERS", 4)
+
+# ---------------- Worker Threads ----------------
+# TensorFlow intra/inter-op thread pools for the Keras backend (0 = TF
+# default, i.e. all cores). serve.py sets these per worker process so that
+# workers x threads does not oversubscribe the CPU.
+TF_INTRA_OP_THREADS = _env_int("TF_INTRA_OP_THREADS", 0)
+TF_INTER_OP_THREADS = _env_int("TF_INTER_OP_THREADS", 0)
+
+# ---------------- Backpressure ----------------
+# Each model gets its own bounded inference queue; when it is full the
+# request is rejected at once with 503 + Retry-After instead of waiting.
+# DISEASE_QUEUE_MAX bounds the images waiting for the micro-batcher.
+CROP_INFERENCE_WORKERS = _env_int("CROP_INFERENCE_WORKERS", 2)
+CROP_QUEUE_MAX = _env_int("CROP_QUEUE_MAX", 64)
+FERTILIZER_INFERENCE_WORKERS = _env_int("FERTILIZER_INFERENCE_WORKERS", 2)
+FERTILIZER_QUEUE_MAX = _env_int("FERTILIZER_QUEUE_MAX", 64)
+DISEASE_QUEUE_MAX = _env_int("DISEASE_QUEUE_MAX", 32)
+INFERENCE_TIMEOUT_S = _env_float("INFERENCE_TIMEOUT_S", 10.0)
+# Per-route in-flight request limits (0 = unlimited); extra requests get
+# 429 + Retry-After. Keep the disease limit below the server's request
+# threads so uploads can never occupy all of them.
+ROUTE_LIMIT_PREDICT_CROP = _env_int("ROUTE_LIMIT_PREDICT_CROP", 0)
+ROUTE_LIMIT_PREDICT_CROP_BATCH = _env_int("ROUTE_LIMIT_PREDICT_CROP_BATCH", 2)
+ROUTE_LIMIT_GET_FERTILIZER = _env_int("ROUTE_LIMIT_GET_FERTILIZER", 0)
+ROUTE_LIMIT_PREDICT_DISEASE = _env_int("ROUTE_LIMIT_PREDICT_DISEASE", 4)
+ROUTE_LIMIT_PREDICT_DISEASE_BATCH = _env_int("ROUTE_LIMIT_PREDICT_DISEASE_BATCH", 2)
+OVERLOAD_RETRY_AFTER_S = _env_int("OVERLOAD_RETRY_AFTER_S", 1)
+
+# ---------------- Metrics ----------------
+# Per-route / per-stage latency histograms and counters on /metrics
+# (Prometheus text format).
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+
+# ---------------- Profiling ----------------
+# Sampling profiler for the prediction routes (request_profiler.py).
+# While a request runs, its stack and those of the worker threads running
+# its jobs are sampled every PROFILING_INTERVAL_MS. The capture is kept
+# for a random PROFILING_SAMPLE_RATE of requests, and always when the
+# request took at least PROFILING_SLOW_MS. Kept captures (collapsed
+# stacks + metadata) go to PROFILING_DIR, which holds at most
+# PROFILING_MAX_PROFILES. Listed and downloaded through GET /admin/profiles.
+PROFILING_ENABLED = _env_bool("PROFILING_ENABLED", False)
+PROFILING_SAMPLE_RATE = _env_float("PROFILING_SAMPLE_RATE", 0.01)
+PROFILING_SLOW_MS = _env_float("PROFILING_SLOW_MS", 1000.0)
+PROFILING_INTERVAL_MS = _env_float("PROFILING_INTERVAL_MS", 5.0)
+PROFILING_DIR = os.environ.get("PROFILING_DIR", "cache/profiles")
+PROFILING_MAX_PROFILES = _env_int("PROFILING_MAX_PROFILES", 200)
+# Comma-separated endpoint names; the health, metrics and admin routes
+# are never profiled
+PROFILING_ROUTES = os.environ.get(
+    "PROFILING_ROUTES", "predict_crop,predict_crop_batch,get_fertilizer,predict_disease,predict_disease_batch"
+)
+
+# ---------------- Hot Reload ----------------
+# Model, encoder, class_indices.json and disease_solutions.json files are
+# polled every MODEL_WATCH_INTERVAL_S seconds. Changed artifacts load in
+# the background once the change has stayed put for one interval, and
+# are then swapped in. POST /admin/reload does the same on demand, but it
+# only reaches the worker process that serves it; the watcher runs in
+# every worker.
+MODEL_WATCH_ENABLED = _env_bool("MODEL_WATCH_ENABLED", True)
+MODEL_WATCH_INTERVAL_S = _env_float("MODEL_WATCH_INTERVAL_S", 2.0)
+
+# ---------------- Admin Endpoints ----------------
+# /admin/* routes need an X-Admin-Token header equal to ADMIN_TOKEN. With
+# no token set they are refused (403), unless ADMIN_ALLOW_LOCALHOST opts
+# in to serving requests from 127.0.0.1 / ::1 without one. Only use that
+# for local development: when serve.py runs behind a reverse proxy on the
+# same host, every client appears to come from localhost.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+ADMIN_ALLOW_LOCALHOST = _env_bool("ADMIN_ALLOW_LOCALHOST", False)
@@ -0,0 +1,123 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+# Block parsing / scoring for /predict_crop/batch. A whole upload is
+# validated as one DataFrame and scored with a single predict_proba call.
+
+CROP_FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph']
+MAX_REPORTED_ERRORS = 20
+
+
+class CropBatchError(ValueError):
+    def __init__(self, message, details=None, status=400):
+        super().__init__(message)
+        self.details = details or {}
+        self.status = status
+
+
+def _too_many_rows(max_rows):
+    return CropBatchError("Too many rows", {"maxRows": max_rows}, 413)
+
+
+def parse_crop_rows(body, content_type="", max_rows=None):
+    # With max_rows, CSV / NDJSON parsing stops after max_rows + 1 rows
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if not body or not body.strip():
+        raise CropBatchError("Empty request body")
+    nrows = max_rows + 1 if max_rows else None
+
+    try:
+        if content_type in ("text/csv", "application/csv"):
+            frame = pd.read_csv(io.BytesIO(body), nrows=nrows)
+        elif content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+            frame = pd.read_json(io.BytesIO(body), lines=True, nrows=nrows)
+        else:
+            payload = json.loads(body)
+            if isinstance(payload, dict):
+                payload = payload.get("rows")
+            if not isinstance(payload, list):
+                raise CropBatchError("Expected a JSON array of readings or {\"rows\": [...]}")
+            if not payload:
+                raise CropBatchError("No rows to score")
+            if max_rows and len(payload) > max_rows:
+                raise _too_many_rows(max_rows)
+            # Either every row is an object or every row is a positional array
+            row_type = (list, tuple) if payload and isinstance(payload[0], (list, tuple)) else dict
+            bad_rows = [i for i, row in enumerate(payload) if not isinstance(row, row_type)]
+            if bad_rows:
+                raise CropBatchError(
+                    "Each row must be an object" if row_type is dict else "Each row must be an array",
+                    {"invalidRows": bad_rows[:MAX_REPORTED_ERRORS], "invalidCount": len(bad_rows)},
+                )
+            if row_type is dict:
+                frame = pd.DataFrame.from_records(payload)
+            else:
+                frame = pd.DataFrame(payload, columns=CROP_FEATURES)
+    except CropBatchError:
+        raise
+    except (ValueError, TypeError) as e:
+        raise CropBatchError(f"Could not parse request body: {e}")
+
+    if len(frame) == 0:
+        raise CropBatchError("No rows to score")
+    if max_rows and len(frame) > max_rows:
+        raise _too_many_rows(max_rows)
+    frame.columns = [str(c).strip() for c in frame.columns]
+    missing = [c for c in CROP_FEATURES if c not in frame.columns]
+    if missing:
+        raise CropBatchError("Missing fields", {"required": CROP_FEATURES, "missing": missing})
+
+    X = frame[CROP_FEATURES].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    bad_rows = np.flatnonzero(~np.isfinite(X).all(axis=1))
+    if bad_rows.size:
+        raise CropBatchError("Non-numeric or missing values", {
+            "invalidRows": bad_rows[:MAX_REPORTED_ERRORS].tolist(),
+            "invalidCount": int(bad_rows.size),
+        })
+    return X
+
+
+def score_crop_rows(model, X, top_k=3, feature_names=CROP_FEATURES):
+    # Works for any of the forests; bulk_score.py also scores fertilizer rows with it
+    if getattr(model, "feature_names_in_", None) is not None:
+        proba = model.predict_proba(pd.DataFrame(X, columns=feature_names))
+    else:
+        proba = model.predict_proba(X)
+
+    classes = np.asarray(model.classes_)
+    k = max(1, min(int(top_k), classes.size))
+    # Partial selection of the k best classes per row, then sort just those k.
+    top = np.argpartition(-proba, k - 1, axis=1)[:, :k]
+    top_proba = np.take_along_axis(proba, top, axis=1)
+    order = np.argsort(-top_proba, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_proba = np.take_along_axis(top_proba, order, axis=1)
+    # Same tie-breaking as RandomForestClassifier.predict (first max).
+    predictions = classes[np.argmax(proba, axis=1)]
+    return predictions, classes[top], top_proba
+
+
+def iter_crop_results(predictions, top_labels, top_proba, as_ndjson=True):
+    def row(i):
+        return json.dumps({
+            "row": i,
+            "prediction": str(predictions[i]),
+            "topK": [
+                {"crop": str(label), "probability": round(float(p), 4)}
+                for label, p in zip(top_labels[i], top_proba[i])
+            ],
+        })
+
+    n = len(predictions)
+    if as_ndjson:
+        for i in range(n):
+            yield row(i) + "\n"
+        return
+
+    yield '{"count": %d, "results": [' % n
+    for i in range(n):
+        yield ("," if i else "") + row(i)
+    yield "]}"
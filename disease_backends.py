@@ -0,0 +1,131 @@
+import os
+import threading
+
+import numpy as np
+
+# Inference backends for the plant disease CNN. All of them take a float32
+# batch of shape (n, 224, 224, 3) scaled to [0, 1] and return the softmax
+# matrix (n, num_classes). Keras is the reference; TFLite and ONNX Runtime
+# are lighter CPU runtimes for models made with export_disease_model.py.
+
+BACKENDS = ("keras", "tflite", "onnx")
+
+
+def configure_tensorflow_threads(intra_op=0, inter_op=0):
+    # Must run before TensorFlow creates its thread pools (first op).
+    import tensorflow as tf
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        print(f"⚠️ TensorFlow threads already initialized, keeping defaults: {e}")
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0):
+        import tensorflow as tf
+        configure_tensorflow_threads(intra_op_threads, inter_op_threads)
+        self.path = path
+        self.model = tf.keras.models.load_model(path)
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+def _tflite_interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    name = "tflite"
+
+    def __init__(self, path, num_threads=None):
+        Interpreter = _tflite_interpreter_class()
+        self.path = path
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        # The interpreter keeps per-call state, so calls are serialized.
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = list(self._input["shape"])
+            shape[0] = batch_size
+            self.interpreter.resize_tensor_input(self._input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(len(batch))
+            dtype = self._input["dtype"]
+            if dtype != np.float32:
+                # Fully integer-quantized model: quantize the input ourselves
+                scale, zero_point = self._input["quantization"]
+                info = np.iinfo(dtype)
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            out = self.interpreter.get_tensor(self._output["index"])
+            if out.dtype != np.float32:
+                scale, zero_point = self._output["quantization"]
+                out = (out.astype(np.float32) - zero_point) * scale
+            return np.array(out, dtype=np.float32)
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        self.path = path
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+def load_disease_backend(backend, keras_path, tflite_path=None, onnx_path=None, num_threads=None,
+                         intra_op_threads=0, inter_op_threads=0):
+    backend = (backend or "keras").lower()
+    num_threads = num_threads or intra_op_threads or None
+    if backend == "keras":
+        path = keras_path
+    elif backend == "tflite":
+        path = tflite_path
+    elif backend == "onnx":
+        path = onnx_path
+    else:
+        raise ValueError(f"Unknown disease backend '{backend}', expected one of {BACKENDS}")
+
+    if not path or not os.path.exists(path):
+        return None
+    if backend == "keras":
+        return KerasBackend(path, intra_op_threads, inter_op_threads)
+    if backend == "tflite":
+        return TFLiteBackend(path, num_threads)
+    return OnnxBackend(path, num_threads)
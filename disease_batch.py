@@ -0,0 +1,171 @@
+import io
+import os
+import zipfile
+import zlib
+
+import numpy as np
+
+from disease_outputs import top_k
+from image_preprocessing import IMAGE_SIZE, preprocess_image
+from request_profiler import attributed
+
+# Field-survey uploads for /predict_disease/batch: many leaf photos of one
+# plot, sent as several multipart files and/or zip archives. Images are
+# decoded and preprocessed in parallel straight into one (n, 224, 224, 3)
+# block, which the model scores in a single forward pass; the per-image
+# answers, the crop mismatch check and the plot summary are computed on
+# the whole (n, classes) output at once.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+class DiseaseBatchError(ValueError):
+    def __init__(self, message, details=None, status=400):
+        super().__init__(message)
+        self.details = details or {}
+        self.status = status
+
+
+class UnreadableMember(bytes):
+    # Stands in for a zip member that could not be inflated (corrupt data,
+    # CRC mismatch, encryption). It is empty, so hashing and the size budget
+    # treat it like any other upload, and preprocess_uploads reports its
+    # error for that image alone.
+    def __new__(cls, error):
+        member = super().__new__(cls)
+        member.error = error
+        return member
+
+
+def _is_zip(name, data):
+    return data[:4] == ZIP_MAGIC or name.lower().endswith(".zip")
+
+
+def _zip_images(name, data, budget):
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise DiseaseBatchError(f"{name} is not a valid zip archive: {e}")
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+        and not os.path.basename(info.filename).startswith(".")
+        and "__MACOSX/" not in info.filename
+    ]
+    # Sizes come from the central directory, so an oversized archive is
+    # refused before anything is inflated
+    total = sum(info.file_size for info in members)
+    if total > budget:
+        raise DiseaseBatchError("Upload too large", {"maxBytes": budget, "uncompressedBytes": total}, 413)
+    for info in sorted(members, key=lambda i: i.filename):
+        try:
+            data = archive.read(info)
+        except (zipfile.BadZipFile, zlib.error, RuntimeError, EOFError, NotImplementedError) as e:
+            data = UnreadableMember(f"Could not extract image from {name}: {e}")
+        yield f"{name}/{info.filename}", data
+
+
+def collect_uploads(files, max_images, max_bytes):
+    """[(name, bytes)] from multipart files, with zip archives expanded."""
+    uploads = []
+    remaining = max_bytes
+    for storage in files:
+        data = storage.read()
+        name = storage.filename or storage.name or f"image{len(uploads)}"
+        if not data:
+            continue
+        items = _zip_images(name, data, remaining) if _is_zip(name, data) else [(name, data)]
+        for item_name, item in items:
+            remaining -= len(item)
+            if remaining < 0:
+                raise DiseaseBatchError("Upload too large", {"maxBytes": max_bytes}, 413)
+            uploads.append((item_name, item))
+            if len(uploads) > max_images:
+                raise DiseaseBatchError("Too many images", {"maxImages": max_images}, 413)
+    if not uploads:
+        raise DiseaseBatchError("No images uploaded (send files as 'images', or a zip archive)")
+    return uploads
+
+
+def preprocess_uploads(uploads, pool, size=IMAGE_SIZE):
+    """Decode + crop/resize every upload on the pool into one float32 block.
+
+    Returns (block, ok, errors): ok[i] says whether uploads[i] decoded,
+    block holds only the ones that did (in upload order) and errors maps
+    the index of each failed upload to its message.
+    """
+    block = np.empty((len(uploads), size, size, 3), dtype=np.float32)
+
+    def work(i):
+        if isinstance(uploads[i][1], UnreadableMember):
+            return uploads[i][1].error
+        try:
+            preprocess_image(uploads[i][1], size, out=block[i])
+            return None
+        except Exception as e:
+            return f"Could not read image: {e}"
+
+    errors = {i: error for i, error in enumerate(pool.map(attributed(work), range(len(uploads)))) if error}
+    ok = np.ones(len(uploads), dtype=bool)
+    ok[list(errors)] = False
+    return (block if ok.all() else block[ok]), ok, errors
+
+
+def summarize_survey(probs, labels, user_crop="", k=1):
+    """Per-image answers plus the plot aggregate for an (n, classes) block."""
+    classes = probs.shape[1]
+    top_classes, top_probs = top_k(probs, k)
+    best = top_classes[:, 0]
+    # Same float32 arithmetic as /predict_disease, so both report identical numbers
+    top_percent = top_probs * np.float32(100)
+    confidence = top_percent[:, 0]
+
+    crops = labels.crop_array(classes)[best]
+    mismatched = (crops != user_crop) if user_crop else np.zeros(len(best), dtype=bool)
+
+    counts = np.bincount(best, minlength=classes)
+    confidence_sums = np.bincount(best, weights=confidence.astype(np.float64), minlength=classes)
+    mean_probability = probs.mean(axis=0, dtype=np.float64) * 100
+    found = np.flatnonzero(counts)
+    found = found[np.argsort(-counts[found], kind="stable")]
+
+    prevalence = [
+        {
+            "prediction": labels.name(c),
+            "crop": labels.crop(c),
+            "images": int(counts[c]),
+            "share": float(counts[c] / len(best)),
+            "meanConfidence": float(confidence_sums[c] / counts[c]),
+            "meanProbability": float(mean_probability[c]),
+        }
+        for c in found.tolist()
+    ]
+    healthy = labels.healthy_array(classes)[best]
+    crop_names, crop_counts = np.unique(crops, return_counts=True)
+
+    summary = {
+        "images": int(len(best)),
+        "prevalence": prevalence,
+        "dominant": prevalence[0]["prediction"] if prevalence else None,
+        "healthyShare": float(healthy.mean()) if len(best) else 0.0,
+        "diseasedShare": float(1.0 - healthy.mean()) if len(best) else 0.0,
+        "crops": dict(zip(crop_names.tolist(), crop_counts.tolist())),
+    }
+    if user_crop:
+        summary["selectedCrop"] = user_crop
+        summary["cropMismatches"] = int(mismatched.sum())
+
+    per_image = []
+    for i, (c, conf) in enumerate(zip(best.tolist(), confidence.tolist())):
+        result = {"prediction": labels.name(c), "confidence": conf, "crop": labels.crop(c)}
+        if user_crop:
+            result["cropMismatch"] = bool(mismatched[i])
+        if k > 1:
+            result["topPredictions"] = [
+                {"prediction": labels.name(tc), "confidence": tp, "crop": labels.crop(tc)}
+                for tc, tp in zip(top_classes[i].tolist(), top_percent[i].tolist())
+            ]
+        per_image.append(result)
+    return per_image, summary
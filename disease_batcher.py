@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as InferenceTimeout
+
+import numpy as np
+
+from inference_executor import Overloaded
+from request_profiler import working_for
+
+
+# ---------------- Dynamic Batcher ----------------
+# Collects single images submitted from request threads and runs them
+# through the model together. One worker thread owns the model call, so
+# every caller blocks only on its own Future. With max_queue set, images
+# beyond that many waiting ones are rejected at once (Overloaded) instead
+# of queueing behind a backlog they would time out in anyway.
+#
+# predict_fn(inputs, model) gets the model the images were submitted
+# with; around a hot reload, images for the old and the new model are
+# run as separate forward passes, never mixed.
+#
+# submit_batch() queues an already stacked block of images (a field
+# survey upload) as one item; the worker runs it as its own forward pass
+# so the model is still only ever called from one thread.
+
+class DynamicBatcher:
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10.0, max_queue=0, retry_after=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(0, int(max_queue))
+        self.retry_after = retry_after
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._worker = None
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = {}
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._inference_total = 0.0
+        self._rejected = 0
+
+    def submit(self, sample, timeout=None, model=None):
+        """Queue one preprocessed sample and block until its prediction row is ready."""
+        return self._submit((sample, None, time.perf_counter(), model, False, threading.get_ident()), timeout)
+
+    def submit_batch(self, samples, timeout=None, model=None):
+        """Queue a stacked (n, ...) block and block until its (n, classes) predictions are ready."""
+        return self._submit((samples, None, time.perf_counter(), model, True, threading.get_ident()), timeout)
+
+    def _submit(self, item, timeout):
+        self._ensure_worker()
+        future = Future()
+        item = (item[0], future) + item[2:]
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise Overloaded("disease", "inference queue full", 503, self.retry_after)
+        try:
+            return future.result(timeout=timeout)
+        except InferenceTimeout:
+            raise Overloaded("disease", f"no result within {timeout}s", 503, self.retry_after)
+
+    def _ensure_worker(self):
+        # Started lazily so the Flask reloader parent never owns a worker.
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="disease-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            groups = {}
+            for item in self._collect():
+                if item[4]:
+                    self._predict_block(item)
+                else:
+                    groups.setdefault(id(item[3]), []).append(item)
+            for batch in groups.values():
+                self._predict(batch)
+
+    def _predict(self, batch):
+        started = time.perf_counter()
+        try:
+            inputs = np.stack([item[0] for item in batch])
+            # Profiled as work for every request whose image is in the batch
+            with working_for(item[5] for item in batch):
+                outputs = np.asarray(self.predict_fn(inputs, batch[0][3]))
+        except Exception as e:
+            for item in batch:
+                item[1].set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        for i, item in enumerate(batch):
+            item[1].set_result(outputs[i])
+
+        self._record(batch, started, finished)
+
+    def _predict_block(self, item):
+        started = time.perf_counter()
+        try:
+            with working_for((item[5],)):
+                outputs = np.asarray(self.predict_fn(item[0], item[3]))
+        except Exception as e:
+            item[1].set_exception(e)
+            return
+        item[1].set_result(outputs)
+        self._record([item], started, time.perf_counter(), size=len(item[0]))
+
+    def _record(self, batch, started, finished, size=None):
+        waits = [started - item[2] for item in batch]
+        size = size or len(batch)
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            # Per image: every image of a block waited as long as the block
+            self._queue_wait_total += sum(waits) * size / len(batch)
+            self._queue_wait_max = max(self._queue_wait_max, max(waits))
+            self._inference_total += finished - started
+
+    def stats(self):
+        with self._lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "maxBatchSize": self.max_batch_size,
+                "maxWaitMs": self.max_wait * 1000.0,
+                "maxQueue": self.max_queue or None,
+                "queueDepth": self._queue.qsize(),
+                "rejected": self._rejected,
+                "batches": batches,
+                "items": items,
+                "meanBatchSize": items / batches if batches else 0.0,
+                "batchSizeHistogram": dict(sorted(self._batch_sizes.items())),
+                "meanQueueWaitMs": self._queue_wait_total / items * 1000.0 if items else 0.0,
+                "maxQueueWaitMs": self._queue_wait_max * 1000.0,
+                "meanInferenceMs": self._inference_total / batches * 1000.0 if batches else 0.0,
+            }
@@ -0,0 +1,172 @@
+import math
+import os
+
+# tf.data input pipeline for train_disease_model.py, replacing
+# ImageDataGenerator.flow_from_directory.
+#
+# * Class folders are sorted the same way flow_from_directory sorts them,
+#   so class_indices.json keeps the same mapping.
+# * The split is the same deterministic per-class split Keras used: the
+#   first `validation_split` of each class's sorted files is validation.
+# * make_train_val() decodes every image once into a TieredImageCache
+#   (RAM up to a budget, a memory-mapped file on disk beyond it; see
+#   image_cache.py), so later epochs skip JPEG decoding entirely.
+# * make_shard_train_val() reads the preprocessed shards written by
+#   build_image_shards.py instead of the JPEG folders.
+# * Both gather uint8 batches, and augmentation runs on the whole batch as
+#   one fused affine resampling. Batches are prefetched while the model
+#   trains.
+
+# flow_from_directory's extensions, so the class folders list the same
+# files; all of them are decoded with PIL (image_preprocessing.load_image_uint8)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".tif", ".tiff")
+
+
+def list_dataset(dataset_dir):
+    class_names = sorted(
+        d for d in os.listdir(dataset_dir) if os.path.isdir(os.path.join(dataset_dir, d))
+    )
+    class_indices = {name: i for i, name in enumerate(class_names)}
+    files = {}
+    for name in class_names:
+        class_dir = os.path.join(dataset_dir, name)
+        paths = []
+        for root, _, filenames in sorted(os.walk(class_dir)):
+            paths.extend(
+                os.path.join(root, f) for f in sorted(filenames) if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        files[name] = paths
+    return class_indices, files
+
+
+def split_dataset(class_indices, files, validation_split=0.2):
+    train, val = [], []
+    for name, paths in files.items():
+        n_val = int(validation_split * len(paths))
+        label = class_indices[name]
+        val.extend((p, label) for p in paths[:n_val])
+        train.extend((p, label) for p in paths[n_val:])
+    return train, val
+
+
+# The old ImageDataGenerator settings. Its shear_range=0.1 was in degrees,
+# which is visually a no-op, so it is not carried over.
+ROTATION_DEGREES = 25
+ZOOM_RANGE = 0.25
+SHIFT_RANGE = 0.1
+
+
+def build_augmenter(seed=None):
+    # Rotation, zoom, shift and horizontal flip are drawn per image and
+    # composed into one affine matrix, so a batch is resampled once (one
+    # ImageProjectiveTransformV3 call) instead of once per Random* layer.
+    # ImageDataGenerator also applied them as a single transform.
+    import tensorflow as tf
+
+    rng = tf.random.Generator.from_seed(seed) if seed is not None else tf.random.Generator.from_non_deterministic_state()
+
+    def augment(images):
+        shape = tf.shape(images)
+        n = shape[:1]
+        h = tf.cast(shape[1], tf.float32)
+        w = tf.cast(shape[2], tf.float32)
+        angle = rng.uniform(n, -1.0, 1.0) * (ROTATION_DEGREES * math.pi / 180)
+        zoom_x = 1.0 + rng.uniform(n, -ZOOM_RANGE, ZOOM_RANGE)
+        zoom_y = 1.0 + rng.uniform(n, -ZOOM_RANGE, ZOOM_RANGE)
+        shift_x = rng.uniform(n, -SHIFT_RANGE, SHIFT_RANGE) * w
+        shift_y = rng.uniform(n, -SHIFT_RANGE, SHIFT_RANGE) * h
+        flip = tf.where(rng.uniform(n) < 0.5, -1.0, 1.0)
+
+        # Output pixel -> input pixel: rotate(zoom(flip(p - centre))) + centre + shift
+        cos, sin = tf.cos(angle), tf.sin(angle)
+        a0, a1 = cos * zoom_x * flip, -sin * zoom_y
+        b0, b1 = sin * zoom_x * flip, cos * zoom_y
+        cx, cy = (w - 1.0) / 2.0, (h - 1.0) / 2.0
+        a2 = cx - a0 * cx - a1 * cy + shift_x
+        b2 = cy - b0 * cx - b1 * cy + shift_y
+        zeros = tf.zeros_like(a0)
+        transforms = tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+        return tf.raw_ops.ImageProjectiveTransformV3(
+            images=images, transforms=transforms, output_shape=shape[1:3], fill_value=0.0,
+            interpolation="BILINEAR", fill_mode="NEAREST",
+        )
+
+    return augment
+
+
+def _finish(ds, num_classes, augment, seed):
+    # uint8 batches -> augmented float32 in [0, 1] + one-hot labels
+    import tensorflow as tf
+
+    augmenter = build_augmenter(seed) if augment else None
+
+    def finish(images, labels):
+        images = tf.cast(images, tf.float32)
+        if augmenter is not None:
+            images = augmenter(images)
+        return images / 255.0, tf.one_hot(labels, num_classes)
+
+    ds = ds.map(finish, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def make_gather_dataset(source, indices, batch_size=32, training=False, augment=False, seed=42):
+    # Batches of uint8 images gathered from the memory-mapped shards
+    # (image_shards.py) or the tiered cache (image_cache.py)
+    import numpy as np
+    import tensorflow as tf
+
+    size = source.image_size
+    labels = source.labels
+
+    ds = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if training:
+        ds = ds.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+
+    def gather(batch_indices):
+        return source.gather(batch_indices), labels[batch_indices]
+
+    def load(batch_indices):
+        images, batch_labels = tf.numpy_function(gather, [batch_indices], (tf.uint8, tf.int32))
+        images.set_shape((None, size, size, 3))
+        batch_labels.set_shape((None,))
+        return images, batch_labels
+
+    ds = ds.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    return _finish(ds, source.num_classes, augment, seed)
+
+
+def make_shard_train_val(shards_dir, batch_size=32, validation_split=0.2, seed=42):
+    from image_shards import ShardedImages
+
+    shards = ShardedImages(shards_dir)
+    train, val = shards.split(validation_split)
+    train_ds = make_gather_dataset(shards, train, batch_size, training=True, augment=True, seed=seed)
+    val_ds = make_gather_dataset(shards, val, batch_size, seed=seed)
+    print(f"Found {len(train)} training and {len(val)} validation images in {len(shards.class_indices)} classes (shards).")
+    return train_ds, val_ds, dict(shards.class_indices), []
+
+
+def make_train_val(dataset_dir, batch_size=32, validation_split=0.2, cache_dir=None, ram_mb=2048,
+                   seed=42, workers=None):
+    # Returns the datasets plus their image caches (for per-epoch stats).
+    # cache_dir=None keeps every image in RAM; otherwise images past the
+    # ram_mb budget (shared by train and val, train first) spill to disk there.
+    import numpy as np
+    from image_cache import TieredImageCache
+
+    class_indices, files = list_dataset(dataset_dir)
+    train, val = split_dataset(class_indices, files, validation_split)
+    num_classes = len(class_indices)
+
+    ram_bytes = ram_mb * 1024 * 1024
+    train_cache = TieredImageCache(train, num_classes, "train", ram_bytes, cache_dir, workers=workers)
+    val_cache = TieredImageCache(val, num_classes, "val", max(0, ram_bytes - train_cache.ram_bytes),
+                                 cache_dir, workers=workers)
+
+    train_ds = make_gather_dataset(train_cache, np.arange(len(train)), batch_size, training=True,
+                                   augment=True, seed=seed)
+    val_ds = make_gather_dataset(val_cache, np.arange(len(val)), batch_size, seed=seed)
+    print(f"Found {len(train)} training and {len(val)} validation images belonging to {num_classes} classes.")
+    return train_ds, val_ds, class_indices, [train_cache, val_cache]
@@ -0,0 +1,182 @@
+import json
+import os
+import time
+
+import numpy as np
+
+# ---------------- Disease Model Outputs ----------------
+# Turning softmax rows into answers:
+# - DiseaseLabels precomputes the label, crop and "healthy" flag of every
+#   class index once per class_indices.json, so a request does tuple
+#   lookups instead of substring checks.
+# - top_k() picks the k best classes of a whole batch with one
+#   argpartition.
+# - Temperature scaling (fitted on the validation split by
+#   train_disease_model.py) turns the raw softmax into calibrated
+#   confidences without changing the ranking.
+
+CROP_KEYWORDS = (
+    (("potato",), "potato"),
+    (("tomato",), "tomato"),
+    (("pepper", "bell"), "pepper"),
+    (("grape",), "grapes"),
+    (("citrus", "orange"), "orange"),
+    (("corn", "maize"), "maize"),
+)
+
+
+def extract_crop_name(label):
+    label = label.lower()
+    for keywords, crop in CROP_KEYWORDS:
+        if any(k in label for k in keywords):
+            return crop
+    return "unknown"
+
+
+class DiseaseLabels:
+    def __init__(self, class_indices):
+        size = max(class_indices.values(), default=-1) + 1
+        names = ["Unknown"] * size
+        for name, index in class_indices.items():
+            names[index] = name
+        self.names = tuple(names)
+        self.crops = tuple(extract_crop_name(n) for n in names)
+        self.healthy = tuple("healthy" in n.lower() for n in names)
+
+    @classmethod
+    def from_file(cls, path):
+        if not os.path.exists(path):
+            return cls({})
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self.names)
+
+    def name(self, index):
+        return self.names[index] if 0 <= index < len(self.names) else "Unknown"
+
+    def crop(self, index):
+        return self.crops[index] if 0 <= index < len(self.crops) else "unknown"
+
+    def is_healthy(self, index):
+        return 0 <= index < len(self.healthy) and self.healthy[index]
+
+    def crop_array(self, classes):
+        # Crop per output index, for vectorized checks over a batch
+        crops = self.crops[:classes] + ("unknown",) * (classes - len(self.crops))
+        return np.array(crops, dtype=object)
+
+    def healthy_array(self, classes):
+        healthy = self.healthy[:classes] + (False,) * (classes - len(self.healthy))
+        return np.array(healthy, dtype=bool)
+
+
+def top_k(probs, k=1):
+    """Indices and values of the k largest entries per row, best first.
+
+    Works on one row (C,) or a batch (n, C). Ties go to the lower index,
+    like np.argmax.
+    """
+    probs = np.asarray(probs)
+    classes = probs.shape[-1]
+    k = max(1, min(int(k), classes))
+    if probs.ndim == 1:
+        # Per-request path: plain 1-D calls, no fancy-indexing machinery
+        if k == 1:
+            idx = np.array([np.argmax(probs)])
+        else:
+            idx = np.sort(np.argpartition(probs, classes - k)[-k:])
+            idx = idx[np.argsort(-probs[idx], kind="stable")]
+        return idx, probs[idx]
+
+    if k == 1:
+        idx = np.argmax(probs, axis=1)[:, np.newaxis]
+    else:
+        # Only the k picked entries get sorted; sorting the indices first makes
+        # the stable sort break ties by index
+        idx = np.sort(np.argpartition(probs, classes - k, axis=1)[:, -k:], axis=1)
+        order = np.argsort(-np.take_along_axis(probs, idx, axis=1), axis=1, kind="stable")
+        idx = np.take_along_axis(idx, order, axis=1)
+    return idx, np.take_along_axis(probs, idx, axis=1)
+
+
+# ---------------- Temperature Scaling ----------------
+def apply_temperature(probs, temperature):
+    # softmax(log p / T) == softmax(logits / T): no logits needed
+    if not temperature or temperature == 1.0:
+        return probs
+    probs = np.asarray(probs)
+    logits = np.log(np.maximum(probs, 1e-12, dtype=np.float64)) / temperature
+    logits -= logits.max(axis=-1, keepdims=True)
+    scaled = np.exp(logits)
+    scaled /= scaled.sum(axis=-1, keepdims=True)
+    return scaled.astype(probs.dtype)
+
+
+def negative_log_likelihood(probs, labels, temperature=1.0):
+    logits = np.log(np.maximum(probs, 1e-12, dtype=np.float64)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    log_norm = np.log(np.exp(logits).sum(axis=1))
+    return float(np.mean(log_norm - logits[np.arange(len(labels)), labels]))
+
+
+def expected_calibration_error(probs, labels, bins=15):
+    confidence = probs.max(axis=1)
+    correct = probs.argmax(axis=1) == labels
+    which = np.minimum((confidence * bins).astype(np.int64), bins - 1)
+    counts = np.bincount(which, minlength=bins)
+    gap = np.abs(np.bincount(which, weights=confidence, minlength=bins)
+                 - np.bincount(which, weights=correct, minlength=bins))
+    return float(gap.sum() / max(1, counts.sum()))
+
+
+def fit_temperature(probs, labels, low=0.05, high=20.0, iterations=60):
+    # NLL is unimodal in log T: golden-section search on it
+    probs = np.asarray(probs, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.int64)
+    a, b = np.log(low), np.log(high)
+    ratio = (np.sqrt(5) - 1) / 2
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    fc, fd = (negative_log_likelihood(probs, labels, np.exp(x)) for x in (c, d))
+    for _ in range(iterations):
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - ratio * (b - a)
+            fc = negative_log_likelihood(probs, labels, np.exp(c))
+        else:
+            a, c, fc = c, d, fd
+            d = a + ratio * (b - a)
+            fd = negative_log_likelihood(probs, labels, np.exp(d))
+    return float(np.exp((a + b) / 2))
+
+
+def fit_calibration(probs, labels):
+    temperature = fit_temperature(probs, labels)
+    calibrated = apply_temperature(np.asarray(probs, dtype=np.float64), temperature)
+    return {
+        "method": "temperature",
+        "temperature": temperature,
+        "samples": int(len(labels)),
+        "classes": int(np.asarray(probs).shape[1]),
+        "nllBefore": negative_log_likelihood(probs, labels),
+        "nllAfter": negative_log_likelihood(probs, labels, temperature),
+        "eceBefore": expected_calibration_error(np.asarray(probs), labels),
+        "eceAfter": expected_calibration_error(calibrated, labels),
+        "fittedAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def save_calibration(calibration, path):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_temperature(path):
+    # None (raw softmax) when there is no calibration file
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return float(json.load(f)["temperature"])
@@ -0,0 +1,186 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from response_cache import file_fingerprint
+
+# Softmax vectors for uploaded leaf photos, keyed by a hash of the raw
+# upload bytes. An optional 64-bit difference hash (dHash) of the decoded
+# image also catches the same photo re-encoded or re-saved by a phone.
+# Every entry is dropped when the model or class_indices.json changes:
+# either watch_paths are polled here, or the owner passes a version and
+# calls set_version() when it swaps the model. Lookups and stores made
+# with another version than the current one are ignored, so a request
+# still running on the old model neither reads nor writes new entries.
+#
+# Near-duplicate lookups use multi-index hashing: the 64 bits are split
+# into phash_max_distance + 1 bands, and two hashes within that distance
+# agree exactly on at least one band. Only the hashes sharing a band with
+# the query are compared, so a lookup never walks the whole cache.
+
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_bands(max_distance):
+    # (shift, mask) of each band; empty for exact matching only
+    if max_distance <= 0:
+        return ()
+    count = min(64, max_distance + 1)
+    edges = [round(64 * i / count) for i in range(count + 1)]
+    return tuple((low, (1 << (high - low)) - 1) for low, high in zip(edges, edges[1:]))
+
+
+def perceptual_hash(image):
+    # dHash: compare neighbouring pixels of a 9x8 grayscale thumbnail.
+    small = np.asarray(image.convert("L").resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class DiseaseResultCache:
+    def __init__(self, max_bytes, watch_paths=(), use_phash=False, phash_max_distance=0, check_interval=1.0,
+                 version=None):
+        self.max_bytes = int(max_bytes)
+        self.use_phash = use_phash
+        self.phash_max_distance = int(phash_max_distance)
+        self.watch_paths = tuple(watch_paths)
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # content key -> (probs, phash)
+        self._by_phash = {}             # phash -> content key
+        self._hash_bands = hash_bands(self.phash_max_distance)
+        self._band_index = [{} for _ in self._hash_bands]   # band value -> phashes
+        self._bytes = 0
+        self._version = version if version is not None else file_fingerprint(*self.watch_paths)
+        self._next_check = time.monotonic() + check_interval
+
+        self.hits = 0
+        self.phash_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if not self.watch_paths or now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        self._set_version(file_fingerprint(*self.watch_paths))
+
+    def _set_version(self, version):
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self._by_phash.clear()
+            for index in self._band_index:
+                index.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def set_version(self, version):
+        with self._lock:
+            self._set_version(version)
+
+    def _stale(self, version):
+        return version is not None and version != self._version
+
+    def get(self, key, version=None):
+        with self._lock:
+            self._check_version()
+            if self._stale(version):
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_similar(self, phash, version=None):
+        with self._lock:
+            if self._stale(version):
+                return None
+            key = self._by_phash.get(phash)
+            if key is None and self._hash_bands:
+                candidates = set()
+                for (shift, mask), index in zip(self._hash_bands, self._band_index):
+                    candidates.update(index.get((phash >> shift) & mask, ()))
+                best = self.phash_max_distance + 1
+                for other in candidates:
+                    distance = (other ^ phash).bit_count()
+                    if distance < best:
+                        best, key = distance, self._by_phash[other]
+            if key is None:
+                return None
+            self._entries.move_to_end(key)
+            self.phash_hits += 1
+            return self._entries[key][0]
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, probs, phash=None, version=None):
+        probs = np.array(probs, dtype=np.float32)
+        probs.setflags(write=False)
+        size = probs.nbytes + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if self._stale(version):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (probs, phash)
+            self._bytes += size
+            if phash is not None:
+                if phash not in self._by_phash:
+                    self._index_phash(phash, add=True)
+                self._by_phash[phash] = key
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        probs, phash = self._entries.pop(key)
+        self._bytes -= probs.nbytes + ENTRY_OVERHEAD_BYTES
+        if phash is not None and self._by_phash.get(phash) == key:
+            del self._by_phash[phash]
+            self._index_phash(phash, add=False)
+
+    def _index_phash(self, phash, add):
+        for (shift, mask), index in zip(self._hash_bands, self._band_index):
+            band = (phash >> shift) & mask
+            if add:
+                index.setdefault(band, set()).add(phash)
+            else:
+                bucket = index.get(band)
+                if bucket is not None:
+                    bucket.discard(phash)
+                    if not bucket:
+                        del index[band]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.phash_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "perceptualHash": self.use_phash,
+                "hits": self.hits,
+                "perceptualHits": self.phash_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hitRate": (self.hits + self.phash_hits) / lookups if lookups else 0.0,
+            }
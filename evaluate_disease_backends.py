@@ -0,0 +1,122 @@
+# evaluate_disease_backends.py
+#
+# Accuracy-parity check for the exported disease models. Runs the Keras
+# reference and a TFLite / ONNX backend over a held-out image folder
+# (one sub-folder per class, named as in class_indices.json) and fails
+# if the backend loses more accuracy than allowed. --shards reads the
+# validation split of a build_image_shards.py folder instead.
+#   python evaluate_disease_backends.py --data-dir <held-out> --backend tflite \
+#       --backend-path models/plant_disease_prediction_model_int8.tflite
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from disease_backends import KerasBackend, OnnxBackend, TFLiteBackend
+from image_preprocessing import IMAGE_SIZE, preprocess_image
+from image_shards import ShardedImages
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "models", "plant_disease_prediction_model.h5")
+CLASS_INDICES_PATH = os.path.join(BASE_DIR, "class_indices.json")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def held_out_set(data_dir, class_indices, limit_per_class):
+    samples = []
+    for class_name, index in sorted(class_indices.items(), key=lambda kv: kv[1]):
+        class_dir = os.path.join(data_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        files = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        if limit_per_class:
+            files = files[:limit_per_class]
+        samples.extend((os.path.join(class_dir, f), index) for f in files)
+    return samples
+
+
+def load_batches(samples, batch_size):
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        batch = np.empty((len(chunk), IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+        for i, (path, _) in enumerate(chunk):
+            preprocess_image(path, out=batch[i])
+        yield batch
+
+
+def shard_batches(shards, indices, batch_size):
+    for start in range(0, len(indices), batch_size):
+        yield shards.gather(indices[start:start + batch_size]).astype(np.float32) / 255.0
+
+
+def run(backend, batches):
+    probs = []
+    elapsed = 0.0
+    for batch in batches:
+        t0 = time.perf_counter()
+        probs.append(backend.predict(batch))
+        elapsed += time.perf_counter() - t0
+    return np.concatenate(probs), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an exported disease backend against Keras")
+    parser.add_argument("--data-dir", help="Held-out images, one folder per class")
+    parser.add_argument("--shards", help="Shard folder from build_image_shards.py (uses its validation split)")
+    parser.add_argument("--validation-split", type=float, default=0.2)
+    parser.add_argument("--backend", choices=["tflite", "onnx"], required=True)
+    parser.add_argument("--backend-path", required=True)
+    parser.add_argument("--keras-path", default=MODEL_PATH)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit-per-class", type=int, default=0)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01)
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    args = parser.parse_args()
+
+    if args.shards:
+        shards = ShardedImages(args.shards)
+        _, indices = shards.split(args.validation_split)
+        labels = shards.labels[indices]
+        make_batches = lambda: shard_batches(shards, indices, args.batch_size)
+    elif args.data_dir:
+        with open(CLASS_INDICES_PATH, "r") as f:
+            class_indices = json.load(f)
+        samples = held_out_set(args.data_dir, class_indices, args.limit_per_class)
+        labels = np.array([label for _, label in samples])
+        make_batches = lambda: load_batches(samples, args.batch_size)
+    else:
+        sys.exit("❌ Pass --data-dir or --shards")
+    if not len(labels):
+        sys.exit("❌ No held-out images found")
+
+    reference = KerasBackend(args.keras_path)
+    candidate = (TFLiteBackend if args.backend == "tflite" else OnnxBackend)(args.backend_path, args.threads)
+
+    ref_probs, ref_time = run(reference, make_batches())
+    new_probs, new_time = run(candidate, make_batches())
+
+    ref_top1 = ref_probs.argmax(axis=1)
+    new_top1 = new_probs.argmax(axis=1)
+    ref_acc = float((ref_top1 == labels).mean())
+    new_acc = float((new_top1 == labels).mean())
+    agreement = float((ref_top1 == new_top1).mean())
+
+    print(f"📊 {len(labels)} held-out images")
+    print(f"   Keras   accuracy: {ref_acc:.4f}  ({ref_time / len(labels) * 1000:.2f} ms/image)")
+    print(f"   {args.backend:<7} accuracy: {new_acc:.4f}  ({new_time / len(labels) * 1000:.2f} ms/image)")
+    print(f"   top-1 agreement: {agreement:.4f}")
+    print(f"   max |Δp|: {np.abs(ref_probs - new_probs).max():.5f}")
+
+    if ref_acc - new_acc > args.max_accuracy_drop or agreement < args.min_agreement:
+        print("❌ Parity check failed")
+        sys.exit(1)
+    print("✅ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
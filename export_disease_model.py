@@ -0,0 +1,109 @@
+# export_disease_model.py
+#
+# Converts the Keras model written by train_disease_model.py into lighter
+# CPU runtimes for serving (see DISEASE_BACKEND in config.py):
+#   python export_disease_model.py --format tflite
+#   python export_disease_model.py --format tflite --quantize int8 --calibration-dir <dataset>
+#   python export_disease_model.py --format onnx      (needs tf2onnx)
+
+import argparse
+import os
+
+import numpy as np
+
+from disease_backends import TFLiteBackend
+from image_preprocessing import preprocess_image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "models", "plant_disease_prediction_model.h5")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def calibration_images(directory, limit):
+    paths = []
+    for root, _, files in sorted(os.walk(directory)):
+        paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    rng = np.random.default_rng(42)
+    rng.shuffle(paths)
+    for path in paths[:limit]:
+        yield preprocess_image(path)[None]
+
+
+def export_tflite(model, out_path, quantize, calibration_dir=None, calibration_samples=200):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantize == "int8":
+        if not calibration_dir:
+            raise SystemExit("❌ --quantize int8 needs --calibration-dir with sample images")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([x] for x in calibration_images(calibration_dir, calibration_samples))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # Keep float input/output so the serving code stays the same
+        converter.inference_input_type = tf.float32
+        converter.inference_output_type = tf.float32
+
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    return out_path
+
+
+def export_onnx(model, out_path, opset=17):
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError:
+        raise SystemExit("❌ ONNX export needs tf2onnx: pip install tf2onnx onnxruntime")
+
+    spec = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=out_path)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the disease model to TFLite / ONNX")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--format", choices=["tflite", "onnx", "all"], default="tflite")
+    parser.add_argument("--quantize", choices=["none", "dynamic", "float16", "int8"], default="none")
+    parser.add_argument("--calibration-dir", help="Image folder used to calibrate int8 quantization")
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--out-dir", default=os.path.join(BASE_DIR, "models"))
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    model = tf.keras.models.load_model(args.model)
+    stem = os.path.splitext(os.path.basename(args.model))[0]
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    exported = []
+    if args.format in ("tflite", "all"):
+        suffix = "" if args.quantize == "none" else f"_{args.quantize}"
+        out_path = os.path.join(args.out_dir, f"{stem}{suffix}.tflite")
+        export_tflite(model, out_path, args.quantize, args.calibration_dir, args.calibration_samples)
+        exported.append(out_path)
+
+    if args.format in ("onnx", "all"):
+        out_path = os.path.join(args.out_dir, f"{stem}.onnx")
+        export_onnx(model, out_path)
+        exported.append(out_path)
+
+    # Quick drift report on random input; the real gate is evaluate_disease_backends.py
+    sample = np.random.default_rng(0).random((4, 224, 224, 3), dtype=np.float32)
+    reference = np.asarray(model.predict_on_batch(sample))
+    for path in exported:
+        if path.endswith(".tflite"):
+            out = TFLiteBackend(path).predict(sample)
+            print(f"   max |Δp| vs Keras on random input: {np.abs(out - reference).max():.5f}")
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"✅ Exported {path} ({size_mb:.1f} MB)")
+
+    print("ℹ️ Run evaluate_disease_backends.py on a held-out set before switching DISEASE_BACKEND.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# export_forests.py
+#
+# Converts the RandomForest pickles into the compact memory-mapped format
+# of forest_artifacts.py (models/<name>.forest/) and checks that the
+# exported forest predicts exactly like the pickle on random inputs.
+#   python export_forests.py
+#   python export_forests.py models/crop_model.pkl
+
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+from forest_artifacts import export_forest, forest_path_for, load_forest
+
+DEFAULT_MODELS = ["models/crop_model.pkl", "models/fertilizer_model.pkl"]
+
+
+def check_parity(model, forest, rows=2000, seed=0):
+    # Random inputs spanning the split thresholds of every feature
+    rng = np.random.default_rng(seed)
+    used = forest.feature >= 0
+    lo = np.full(forest.n_features_in_, 0.0)
+    hi = np.full(forest.n_features_in_, 1.0)
+    for j in range(forest.n_features_in_):
+        t = forest.threshold[used & (forest.feature == j)]
+        if t.size:
+            lo[j], hi[j] = t.min() - 1, t.max() + 1
+    X = rng.uniform(lo, hi, size=(rows, forest.n_features_in_))
+    return np.array_equal(model.predict_proba(X), forest.predict_proba(X))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export RandomForest pickles as memory-mapped forests")
+    parser.add_argument("models", nargs="*", default=DEFAULT_MODELS)
+    args = parser.parse_args()
+
+    for path in args.models:
+        if not os.path.exists(path):
+            print(f"⚠️ {path} not found, skipped")
+            continue
+        model = joblib.load(path)
+        out = forest_path_for(path)
+        manifest = export_forest(model, out, source_path=path)
+
+        start = time.perf_counter()
+        forest = load_forest(out, source_path=path)
+        load_ms = (time.perf_counter() - start) * 1000
+        size_mb = sum(os.path.getsize(os.path.join(out, f)) for f in os.listdir(out)) / (1024 * 1024)
+        print(f"✅ {path} -> {out}: {manifest['nEstimators']} trees, {len(forest.feature)} nodes, "
+              f"{size_mb:.1f} MB (pickle {os.path.getsize(path) / (1024 * 1024):.1f} MB), loads in {load_ms:.1f} ms")
+
+        if not check_parity(model, forest):
+            raise SystemExit(f"❌ {out} does not reproduce {path} predictions")
+
+
+if __name__ == "__main__":
+    main()
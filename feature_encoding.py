@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# ---------------- Feature Encoding ----------------
+# The categorical inputs of the fertilizer model (soil type, crop type),
+# encoded the same way by the training scripts, /get_fertilizer and
+# bulk_score.py.
+#
+# - canonicalize() folds case, surrounding whitespace, "_" and "-" and
+#   known aliases into the spelling the model was trained on:
+#   "Sandy_Loam", "sandy-loam " and "SANDY  LOAM" are all "sandy loam",
+#   and "corn" is "maize".
+# - CategoryEncoder compiles a fitted LabelEncoder into a dict from every
+#   accepted spelling to its code, built once when the model loads. A
+#   request does one dict lookup instead of LabelEncoder.transform (input
+#   validation + searchsorted), and the list of valid values for the 400
+#   response is built once.
+#
+# The fitted LabelEncoders stay the saved artifact (models/*_encoder.pkl),
+# so models trained before this module still load.
+
+# Alias -> class name, per field. Keys and values are canonical spellings.
+ALIASES = {
+    "soil": {
+        "sandy": "sand",
+        "clayey": "clay",
+    },
+    "crop": {
+        "corn": "maize",
+        "grape": "grapes",
+        "potatoes": "potato",
+        "bell pepper": "pepper",
+        "capsicum": "pepper",
+        "citrus": "orange",
+        "oranges": "orange",
+    },
+}
+
+# Which field each saved encoder encodes
+ENCODER_FIELDS = {"soil_encoder": "soil", "crop_encoder": "crop"}
+
+_SEPARATORS = str.maketrans("_-", "  ")
+
+
+def normalize_category(value):
+    return " ".join(str(value).lower().translate(_SEPARATORS).split())
+
+
+def canonicalize(value, field=None):
+    value = normalize_category(value)
+    return ALIASES.get(field, {}).get(value, value) if field else value
+
+
+def canonicalize_column(values, field=None):
+    # Vectorized canonicalize() for a training column: each distinct value once
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).astype(str))
+    return np.array([canonicalize(u, field) for u in uniques], dtype=object)[codes]
+
+
+class UnknownCategory(ValueError):
+    def __init__(self, field, value):
+        super().__init__(f"unknown {field} '{value}'")
+        self.field = field
+        self.value = value
+
+
+class CategoryEncoder:
+    def __init__(self, classes, field):
+        self.field = field
+        self.classes = tuple(str(c) for c in classes)
+        # Payload for "validCrops" / "validSoils", shared by every error response
+        self.valid_values = self.classes
+
+        lookup = {}
+        for code, name in enumerate(self.classes):
+            lookup[name] = code
+            lookup.setdefault(normalize_category(name), code)
+        for alias, target in ALIASES.get(field, {}).items():
+            if target in lookup:
+                lookup.setdefault(alias, lookup[target])
+        self._lookup = lookup
+
+    @classmethod
+    def from_label_encoder(cls, encoder, field):
+        return cls(encoder.classes_, field)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def code(self, value, default=None):
+        # Exact spelling first: the common case costs one dict lookup
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup.get(normalize_category(value), default)
+        return code
+
+    def encode(self, value):
+        code = self.code(value)
+        if code is None:
+            raise UnknownCategory(self.field, value)
+        return code
+
+    def canonical(self, value):
+        return self.classes[self.encode(value)]
+
+    def encode_many(self, values):
+        """(codes, ok) for a column; unknown values get code -1 and ok False."""
+        labels, uniques = pd.factorize(pd.Series(values, dtype=object))
+        # NaN has label -1, which picks the trailing -1
+        table = np.array([self.code(u, -1) for u in uniques] + [-1], dtype=np.int64)
+        codes = table[labels]
+        return codes, codes >= 0
+
+
+def load_encoder(path, field):
+    import joblib
+    return CategoryEncoder.from_label_encoder(joblib.load(path), field)
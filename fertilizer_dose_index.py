@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from feature_encoding import canonicalize
+
+# Fertilizer_dose.csv is loaded once into a read-only index keyed by the
+# normalized crop name, so /get_fertilizer does a dict lookup and one
+# vectorized multiply instead of scanning the DataFrame per request.
+
+NPK_COLUMNS = ['N (kg/ha)', 'P (kg/ha)', 'K (kg/ha)']
+
+
+def normalize_crop(name):
+    # Same spelling rules as the fertilizer model's crop encoder
+    return canonicalize(name, "crop")
+
+
+@dataclass(frozen=True)
+class CropDoses:
+    npk_per_ha: np.ndarray   # (n, 3) read-only, CSV order
+    options: tuple           # per-row static fields (name, type, notes, per-ha values)
+    organic: tuple           # row positions of organic fertilizers
+    chemical: tuple          # row positions of everything else
+
+    def scaled(self, land_ha):
+        # One multiply for all rows; round() per value keeps the previous output exactly.
+        scaled = (self.npk_per_ha * land_ha).tolist()
+        out = []
+        for option, (n, p, k) in zip(self.options, scaled):
+            fert_data = dict(option)
+            fert_data["N"] = round(n, 2)
+            fert_data["P"] = round(p, 2)
+            fert_data["K"] = round(k, 2)
+            out.append(fert_data)
+        return [out[i] for i in self.organic], [out[i] for i in self.chemical]
+
+
+@dataclass(frozen=True)
+class DoseIndex:
+    crops: MappingProxyType
+    available_crops: tuple
+    mtime: float
+
+    def get(self, crop_type):
+        return self.crops.get(normalize_crop(crop_type))
+
+
+def build_dose_index(path):
+    mtime = os.stat(path).st_mtime
+    df = pd.read_csv(path)
+    df.columns = [c.strip() for c in df.columns]
+
+    keys = df['Crop Type'].map(normalize_crop)
+    fert_types = df['Fertilizer Type'] if 'Fertilizer Type' in df.columns else pd.Series('N/A', index=df.index)
+    notes = df['Notes'].fillna('') if 'Notes' in df.columns else pd.Series('', index=df.index)
+
+    crops = {}
+    for key, positions in df.groupby(keys, sort=False).indices.items():
+        npk = df[NPK_COLUMNS].to_numpy()[positions]
+        npk.setflags(write=False)
+
+        options = []
+        organic = []
+        chemical = []
+        for j, (pos, per_ha) in enumerate(zip(positions, npk.tolist())):
+            fert_type = fert_types.iloc[pos]
+            options.append(MappingProxyType({
+                "name": df['Fertilizer Name'].iloc[pos],
+                "type": fert_type,
+                "notes": notes.iloc[pos],
+                "nPerHa": per_ha[0],
+                "pPerHa": per_ha[1],
+                "kPerHa": per_ha[2],
+            }))
+            if str(fert_type).strip().lower() == 'organic':
+                organic.append(j)
+            else:
+                chemical.append(j)
+
+        crops[key] = CropDoses(npk, tuple(options), tuple(organic), tuple(chemical))
+
+    return DoseIndex(
+        crops=MappingProxyType(crops),
+        available_crops=tuple(df['Crop Type'].unique().tolist()),
+        mtime=mtime,
+    )
+
+
+class DoseIndexLoader:
+    # Hands out the current index and rebuilds it when the CSV changes on
+    # disk. The file is stat'ed at most once per check_interval seconds.
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index = build_dose_index(path)
+        self._next_check = time.monotonic() + check_interval
+
+    def get(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._index
+        with self._lock:
+            if now >= self._next_check:
+                self._next_check = now + self.check_interval
+                try:
+                    if os.stat(self.path).st_mtime != self._index.mtime:
+                        self._index = build_dose_index(self.path)
+                except (OSError, ValueError, KeyError) as e:
+                    # Keep serving the last good index while the file is mid-write
+                    print(f"⚠️ Could not reload {self.path}: {e}")
+        return self._index
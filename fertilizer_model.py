@@ -5,6 +5,9 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 import os
 
+from feature_encoding import canonicalize_column
+from forest_artifacts import export_forest, forest_path_for
+
 # -----------------------------
 # STEP 1: Load Dataset
 # -----------------------------
@@ -16,11 +19,12 @@ data.columns = [col.strip() for col in data.columns]
 # -----------------------------
 # STEP 2: Encode Categorical Columns
 # -----------------------------
+# Same spelling rules (case, "_"/"-", aliases) as app.py (see feature_encoding.py)
 soil_le = LabelEncoder()
 crop_le = LabelEncoder()
 
-data["Soil Type"] = soil_le.fit_transform(data["Soil Type"].str.lower())
-data["Crop Type"] = crop_le.fit_transform(data["Crop Type"].str.lower())
+data["Soil Type"] = soil_le.fit_transform(canonicalize_column(data["Soil Type"], "soil"))
+data["Crop Type"] = crop_le.fit_transform(canonicalize_column(data["Crop Type"], "crop"))
 
 # -----------------------------
 # STEP 3: Prepare Features and Target
@@ -50,3 +54,7 @@ with open("models/crop_encoder.pkl", "wb") as f:
     pickle.dump(crop_le, f)
 
 print("✅ Fertilizer model and encoders saved successfully!")
+
+# Compact memory-mapped copy that app.py loads (see forest_artifacts.py)
+export_forest(model, forest_path_for("models/fertilizer_model.pkl"), source_path="models/fertilizer_model.pkl")
+print("✅ Exported models/fertilizer_model.forest")
@@ -0,0 +1,219 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from forest_engine import ForestEngine
+
+# ---------------- Compact Forest Artifacts ----------------
+# A trained RandomForestClassifier flattened into a directory of .npy
+# arrays plus manifest.json:
+#
+#   models/crop_model.forest/
+#       manifest.json    format version, classes, feature names, source pickle
+#       feature.npy      int32  split feature per node
+#       threshold.npy    float64 split threshold per node
+#       left.npy         int32  left child (global node id), or -1 - leaf id
+#       right.npy        int32  right child (global node id)
+#       missing_left.npy bool   NaN goes to the left child
+#       value.npy        float64 class proportions per leaf (as predict_proba returns them)
+#       roots.npy        int32  root node id of every tree
+#
+# The arrays are opened with np.load(mmap_mode="r"): loading takes
+# milliseconds, needs neither pickle nor scikit-learn, and every worker
+# process shares the same page-cache pages instead of a private copy.
+
+FORMAT_VERSION = 1
+FOREST_SUFFIX = ".forest"
+ARRAYS = ("feature", "threshold", "left", "right", "missing_left", "value", "roots")
+
+
+class ForestFormatError(ValueError):
+    pass
+
+
+def forest_path_for(pickle_path):
+    return os.path.splitext(pickle_path)[0] + FOREST_SUFFIX
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtimeNs": st.st_mtime_ns}
+
+
+def _sklearn_stores_proportions():
+    # scikit-learn >= 1.4 keeps class proportions in tree_.value and returns
+    # them as is; older releases keep counts and normalize in predict_proba
+    try:
+        import sklearn
+    except ImportError:
+        return True
+    major, minor = (int(v) for v in sklearn.__version__.split(".")[:2])
+    return (major, minor) >= (1, 4)
+
+
+_STORES_PROPORTIONS = _sklearn_stores_proportions()
+
+
+def flatten_forest(model):
+    if not hasattr(model, "estimators_") or getattr(model, "n_outputs_", 1) != 1:
+        raise ForestFormatError(f"Only fitted single-output forest classifiers can be exported, got {type(model).__name__}")
+
+    feature, threshold, left, right, missing_left, values, roots = [], [], [], [], [], [], []
+    offset = 0
+    leaves = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+
+        # Leaves get ids into the value table, encoded as -1 - leaf id
+        leaf_ids = np.cumsum(is_leaf) - 1 + leaves
+        tree_left = np.where(is_leaf, -1 - leaf_ids, tree.children_left + offset)
+        tree_right = np.where(is_leaf, -1 - leaf_ids, tree.children_right + offset)
+
+        # What DecisionTreeClassifier.predict_proba returns for each leaf
+        proba = tree.value[is_leaf, 0, :model.n_classes_].astype(np.float64)
+        if not _STORES_PROPORTIONS:
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+
+        feature.append(tree.feature)
+        threshold.append(tree.threshold)
+        left.append(tree_left)
+        right.append(tree_right)
+        missing = getattr(tree, "missing_go_to_left", None)
+        missing_left.append(np.zeros(n, dtype=bool) if missing is None else np.asarray(missing, dtype=bool))
+        values.append(proba)
+        roots.append(offset)
+        offset += n
+        leaves += int(is_leaf.sum())
+
+    if offset >= 2 ** 31:
+        raise ForestFormatError(f"Forest has {offset} nodes, more than int32 node ids allow")
+
+    return {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "missing_left": np.concatenate(missing_left),
+        "value": np.ascontiguousarray(np.concatenate(values)),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }
+
+
+def export_forest(model, path, source_path=None):
+    arrays = flatten_forest(model)
+    classes = model.classes_
+    manifest = {
+        "formatVersion": FORMAT_VERSION,
+        "modelClass": type(model).__name__,
+        "sklearnVersion": __import__("sklearn").__version__,
+        "nEstimators": len(model.estimators_),
+        "nFeatures": int(model.n_features_in_),
+        "featureNames": [str(c) for c in getattr(model, "feature_names_in_", [])] or None,
+        "classes": [c.item() if hasattr(c, "item") else c for c in classes],
+        "classesDtype": "object" if classes.dtype == object else classes.dtype.str,
+        "arrays": {name: {"dtype": a.dtype.str, "shape": list(a.shape)} for name, a in arrays.items()},
+        "source": _source_stamp(source_path) if source_path and os.path.exists(source_path) else None,
+    }
+
+    # Write next to the target and swap in, so readers never see half a forest
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, a in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), a, allow_pickle=False)
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    old = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+class CompactForest:
+    """Read-only RandomForestClassifier stand-in backed by memory-mapped arrays."""
+
+    def __init__(self, path, manifest, arrays):
+        self.path = path
+        self.manifest = manifest
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        dtype = manifest["classesDtype"]
+        self.classes_ = np.array(manifest["classes"], dtype=object if dtype == "object" else np.dtype(dtype))
+        self.n_classes_ = len(self.classes_)
+        self.n_features_in_ = manifest["nFeatures"]
+        self.n_estimators = manifest["nEstimators"]
+        names = manifest.get("featureNames")
+        if names:
+            self.feature_names_in_ = np.array(names, dtype=object)
+
+        # Prediction runs on the traversal layout of forest_engine.py
+        self.engine = ForestEngine.from_compact(self)
+
+    def apply(self, X):
+        return self.engine.apply(X)
+
+    def predict_proba(self, X):
+        return self.engine.predict_proba(X)
+
+    def predict(self, X):
+        return self.engine.predict(X)
+
+    def predict_row_proba(self, row):
+        return self.engine.predict_row_proba(row)
+
+    def predict_row(self, row):
+        return self.engine.predict_row(row)
+
+
+def load_forest(path, source_path=None, mmap=True):
+    manifest_path = os.path.join(path, "manifest.json")
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ForestFormatError(f"Cannot read {manifest_path}: {e}")
+
+    version = manifest.get("formatVersion")
+    if version != FORMAT_VERSION:
+        raise ForestFormatError(f"{path} has format version {version}, this build reads {FORMAT_VERSION}")
+
+    # A pickle retrained after the export makes the forest stale
+    source = manifest.get("source")
+    if source and source_path and os.path.exists(source_path) and _source_stamp(source_path) != source:
+        raise ForestFormatError(f"{path} was exported from an older {source_path}")
+
+    arrays = {}
+    for name in ARRAYS:
+        expected = manifest.get("arrays", {}).get(name)
+        try:
+            a = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            raise ForestFormatError(f"Cannot load {name}.npy from {path}: {e}")
+        if expected is None or a.dtype.str != expected["dtype"] or list(a.shape) != expected["shape"]:
+            raise ForestFormatError(f"{name}.npy in {path} does not match its manifest")
+        arrays[name] = a
+
+    if len(arrays["roots"]) != manifest["nEstimators"] or arrays["value"].shape[1] != len(manifest["classes"]):
+        raise ForestFormatError(f"{path} is inconsistent with its manifest")
+    return CompactForest(path, manifest, arrays)
+
+
+def load_model(pickle_path, prefer_compact=True):
+    # Compact artifact when there is a current one, the pickle otherwise
+    forest_path = forest_path_for(pickle_path)
+    if prefer_compact and os.path.isdir(forest_path):
+        try:
+            return load_forest(forest_path, source_path=pickle_path)
+        except ForestFormatError as e:
+            print(f"⚠️ {e}; loading {pickle_path} instead")
+    import joblib
+    return joblib.load(pickle_path)
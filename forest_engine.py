@@ -0,0 +1,170 @@
+import numpy as np
+
+# ---------------- Forest Engine ----------------
+# Low-latency RandomForestClassifier inference on flat NumPy node arrays.
+#
+# The forest is compiled once (from a fitted sklearn model or from a
+# forest_artifacts.py export) into:
+#   * children (nodes, 2): left / right child per node. Leaves point to
+#     themselves and split on feature 0 at +inf, so every (row, tree) pair
+#     can take the same `depth` steps without a per-pair leaf test.
+#   * leaf_index (nodes,): row of the leaf in `value` (leaves, classes),
+#     the normalized class proportions. `value` is used as given, so a
+#     memory-mapped export stays shared between processes.
+# Traversal advances every (row, tree) pair one level per step with a few
+# gathers; one row needs ~depth small NumPy calls instead of sklearn's
+# per-tree joblib dispatch. Large batches periodically drop the pairs that
+# have reached a leaf. Results are bit-identical to sklearn's
+# predict_proba: inputs are cast to float32 and compared against the
+# float64 thresholds, and tree probabilities are summed in fit order
+# before dividing by the number of trees.
+
+
+class ForestEngine:
+    # Below this many (row, tree) pairs, dropping finished pairs costs more than it saves
+    COMPACT_MIN_PAIRS = 8192
+
+    def __init__(self, feature, threshold, children, missing_left, leaf_index, value, roots, depth,
+                 classes, n_features, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.leaf_index = leaf_index
+        self.value = value
+        self.is_leaf = children[:, 0] == np.arange(len(children))
+        self.roots = roots
+        self.depth = depth
+        self.classes_ = classes
+        self.n_classes_ = len(classes)
+        self.n_features_in_ = n_features
+        self.n_estimators = len(roots)
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    # ---------------- Compilation ----------------
+    @classmethod
+    def from_arrays(cls, feature, threshold, left, right, missing_left, value, roots,
+                    classes, n_features, feature_names=None):
+        # forest_artifacts layout: leaves have left == right == -1 - leaf id
+        feature = np.array(feature, dtype=np.intp)
+        threshold = np.array(threshold, dtype=np.float64)
+        left = np.asarray(left, dtype=np.intp)
+        right = np.asarray(right, dtype=np.intp)
+        is_leaf = left < 0
+        nodes = np.arange(len(left))
+
+        children = np.empty((len(left), 2), dtype=np.intp)
+        children[:, 0] = np.where(is_leaf, nodes, left)
+        children[:, 1] = np.where(is_leaf, nodes, right)
+        feature[is_leaf] = 0
+        threshold[is_leaf] = np.inf
+        missing_left = np.array(missing_left, dtype=bool)
+        missing_left[is_leaf] = True
+
+        leaf_index = np.where(is_leaf, -1 - left, 0)
+
+        roots = np.asarray(roots, dtype=np.intp)
+        depth = cls._max_depth(children, roots)
+        return cls(feature, threshold, children, missing_left, leaf_index, value, roots, depth,
+                   classes, n_features, feature_names)
+
+    @classmethod
+    def from_compact(cls, forest):
+        return cls.from_arrays(forest.feature, forest.threshold, forest.left, forest.right,
+                               forest.missing_left, forest.value, forest.roots, forest.classes_,
+                               forest.n_features_in_, getattr(forest, "feature_names_in_", None))
+
+    @classmethod
+    def from_sklearn(cls, model):
+        from forest_artifacts import flatten_forest
+
+        a = flatten_forest(model)
+        return cls.from_arrays(a["feature"], a["threshold"], a["left"], a["right"], a["missing_left"],
+                               a["value"], a["roots"], model.classes_, model.n_features_in_,
+                               getattr(model, "feature_names_in_", None))
+
+    @staticmethod
+    def _max_depth(children, roots):
+        # Breadth-first over all trees; depth = levels until only leaves remain
+        frontier = roots
+        depth = 0
+        while True:
+            internal = frontier[children[frontier, 0] != frontier]
+            if not internal.size:
+                return depth
+            frontier = children[internal].ravel()
+            depth += 1
+
+    # ---------------- Prediction ----------------
+    def _check_X(self, X):
+        names = getattr(self, "feature_names_in_", None)
+        columns = getattr(X, "columns", None)
+        if names is not None and columns is not None and list(map(str, columns)) != list(names):
+            raise ValueError(f"Feature names must match those seen at fit time: {list(names)}")
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n, {self.n_features_in_})")
+        return X
+
+    def apply(self, X):
+        """Leaf (row of self.value) every row reaches in every tree, shape (n, n_estimators)."""
+        X = self._check_X(X)
+        n, f = X.shape
+        flat = X.ravel()
+        has_nan = np.isnan(flat).any()
+
+        node = np.tile(self.roots, n)
+        offset = np.repeat(np.arange(n, dtype=np.intp) * f, len(self.roots))
+        compact = node.size >= self.COMPACT_MIN_PAIRS
+        leaves = None
+        for level in range(self.depth):
+            x = flat[offset + self.feature[node]]
+            go_right = ~(x <= self.threshold[node])
+            if has_nan:
+                nan = np.isnan(x)
+                go_right[nan] = ~self.missing_left[node[nan]]
+            node = self.children[node, go_right.view(np.int8)]
+
+            # Every other level, drop the pairs that already sit on a leaf
+            if compact and level % 2 == 1 and level + 1 < self.depth:
+                if leaves is None:
+                    leaves = node.copy()
+                    active = np.arange(node.size)
+                else:
+                    leaves[active] = node
+                keep = ~self.is_leaf[node]
+                active, node, offset = active[keep], node[keep], offset[keep]
+
+        if leaves is None:
+            leaves = node
+        else:
+            leaves[active] = node
+        return self.leaf_index[leaves].reshape(n, len(self.roots))
+
+    def predict_proba(self, X, chunk_rows=2048):
+        X = self._check_X(X)
+        proba = np.zeros((len(X), self.n_classes_), dtype=np.float64)
+        for start in range(0, len(X), chunk_rows):
+            leaves = self.apply(X[start:start + chunk_rows])
+            out = proba[start:start + chunk_rows]
+            # Tree by tree, in fit order, exactly like RandomForestClassifier
+            for t in range(leaves.shape[1]):
+                out += self.value[leaves[:, t]]
+        proba /= self.n_estimators
+        return proba
+
+    def predict_row_proba(self, row):
+        # Single-row fast path: one (trees, classes) gather, summed in tree order
+        leaves = self.apply(row)[0]
+        proba = np.add.reduce(self.value[leaves], axis=0)
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def predict_row(self, row):
+        return self.classes_[int(np.argmax(self.predict_row_proba(row)))]
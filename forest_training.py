@@ -0,0 +1,253 @@
+import hashlib
+import itertools
+import os
+import pickle
+import random
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from feature_encoding import ENCODER_FIELDS, CategoryEncoder, canonicalize_column
+from forest_artifacts import export_forest, flatten_forest, forest_path_for
+from forest_engine import ForestEngine
+
+# ---------------- Forest Training ----------------
+# Shared pieces of the crop / fertilizer training pipeline used by
+# train_forests.py: dataset loading with an on-disk cache of the encoded
+# features, cached cross-validation folds, one (params, fold) trial, Pareto
+# selection and saving the chosen model next to its .forest export.
+
+CACHE_DIR = os.path.join("cache", "training")
+# Bump when the encoding below changes, so cached features are rebuilt
+FEATURES_VERSION = 2
+
+DATASETS = {
+    "crop": {
+        "csv": "data/Crop_recommendation.csv",
+        "model": "models/crop_model.pkl",
+        "features": ['N', 'P', 'K', 'temperature', 'humidity', 'ph'],
+        "stratify": True,
+        # What train_model.py fits
+        "params": {"n_estimators": 150, "random_state": 42},
+    },
+    "fertilizer": {
+        "csv": "data/Fertilizer_recommendation.csv",
+        "model": "models/fertilizer_model.pkl",
+        "features": ["Soil Type", "Crop Type", "Nitrogen", "Phosphorus", "Potassium"],
+        "soil_encoder": "models/soil_encoder.pkl",
+        "crop_encoder": "models/crop_encoder.pkl",
+        "stratify": False,
+        "params": {"random_state": 42},
+    },
+}
+
+# Searched by default; --trials samples from the full grid
+PARAM_GRID = {
+    "n_estimators": [25, 50, 100, 150, 300],
+    "max_depth": [None, 8, 12, 16, 24],
+    "min_samples_leaf": [1, 2, 4],
+    "max_features": ["sqrt", 0.5],
+}
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Dataset:
+    def __init__(self, name, X, y, feature_names, digest, encoders=None):
+        self.name = name
+        self.X = X
+        self.y = y
+        self.feature_names = feature_names
+        self.digest = digest
+        self.encoders = encoders or {}
+
+    def frame(self, idx=None):
+        # Final models are fitted on a DataFrame so they keep feature_names_in_
+        X = self.X if idx is None else self.X[idx]
+        return pd.DataFrame(X, columns=self.feature_names)
+
+
+def encode_frame(name, df, encoders=None):
+    # Fits new label encoders, or reuses fitted ones (ValueError on an unseen
+    # category). Categories are canonicalized exactly like /get_fertilizer does.
+    spec = DATASETS[name]
+    if name == "crop":
+        return df[spec["features"]].to_numpy(dtype=np.float64), df["label"].to_numpy(dtype=str), {}
+
+    df.columns = [c.strip() for c in df.columns]
+    fit = encoders is None
+    if fit:
+        encoders = {"soil_encoder": LabelEncoder(), "crop_encoder": LabelEncoder()}
+    codes = []
+    for column, key in (("Soil Type", "soil_encoder"), ("Crop Type", "crop_encoder")):
+        field = ENCODER_FIELDS[key]
+        if fit:
+            codes.append(encoders[key].fit_transform(canonicalize_column(df[column], field)))
+            continue
+        column_codes, ok = CategoryEncoder.from_label_encoder(encoders[key], field).encode_many(df[column])
+        if not ok.all():
+            unseen = sorted(set(df[column][~ok].astype(str)))
+            raise ValueError(f"{column} has previously unseen labels: {unseen}")
+        codes.append(column_codes)
+    X = np.column_stack(codes + [df["Nitrogen"], df["Phosphorus"], df["Potassium"]]).astype(np.float64)
+    return X, df["Fertilizer"].to_numpy(dtype=str), encoders
+
+
+def load_dataset(name, cache_dir=CACHE_DIR):
+    spec = DATASETS[name]
+    digest = file_digest(spec["csv"])
+    cache_path = os.path.join(cache_dir, f"{name}-features-v{FEATURES_VERSION}-{digest}.npz")
+
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path, allow_pickle=False)
+        encoders = {}
+        for key in ("soil_encoder", "crop_encoder"):
+            if key in cached:
+                le = LabelEncoder()
+                le.classes_ = cached[key]
+                encoders[key] = le
+        return Dataset(name, cached["X"], cached["y"], spec["features"], digest, encoders)
+
+    X, y, encoders = encode_frame(name, pd.read_csv(spec["csv"]))
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, X=X, y=y, **{k: le.classes_.astype(str) for k, le in encoders.items()})
+    return Dataset(name, X, y, spec["features"], digest, encoders)
+
+
+def holdout_split(dataset, test_size=0.2, seed=42):
+    # Same split as train_model.py / fertilizer_model.py
+    idx = np.arange(len(dataset.y))
+    stratify = dataset.y if DATASETS[dataset.name]["stratify"] else None
+    return train_test_split(idx, test_size=test_size, random_state=seed, stratify=stratify)
+
+
+def cv_folds(dataset, train_idx, k=5, seed=0, cache_dir=CACHE_DIR):
+    key = hashlib.blake2b(train_idx.tobytes(), digest_size=8).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{dataset.name}-folds-{dataset.digest}-{key}-k{k}-s{seed}.npz")
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        return [(cached[f"train{i}"], cached[f"test{i}"]) for i in range(k)]
+
+    skf = StratifiedKFold(n_splits=k, shuffle=True, random_state=seed)
+    folds = [(train_idx[a], train_idx[b]) for a, b in skf.split(train_idx, dataset.y[train_idx])]
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, **{f"train{i}": a for i, (a, _) in enumerate(folds)},
+             **{f"test{i}": b for i, (_, b) in enumerate(folds)})
+    return folds
+
+
+def param_candidates(grid=PARAM_GRID, trials=None, seed=0):
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    if trials and trials < len(combos):
+        combos = random.Random(seed).sample(combos, trials)
+    return combos
+
+
+def forest_size_bytes(model):
+    # Size of the compact .forest export, i.e. what the API maps into memory
+    return int(sum(a.nbytes for a in flatten_forest(model).values()))
+
+
+def row_latency_ms(model, X, rows=50):
+    engine = ForestEngine.from_sklearn(model)
+    sample = X[:rows]
+    engine.predict_row(sample[0])  # warm up
+    timings = []
+    for row in sample:
+        start = time.perf_counter()
+        engine.predict_row(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def run_trial(params, X, y, train_idx, test_idx, seed=42):
+    # One (params, fold) pair; runs in a joblib worker with one core
+    model = RandomForestClassifier(random_state=seed, n_jobs=1, **params)
+    start = time.perf_counter()
+    model.fit(X[train_idx], y[train_idx])
+    fit_s = time.perf_counter() - start
+    accuracy = float(np.mean(model.predict(X[test_idx]) == y[test_idx]))
+    return {
+        "accuracy": accuracy,
+        "fitSeconds": fit_s,
+        "sizeBytes": forest_size_bytes(model),
+        "nodes": int(sum(e.tree_.node_count for e in model.estimators_)),
+        "rowLatencyMs": row_latency_ms(model, X[test_idx]),
+    }
+
+
+def summarize(params, fold_results):
+    acc = np.array([r["accuracy"] for r in fold_results])
+    return {
+        "params": params,
+        "accuracy": float(acc.mean()),
+        "accuracyStd": float(acc.std()),
+        "fitSeconds": float(np.mean([r["fitSeconds"] for r in fold_results])),
+        "sizeBytes": int(np.mean([r["sizeBytes"] for r in fold_results])),
+        "nodes": int(np.mean([r["nodes"] for r in fold_results])),
+        "rowLatencyMs": float(np.median([r["rowLatencyMs"] for r in fold_results])),
+    }
+
+
+def pareto_front(results):
+    # Non-dominated on (higher accuracy, lower latency); size breaks ties
+    front = []
+    for r in results:
+        dominated = any(
+            o["accuracy"] >= r["accuracy"] and o["rowLatencyMs"] <= r["rowLatencyMs"]
+            and (o["accuracy"] > r["accuracy"] or o["rowLatencyMs"] < r["rowLatencyMs"])
+            for o in results
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: (r["rowLatencyMs"], r["sizeBytes"]))
+
+
+def select_model(front, max_accuracy_drop=0.005):
+    # Fastest point of the front within max_accuracy_drop of the best accuracy
+    best = max(r["accuracy"] for r in front)
+    eligible = [r for r in front if r["accuracy"] >= best - max_accuracy_drop]
+    return min(eligible, key=lambda r: (r["rowLatencyMs"], r["sizeBytes"]))
+
+
+def fit_final(dataset, params, train_idx, seed=42, n_jobs=-1):
+    model = RandomForestClassifier(random_state=seed, n_jobs=n_jobs, **params)
+    model.fit(dataset.frame(train_idx), dataset.y[train_idx])
+    # Serving scores one row at a time; don't carry a parallel predict setting
+    model.n_jobs = None
+    return model
+
+
+def model_paths(name, directory=None):
+    # Live paths from DATASETS, or the same file names inside directory
+    spec = DATASETS[name]
+    keys = ["model"] + [k for k in ("soil_encoder", "crop_encoder") if k in spec]
+    return {k: spec[k] if directory is None else os.path.join(directory, os.path.basename(spec[k])) for k in keys}
+
+
+def save_model(name, model, encoders=None, directory=None):
+    paths = model_paths(name, directory)
+    os.makedirs(os.path.dirname(paths["model"]), exist_ok=True)
+    if name == "crop":
+        joblib.dump(model, paths["model"])
+    else:
+        # Plain pickle, like fertilizer_model.py (test_fertilizer.py reads it with pickle)
+        with open(paths["model"], "wb") as f:
+            pickle.dump(model, f)
+        for key, encoder in (encoders or {}).items():
+            with open(paths[key], "wb") as f:
+                pickle.dump(encoder, f)
+    export_forest(model, forest_path_for(paths["model"]), source_path=paths["model"])
+    return paths["model"]
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from image_preprocessing import IMAGE_SIZE, load_image_uint8
+
+# Tiered cache of decoded training images for train_disease_model.py.
+# Every source image is decoded and center-cropped/resized to uint8
+# (size, size, 3) once, the first time an epoch asks for it. Later epochs
+# copy it from the cache:
+#   RAM tier   the first ram_bytes worth of images, in one preallocated array
+#   disk tier  the rest, in one memory-mapped .npy under cache_dir
+#
+# The disk tier is keyed by the file list (paths, sizes, mtimes) and image
+# size, and a bitmap of filled slots is saved next to it on flush(). A later
+# training run on the same images starts with the disk tier already filled.
+# The RAM tier is refilled from the source images on every run.
+#
+# TieredImageCache has the same gather()/labels/image_size/num_classes
+# interface as image_shards.ShardedImages, so disease_data builds both
+# pipelines the same way.
+
+FORMAT_VERSION = 1
+
+
+def _format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def dataset_digest(paths, size=IMAGE_SIZE):
+    h = hashlib.blake2b(digest_size=12)
+    h.update(f"v{FORMAT_VERSION}:{size};".encode())
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+class TieredImageCache:
+    def __init__(self, samples, num_classes, name="train", ram_bytes=2 << 30, cache_dir=None,
+                 size=IMAGE_SIZE, workers=None):
+        self.name = name
+        self.paths = [p for p, _ in samples]
+        self.labels = np.array([label for _, label in samples], dtype=np.int32)
+        self.num_classes = num_classes
+        self.image_size = size
+
+        image_bytes = size * size * 3
+        n = len(self.paths)
+        if cache_dir is None:
+            ram_bytes = None  # no disk tier: everything stays in RAM
+        self.ram_count = n if ram_bytes is None else min(n, int(ram_bytes // image_bytes))
+        self._ram = np.empty((self.ram_count, size, size, 3), dtype=np.uint8)
+        self._filled = np.zeros(n, dtype=bool)
+
+        self._disk = None
+        self._disk_filled_path = None
+        disk_count = n - self.ram_count
+        if disk_count:
+            os.makedirs(cache_dir, exist_ok=True)
+            stem = os.path.join(cache_dir, f"{name}-{dataset_digest(self.paths[self.ram_count:], size)}")
+            images_path = stem + ".npy"
+            self._disk_filled_path = stem + ".filled.npy"
+            if os.path.exists(images_path) and os.path.exists(self._disk_filled_path):
+                self._disk = np.load(images_path, mmap_mode="r+")
+                self._filled[self.ram_count:] = np.load(self._disk_filled_path)
+            else:
+                self._disk = np.lib.format.open_memmap(images_path, mode="w+", dtype=np.uint8,
+                                                       shape=(disk_count, size, size, 3))
+        self.ram_bytes = self._ram.nbytes
+        self.disk_bytes = 0 if self._disk is None else self._disk.nbytes
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-decode")
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _reset_stats(self):
+        self._stats = {"images": 0, "ramHits": 0, "diskHits": 0, "decoded": 0, "failed": 0,
+                       "decodeSeconds": 0.0, "gatherSeconds": 0.0}
+
+    def _slot(self, i):
+        return self._ram[i] if i < self.ram_count else self._disk[i - self.ram_count]
+
+    def _decode(self, i):
+        try:
+            load_image_uint8(self.paths[i], self.image_size, out=self._slot(i))
+        except Exception as e:
+            # An unreadable file trains as a black image rather than killing the epoch
+            print(f"⚠️ Could not read {self.paths[i]}: {e}")
+            self._slot(i)[...] = 0
+            return False
+        return True
+
+    def gather(self, indices, out=None):
+        start = time.perf_counter()
+        indices = np.asarray(indices, dtype=np.int64)
+        size = self.image_size
+        if out is None:
+            out = np.empty((len(indices), size, size, 3), dtype=np.uint8)
+
+        missing = np.unique(indices[~self._filled[indices]])
+        decode_seconds = 0.0
+        failed = 0
+        if missing.size:
+            # PIL releases the GIL while decoding/resizing, so threads scale
+            t0 = time.perf_counter()
+            failed = missing.size - sum(self._pool.map(self._decode, missing.tolist()))
+            self._filled[missing] = True
+            decode_seconds = time.perf_counter() - t0
+
+        in_ram = indices < self.ram_count
+        if in_ram.all():
+            np.take(self._ram, indices, axis=0, out=out)
+        else:
+            out[in_ram] = self._ram[indices[in_ram]]
+            positions = np.flatnonzero(~in_ram)
+            local = indices[positions] - self.ram_count
+            order = np.argsort(local)  # sequential reads within the memory map
+            out[positions[order]] = self._disk[local[order]]
+
+        hits = len(indices) - missing.size
+        ram_hits = int(np.count_nonzero(in_ram)) - int(np.count_nonzero(missing < self.ram_count))
+        with self._lock:
+            s = self._stats
+            s["images"] += len(indices)
+            s["ramHits"] += ram_hits
+            s["diskHits"] += hits - ram_hits
+            s["decoded"] += int(missing.size)
+            s["failed"] += int(failed)
+            s["decodeSeconds"] += decode_seconds
+            s["gatherSeconds"] += time.perf_counter() - start
+        return out
+
+    def flush(self):
+        # Persist the disk tier so the next run can reuse it
+        if self._disk is not None:
+            self._disk.flush()
+            tmp = f"{self._disk_filled_path}.tmp-{os.getpid()}.npy"
+            np.save(tmp, self._filled[self.ram_count:])
+            os.replace(tmp, self._disk_filled_path)
+
+    def epoch_stats(self, reset=True):
+        with self._lock:
+            stats = dict(self._stats)
+            if reset:
+                self._reset_stats()
+        cached = int(np.count_nonzero(self._filled))
+        stats.update({
+            "hitRate": (stats["ramHits"] + stats["diskHits"]) / stats["images"] if stats["images"] else 0.0,
+            "cached": cached,
+            "total": len(self.paths),
+            "ramImages": self.ram_count,
+            "diskImages": len(self.paths) - self.ram_count,
+            "ramBytes": self.ram_bytes,
+            "diskBytes": self.disk_bytes,
+        })
+        return stats
+
+    def format_stats(self, stats):
+        return (f"{stats['images']} images, {stats['hitRate']:.1%} hits "
+                f"(RAM {stats['ramHits']}, disk {stats['diskHits']}), {stats['decoded']} decoded "
+                f"in {stats['decodeSeconds']:.1f} s, gather {stats['gatherSeconds']:.1f} s; "
+                f"{stats['cached']}/{stats['total']} cached "
+                f"(RAM {_format_bytes(self.ram_bytes)}, disk {_format_bytes(self.disk_bytes)})")
+
+    def close(self):
+        self.flush()
+        self._pool.shutdown()
+
+
+def log_cache_stats(caches, path=None):
+    """Keras callback that prints (and optionally appends as JSON lines) each cache's stats per epoch."""
+    from tensorflow import keras
+
+    class CacheStats(keras.callbacks.Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            for cache in caches:
+                stats = cache.epoch_stats()
+                cache.flush()
+                print(f"📦 {cache.name} image cache, epoch {epoch + 1}: {cache.format_stats(stats)}")
+                if path:
+                    with open(path, "a") as f:
+                        f.write(json.dumps({"epoch": epoch + 1, "cache": cache.name, **stats}) + "\n")
+
+    return CacheStats()
@@ -0,0 +1,69 @@
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+# Shared leaf-image preprocessing for serving (app.py), test_disease.py and
+# the training/export scripts: center square crop, resize to 224x224, scale
+# to float32 in [0, 1].
+#
+# JPEGs are decoded at a reduced scale with draft() (DCT scaling), and the
+# crop and resize happen in one resize(box=...) call, so a 12 MP phone
+# photo never exists as a full-size RGB image or float64 array.
+
+IMAGE_SIZE = 224
+# Decode at no less than DRAFT_FACTOR x the target size to keep the final
+# downscale as sharp as a full-resolution resize.
+DRAFT_FACTOR = 2
+
+_local = threading.local()
+
+
+def open_image(source, size=IMAGE_SIZE, draft_factor=DRAFT_FACTOR):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+    if image.format == "JPEG" and draft_factor:
+        image.draft("RGB", (size * draft_factor, size * draft_factor))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+
+def center_crop_box(width, height):
+    m = min(width, height)
+    return ((width - m) / 2, (height - m) / 2, (width + m) / 2, (height + m) / 2)
+
+
+def crop_resize(image, size=IMAGE_SIZE):
+    # Center square crop + resize in a single resampling pass
+    return image.resize((size, size), box=center_crop_box(*image.size))
+
+
+def to_float32(image, out=None):
+    pixels = np.asarray(image)
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float32)
+    np.divide(pixels, np.float32(255.0), out=out, dtype=np.float32)
+    return out
+
+
+def thread_buffer(size=IMAGE_SIZE):
+    # One reusable (size, size, 3) float32 buffer per request thread
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or buffer.shape[0] != size:
+        buffer = _local.buffer = np.empty((size, size, 3), dtype=np.float32)
+    return buffer
+
+
+def preprocess_image(source, size=IMAGE_SIZE, out=None):
+    return to_float32(crop_resize(open_image(source, size), size), out)
+
+
+def load_image_uint8(source, size=IMAGE_SIZE, out=None):
+    pixels = np.asarray(crop_resize(open_image(source, size), size))
+    if out is None:
+        return pixels
+    out[...] = pixels
+    return out
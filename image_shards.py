@@ -0,0 +1,164 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from image_preprocessing import IMAGE_SIZE, load_image_uint8
+
+# Preprocessed image shards: the dataset converted once into .npy files of
+# center-cropped, resized uint8 images (n, 224, 224, 3) plus label files,
+# described by manifest.json. Readers open them with mmap_mode="r", so no
+# JPEG is decoded again and pages are shared by every process reading
+# them.
+#
+#   <shards>/manifest.json
+#   <shards>/class_indices.json
+#   <shards>/shard-00000.npy          uint8 images
+#   <shards>/shard-00000.labels.npy   int32 labels
+#
+# New class folders (and new files in old ones) can be appended later.
+# Existing classes keep their index and new classes are numbered after
+# them, so shards that were already written never change.
+
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def _read_manifest(shards_dir):
+    path = os.path.join(shards_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("formatVersion") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported shard format in {shards_dir}: {manifest.get('formatVersion')}")
+    return manifest
+
+
+def _write_json_atomic(path, payload):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=1)
+    os.replace(tmp, path)
+
+
+def append_dataset(dataset_dir, shards_dir, shard_size=2048, size=IMAGE_SIZE, workers=None):
+    from disease_data import list_dataset
+
+    os.makedirs(shards_dir, exist_ok=True)
+    manifest = _read_manifest(shards_dir) or {
+        "formatVersion": FORMAT_VERSION,
+        "imageSize": size,
+        "classIndices": {},
+        "shards": [],
+    }
+    if manifest["imageSize"] != size:
+        raise ValueError(f"Shards in {shards_dir} are {manifest['imageSize']}px, not {size}px")
+
+    _, files = list_dataset(dataset_dir)
+    class_indices = manifest["classIndices"]
+    for name in files:
+        if name not in class_indices:
+            class_indices[name] = len(class_indices)
+
+    known = {src for shard in manifest["shards"] for src in shard["sources"]}
+    pending = []
+    for name, paths in files.items():
+        for path in paths:
+            rel = os.path.relpath(path, dataset_dir).replace(os.sep, "/")
+            if rel not in known:
+                pending.append((path, rel, class_indices[name]))
+
+    added = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(pending), shard_size):
+            chunk = pending[start:start + shard_size]
+            shard_id = len(manifest["shards"])
+            stem = f"shard-{shard_id:05d}"
+            images_path = os.path.join(shards_dir, stem + ".npy")
+            images = np.lib.format.open_memmap(
+                images_path + ".tmp", mode="w+", dtype=np.uint8, shape=(len(chunk), size, size, 3)
+            )
+
+            # PIL releases the GIL while decoding/resizing, so threads scale
+            def fill(i):
+                load_image_uint8(chunk[i][0], size, out=images[i])
+
+            list(pool.map(fill, range(len(chunk))))
+            images.flush()
+            del images
+            os.replace(images_path + ".tmp", images_path)
+            np.save(os.path.join(shards_dir, stem + ".labels.npy"),
+                    np.array([label for _, _, label in chunk], dtype=np.int32))
+
+            manifest["shards"].append({
+                "images": stem + ".npy",
+                "labels": stem + ".labels.npy",
+                "count": len(chunk),
+                "sources": [rel for _, rel, _ in chunk],
+            })
+            # Manifest is rewritten after every shard, so an interrupted run
+            # resumes from the last complete shard.
+            _write_json_atomic(os.path.join(shards_dir, MANIFEST_NAME), manifest)
+            added += len(chunk)
+            print(f"   wrote {stem} ({len(chunk)} images)")
+
+    _write_json_atomic(os.path.join(shards_dir, MANIFEST_NAME), manifest)
+    _write_json_atomic(os.path.join(shards_dir, "class_indices.json"), class_indices)
+    return added, manifest
+
+
+class ShardedImages:
+    def __init__(self, shards_dir):
+        manifest = _read_manifest(shards_dir)
+        if manifest is None:
+            raise FileNotFoundError(f"No {MANIFEST_NAME} in {shards_dir}")
+        self.shards_dir = shards_dir
+        self.image_size = manifest["imageSize"]
+        self.class_indices = manifest["classIndices"]
+        self.num_classes = len(self.class_indices)
+
+        self._images = [
+            np.load(os.path.join(shards_dir, s["images"]), mmap_mode="r") for s in manifest["shards"]
+        ]
+        self.labels = np.concatenate(
+            [np.load(os.path.join(shards_dir, s["labels"])) for s in manifest["shards"]]
+        ) if manifest["shards"] else np.empty(0, dtype=np.int32)
+        self.sources = [src for s in manifest["shards"] for src in s["sources"]]
+
+        counts = [len(a) for a in self._images]
+        self._offsets = np.cumsum([0] + counts)
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def image(self, i):
+        # Zero-copy view into the memory-mapped shard
+        shard = int(np.searchsorted(self._offsets, i, side="right") - 1)
+        return self._images[shard][i - self._offsets[shard]]
+
+    def gather(self, indices, out=None):
+        indices = np.asarray(indices)
+        if out is None:
+            out = np.empty((len(indices), self.image_size, self.image_size, 3), dtype=np.uint8)
+        shards = np.searchsorted(self._offsets, indices, side="right") - 1
+        for shard in np.unique(shards):
+            mask = shards == shard
+            local = indices[mask] - self._offsets[shard]
+            order = np.argsort(local)  # sequential reads within a shard
+            out[np.flatnonzero(mask)[order]] = self._images[shard][local[order]]
+        return out
+
+    def split(self, validation_split=0.2):
+        # Same rule as disease_data.split_dataset: per class, the first
+        # `validation_split` of the sorted source paths is validation.
+        train, val = [], []
+        sources = np.array(self.sources)
+        for label in range(self.num_classes):
+            idx = np.flatnonzero(self.labels == label)
+            idx = idx[np.argsort(sources[idx], kind="stable")]
+            n_val = int(validation_split * len(idx))
+            val.append(idx[:n_val])
+            train.append(idx[n_val:])
+        return np.concatenate(train), np.concatenate(val)
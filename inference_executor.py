@@ -0,0 +1,129 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as InferenceTimeout
+from functools import wraps
+
+from request_profiler import attributed
+
+# Backpressure for the inference routes.
+#
+# * BoundedExecutor: a dedicated thread pool per model with a fixed number
+#   of queued + running jobs. When it is full, submit() fails at once with
+#   Overloaded (HTTP 503) instead of piling up request threads.
+# * ConcurrencyLimiter: caps how many requests of one route may be in
+#   flight (upload + preprocessing + inference). Extra requests get HTTP
+#   429 right away, so an image storm cannot take every server thread
+#   away from /predict_crop and /get_fertilizer.
+
+
+class Overloaded(RuntimeError):
+    def __init__(self, name, reason, status=503, retry_after=1):
+        super().__init__(f"'{name}' is overloaded: {reason}")
+        self.name = name
+        self.status = status
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, name, workers=2, max_queue=32, retry_after=1):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-inference")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(self.name, "inference queue full", 503, self.retry_after)
+        try:
+            future = self._executor.submit(attributed(fn), *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self.submitted += 1
+        return future
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except InferenceTimeout:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise Overloaded(self.name, f"no result within {timeout}s", 503, self.retry_after)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "maxQueue": self.max_queue,
+                "inFlight": self.workers + self.max_queue - self._slots._value,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
+
+
+class ConcurrencyLimiter:
+    def __init__(self, name, limit, retry_after=1):
+        self.name = name
+        self.limit = limit
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    def __enter__(self):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(self.name, "too many concurrent requests", 429, self.retry_after)
+        with self._lock:
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {"limit": self.limit or None, "active": self.active, "rejected": self.rejected}
+
+
+def limit_concurrency(limiter):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter.__enter__()
+            try:
+                rv = view(*args, **kwargs)
+            except BaseException:
+                limiter.release()
+                raise
+            if getattr(rv, "is_streamed", False):
+                # A streamed body is generated after the view returns: hold
+                # the slot until the server closes the response (body sent
+                # or client gone)
+                rv.call_on_close(limiter.release)
+            else:
+                limiter.release()
+            return rv
+        return wrapper
+    return decorator
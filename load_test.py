@@ -0,0 +1,166 @@
+# load_test.py
+#
+# Starts serve.py with different worker counts and measures requests per
+# second under a fixed number of concurrent clients, to show how
+# throughput scales with worker processes.
+#   python load_test.py --workers 1 2 4 --endpoint crop --concurrency 16 --duration 10
+#
+# The prediction caches are disabled for the server under test, and crop /
+# fertilizer payloads are drawn at random from data/*.csv, so every request
+# really hits the model.
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def crop_payloads(n=500):
+    import pandas as pd
+
+    df = pd.read_csv(os.path.join(BASE_DIR, "data", "Crop_recommendation.csv"))
+    rows = df[['N', 'P', 'K', 'temperature', 'humidity', 'ph']].sample(n, replace=True, random_state=0)
+    return [json.dumps(r) for r in rows.to_dict(orient="records")]
+
+
+def fertilizer_queries(n=500):
+    import pandas as pd
+
+    df = pd.read_csv(os.path.join(BASE_DIR, "data", "Fertilizer_recommendation.csv"))
+    df.columns = [c.strip() for c in df.columns]
+    rows = df.sample(n, replace=True, random_state=0)
+    return [
+        urllib.parse.urlencode({
+            "crop": r["Crop Type"], "soil": r["Soil Type"], "landSize": 1,
+            "nitrogen": r["Nitrogen"], "phosphorus": r["Phosphorus"], "potassium": r["Potassium"],
+        })
+        for _, r in rows.iterrows()
+    ]
+
+
+def multipart_image(path):
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as f:
+        data = f.read()
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"leaf.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def build_requests(base_url, endpoint, image_path):
+    if endpoint == "crop":
+        return [
+            urllib.request.Request(f"{base_url}/predict_crop", data=p.encode(), method="POST",
+                                   headers={"Content-Type": "application/json"})
+            for p in crop_payloads()
+        ]
+    if endpoint == "fertilizer":
+        return [urllib.request.Request(f"{base_url}/get_fertilizer?{q}") for q in fertilizer_queries()]
+    body, content_type = multipart_image(image_path)
+    return [urllib.request.Request(f"{base_url}/predict_disease", data=body, method="POST",
+                                   headers={"Content-Type": content_type})]
+
+
+def client(args):
+    base_url, endpoint, image_path, duration, seed = args
+    requests = build_requests(base_url, endpoint, image_path)
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        req = rng.choice(requests)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                resp.read()
+            latencies.append(time.perf_counter() - start)
+        except (urllib.error.URLError, OSError):
+            errors += 1
+    return latencies, errors
+
+
+def wait_healthy(base_url, timeout=180):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not become healthy")
+
+
+def run_level(args, workers, port):
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, PREDICTION_CACHE_ENABLED="0", DISEASE_CACHE_ENABLED="0")
+    cmd = [sys.executable, os.path.join(BASE_DIR, "serve.py"), "--bind", f"127.0.0.1:{port}",
+           "--workers", str(workers), "--threads", str(args.threads)]
+    server = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_healthy(base_url)
+        # Warm up every worker (first disease call loads the CNN)
+        client((base_url, args.endpoint, args.image, min(5.0, args.duration), 0))
+
+        jobs = [(base_url, args.endpoint, args.image, args.duration, i) for i in range(args.concurrency)]
+        with multiprocessing.Pool(args.concurrency) as pool:
+            results = pool.map(client, jobs)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = np.array([lat for lats, _ in results for lat in lats])
+    errors = sum(e for _, e in results)
+    return {
+        "workers": workers,
+        "requests": int(latencies.size),
+        "errors": errors,
+        "rps": latencies.size / args.duration,
+        "p50Ms": float(np.percentile(latencies, 50) * 1000) if latencies.size else None,
+        "p95Ms": float(np.percentile(latencies, 95) * 1000) if latencies.size else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests/second vs. worker count for serve.py")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--endpoint", choices=["crop", "fertilizer", "disease"], default="crop")
+    parser.add_argument("--image", default=os.path.join(BASE_DIR, "potato-diseases.jpg"))
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per worker count")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"📊 /{args.endpoint}: {args.concurrency} clients, {args.duration:.0f}s per level, {os.cpu_count()} cores")
+    for workers in args.workers:
+        r = run_level(args, workers, args.port)
+        results.append(r)
+        scale = r["rps"] / results[0]["rps"] if results[0]["rps"] else 0
+        print(f"   workers={workers:<3} {r['rps']:8.1f} req/s  p50 {r['p50Ms'] or 0:.1f} ms  "
+              f"p95 {r['p95Ms'] or 0:.1f} ms  errors {r['errors']}  (x{scale:.2f})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
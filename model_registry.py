@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as LoadTimeout
+
+from response_cache import file_fingerprint
+
+# Loads model artifacts in background threads so Flask can answer as soon
+# as the module is imported. Eager artifacts start loading on start();
+# lazy ones (the Keras model, which also pulls in TensorFlow) load on
+# their first get().
+#
+# Every artifact has a version (a fingerprint of the files it is loaded
+# from). reload() loads changed artifacts in the background next to the
+# ones being served and swaps them in together once all have loaded, so
+# a failed or half-written deploy never replaces a working model.
+# Artifacts registered with the same group (a model and its encoders)
+# always reload together. A request takes a snapshot() first and reads
+# every artifact from it, so it never mixes two versions.
+
+
+class ModelUnavailable(RuntimeError):
+    def __init__(self, name, state, error=None):
+        message = f"Model '{name}' is {state}"
+        if error:
+            message += f": {error}"
+        super().__init__(message)
+        self.name = name
+        self.state = state
+
+
+class _Entry:
+    def __init__(self, name, loader, eager, watch=(), group=None):
+        self.name = name
+        self.loader = loader
+        self.eager = eager
+        self.watch = tuple(watch)
+        self.group = group
+        self.version = file_fingerprint(*self.watch) if self.watch else "static"
+        self.future = None
+        self.started = None
+        self.load_seconds = None
+
+    def successor(self):
+        return _Entry(self.name, self.loader, self.eager, self.watch, self.group)
+
+    @property
+    def state(self):
+        if self.future is None:
+            return "pending"
+        if not self.future.done():
+            return "loading"
+        return "failed" if self.future.exception() is not None else "ready"
+
+
+class Snapshot:
+    # The artifacts of one registry generation; get() never sees a later swap
+    def __init__(self, registry, entries):
+        self._registry = registry
+        self._entries = entries
+        self.used = {}
+
+    def get(self, name, timeout=None):
+        entry = self._entries[name]
+        self.used[name] = entry.version
+        future = self._registry._submit(entry)
+        try:
+            return future.result(timeout=timeout)
+        except LoadTimeout:
+            raise ModelUnavailable(name, "loading")
+        except Exception as e:
+            raise ModelUnavailable(name, "failed", e)
+
+    def version(self, *names):
+        # Counts as used: a cached answer still reports the version it is keyed to
+        for name in names:
+            self.used[name] = self._entries[name].version
+        return "+".join(self._entries[name].version for name in names)
+
+
+class ModelRegistry:
+    def __init__(self, max_workers=4):
+        self._max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-loader")
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self._watch_interval = None
+        self._watcher = None
+        self.generation = 0
+        self.reloads = {}
+        self.reload_failures = {}
+        self.last_reload = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Loader threads do not survive fork(): give the child a fresh pool
+        # and forget loads that were still running in the parent. Finished
+        # artifacts stay and are shared copy-on-write.
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="model-loader")
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        for entry in self._entries.values():
+            if entry.future is not None and not entry.future.done():
+                entry.future = None
+        if self._watch_interval:
+            self._watcher = None
+            self.watch(self._watch_interval)
+
+    def register(self, name, loader, eager=True, watch=(), group=None):
+        self._entries = {**self._entries, name: _Entry(name, loader, eager, watch, group)}
+
+    def on_swap(self, callback):
+        # callback(snapshot, names) after reloaded artifacts were swapped in
+        self._listeners.append(callback)
+
+    def start(self):
+        for entry in self._entries.values():
+            if entry.eager:
+                self._submit(entry)
+        return self
+
+    def preload(self, *names):
+        # Start loading lazy artifacts in the background without waiting
+        for name in names:
+            self._submit(self._entries[name])
+
+    def _submit(self, entry):
+        with self._lock:
+            if entry.future is None:
+                entry.started = time.perf_counter()
+                entry.future = self._executor.submit(self._load, entry)
+        return entry.future
+
+    def _load(self, entry):
+        try:
+            return entry.loader()
+        finally:
+            entry.load_seconds = time.perf_counter() - entry.started
+
+    def snapshot(self):
+        return Snapshot(self, self._entries)
+
+    def get(self, name, timeout=None):
+        return self.snapshot().get(name, timeout=timeout)
+
+    def version(self, *names):
+        return "+".join(self._entries[name].version for name in names)
+
+    def wait(self, names=None, timeout=None):
+        names = names or [n for n, e in self._entries.items() if e.eager]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in names:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            self.get(name, timeout=remaining)
+
+    def is_ready(self, name):
+        return self._entries[name].state == "ready"
+
+    # ---------------- Reloading ----------------
+    def _with_groups(self, names):
+        # A changed artifact takes the rest of its group along
+        entries = self._entries
+        groups = {entries[n].group for n in names if entries[n].group}
+        return sorted(set(names) | {n for n, e in entries.items() if e.group in groups})
+
+    def changed(self, names=None):
+        entries = self._entries
+        return self._with_groups([n for n in (names or entries)
+                                  if entries[n].watch and file_fingerprint(*entries[n].watch) != entries[n].version])
+
+    def reload(self, names=None, force=False, timeout=None):
+        """Load new versions of changed artifacts and swap them in together.
+
+        Returns {"reloaded": [...], "error": ...}. Artifacts that were never
+        loaded (lazy ones) are only re-fingerprinted. Runs one reload at a time.
+        """
+        with self._reload_lock:
+            entries = self._entries
+            names = self._with_groups(names or entries) if force else self.changed(names)
+            if not names:
+                return {"reloaded": [], "generation": self.generation}
+
+            fresh = {name: entries[name].successor() for name in names}
+            started = time.perf_counter()
+            try:
+                futures = [self._submit(entry) for name, entry in fresh.items() if entries[name].future is not None]
+                for future in futures:
+                    future.result(timeout=timeout)
+            except Exception as e:
+                for name in names:
+                    self.reload_failures[name] = self.reload_failures.get(name, 0) + 1
+                self.last_reload = {"names": names, "error": str(e), "at": time.time()}
+                print(f"⚠️ Reload of {', '.join(names)} failed, keeping the current version: {e}")
+                return {"reloaded": [], "error": str(e), "generation": self.generation}
+
+            with self._lock:
+                self._entries = {**self._entries, **fresh}
+                self.generation += 1
+            for name in names:
+                self.reloads[name] = self.reloads.get(name, 0) + 1
+            seconds = time.perf_counter() - started
+            self.last_reload = {"names": names, "seconds": round(seconds, 3), "at": time.time()}
+            print(f"✅ Reloaded {', '.join(names)} in {seconds:.2f} s (generation {self.generation})")
+
+        snapshot = self.snapshot()
+        for callback in self._listeners:
+            callback(snapshot, names)
+        return {"reloaded": names, "generation": self.generation}
+
+    def watch(self, interval):
+        # Poll the artifact files; reload once a change has stayed put for a
+        # whole interval, so a deploy that writes several files is picked up
+        # in one piece rather than mid-copy
+        self._watch_interval = interval
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher = threading.Thread(target=self._watch_loop, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self):
+        seen = failed = None
+        while True:
+            time.sleep(self._watch_interval)
+            try:
+                changed = self.changed()
+                fingerprints = {n: file_fingerprint(*self._entries[n].watch) for n in changed}
+                if changed and fingerprints == seen and fingerprints != failed:
+                    # A failed version is not retried until its files change again
+                    failed = fingerprints if self.reload(changed).get("error") else None
+                seen = fingerprints
+            except Exception as e:
+                print(f"⚠️ Model watcher: {e}")
+
+    def status(self):
+        out = {}
+        for name, entry in self._entries.items():
+            state = entry.state
+            info = {"state": state, "eager": entry.eager, "version": entry.version}
+            if entry.load_seconds is not None:
+                info["loadSeconds"] = round(entry.load_seconds, 3)
+            if name in self.reloads:
+                info["reloads"] = self.reloads[name]
+            if state == "failed":
+                info["error"] = str(entry.future.exception())
+            out[name] = info
+        return out
@@ -0,0 +1,145 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# ---------------- Request Metrics ----------------
+# In-process counters and latency histograms rendered in the Prometheus
+# text exposition format (no client library needed). Recording a value is
+# a perf_counter() pair, a bisect and a dict update under a lock, so it
+# costs a few microseconds per stage.
+#
+# Each gunicorn worker keeps its own numbers; scrape the workers
+# separately (or run one worker) when exact totals matter.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    def __init__(self, prefix="agrifusion", enabled=True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def _timed(self, name, labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timer(self, name, **labels):
+        return self._timed(name, labels) if self.enabled else nullcontext()
+
+    def add_collector(self, collect):
+        # collect() -> [(name, kind, help, [(labels dict, value), ...]), ...],
+        # called at scrape time for numbers other components already keep
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (list(h.cumulative()), h.sum, h.count) for key, h in self._histograms.items()
+            }
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self.snapshot()
+        families = {}
+
+        for (name, key), value in counters.items():
+            families.setdefault(name, ("counter", []))[1].append(f"{self.prefix}_{name}{_format_labels(key)} {value}")
+
+        for (name, key), (buckets, total, count) in histograms.items():
+            lines = families.setdefault(name, ("histogram", []))[1]
+            full = f"{self.prefix}_{name}"
+            for bound, cumulative in buckets:
+                lines.append(f"{full}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{full}_sum{_format_labels(key)} {total!r}")
+            lines.append(f"{full}_count{_format_labels(key)} {count}")
+
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                self._help.setdefault(name, (kind, help_text))
+                lines = families.setdefault(name, (kind, []))[1]
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{self.prefix}_{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+
+        out = []
+        for name in sorted(families):
+            kind, lines = families[name]
+            kind, help_text = self._help.get(name, (kind, ""))
+            full = f"{self.prefix}_{name}"
+            if help_text:
+                out.append(f"# HELP {full} {help_text}")
+            out.append(f"# TYPE {full} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
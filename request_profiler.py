@@ -0,0 +1,319 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# ---------------- Request Profiler ----------------
+# Opt-in (PROFILING_ENABLED) sampling profiler for Flask requests. Nothing
+# is traced: one daemon thread wakes every interval and reads the stacks
+# of the request threads being profiled (sys._current_frames()). It also
+# reads the worker threads (disease batcher, inference executors, survey
+# preprocessing) while they run a job for a profiled request, so time
+# spent waiting on a batch shows up as the batch itself. Jobs are tagged
+# with the request thread that submitted them (attributed() /
+# working_for()), and a worker's stack only goes to those requests.
+#
+# Every profiled route is sampled while it runs. A capture is only kept
+# when the request was picked by sample_rate or took longer than slow_ms,
+# so slow requests are always caught and fast ones cost a few stack walks.
+# Kept captures are written to a directory as collapsed stacks
+# ("frame;frame;frame count", root first) with a JSON sidecar: route,
+# status, duration, model versions and input size. They can be rendered
+# as speedscope JSON.
+#
+# Each gunicorn worker samples its own requests. The directory can be
+# shared: listing reads the sidecars, so it shows every worker's profiles.
+
+PROFILE_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Worker thread ident -> (thread name, idents of the request threads its
+# current job is for). Only maintained once a RequestProfiler exists.
+_owners = {}
+_tracking = False
+
+
+@contextmanager
+def working_for(owners):
+    """Attribute what the current (worker) thread does inside the block to the given request threads."""
+    if not _tracking:
+        yield
+        return
+    ident = threading.get_ident()
+    _owners[ident] = (threading.current_thread().name, frozenset(owners))
+    try:
+        yield
+    finally:
+        _owners.pop(ident, None)
+
+
+def attributed(fn):
+    # fn, attributed to the calling request thread wherever it later runs
+    if not _tracking:
+        return fn
+    owner = threading.get_ident()
+
+    def run(*args, **kwargs):
+        with working_for((owner,)):
+            return fn(*args, **kwargs)
+    return run
+
+
+class Capture:
+    __slots__ = ("thread", "started", "sampled", "samples", "ticks", "meta")
+
+    def __init__(self, thread, sampled):
+        self.thread = thread
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.samples = Counter()
+        self.ticks = 0
+        self.meta = {}
+
+
+def frame_name(code):
+    path = code.co_filename
+    if path.startswith(_HERE + os.sep):
+        path = os.path.relpath(path, _HERE)
+    elif "site-packages" + os.sep in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+def to_speedscope(meta, collapsed):
+    frames, index, samples, weights = [], {}, [], []
+    interval_ms = meta.get("intervalMs", 1.0)
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        ids = []
+        for name in stack.split(";"):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            ids.append(index[name])
+        samples.append(ids)
+        weights.append(int(count) * interval_ms)
+    title = f"{meta.get('method', '')} {meta.get('path', '')} {meta.get('durationMs', 0):.0f} ms".strip()
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": title,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": title,
+        "activeProfileIndex": 0,
+        "exporter": "request_profiler",
+    }
+
+
+class RequestProfiler:
+    def __init__(self, directory, sample_rate=0.01, slow_ms=1000.0, interval_ms=5.0, max_profiles=200,
+                 max_depth=128):
+        global _tracking
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval_ms = interval_ms
+        self.max_profiles = max_profiles
+        self.max_depth = max_depth
+        os.makedirs(directory, exist_ok=True)
+        _tracking = True
+
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._names = {}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+        self._sequence = 0
+        self._sampler = None
+        self.kept = Counter()
+        self.dropped = 0
+        self.sample_seconds = 0.0
+
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._sampler.start()
+
+    # ---------------- Sampling ----------------
+    def _stack(self, frame):
+        codes = []
+        while frame is not None and len(codes) < self.max_depth:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        return tuple(codes)
+
+    def _run(self):
+        interval = self.interval_ms / 1000.0
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+            time.sleep(interval)
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            workers = []
+            for ident, (name, owners) in list(_owners.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    workers.append((name, owners, self._stack(frame)))
+            with self._lock:
+                for capture in self._active.values():
+                    frame = frames.get(capture.thread)
+                    if frame is None:
+                        continue
+                    capture.ticks += 1
+                    capture.samples[("request", self._stack(frame))] += 1
+                    for name, owners, stack in workers:
+                        if capture.thread in owners:
+                            capture.samples[(name, stack)] += 1
+            del frames
+            self.sample_seconds += time.perf_counter() - started
+
+    # ---------------- Requests ----------------
+    def begin(self):
+        capture = Capture(threading.get_ident(), random.random() < self.sample_rate)
+        with self._lock:
+            self._active[capture.thread] = capture
+        self._ensure_sampler()
+        self._wake.set()
+        return capture
+
+    def end(self, capture, **meta):
+        """Stop sampling; saves the capture (in the background) when it is kept."""
+        with self._lock:
+            if self._active.get(capture.thread) is capture:
+                del self._active[capture.thread]
+        duration_ms = (time.perf_counter() - capture.started) * 1000
+        reason = "slow" if duration_ms >= self.slow_ms else "sampled" if capture.sampled else None
+        # A sampled request that finished before the first tick has nothing
+        # to show; a slow one is kept even then (e.g. a starved sampler), so
+        # its metadata is never lost
+        if reason is None or (reason == "sampled" and not capture.samples):
+            with self._lock:
+                self.dropped += 1
+            return None
+
+        with self._lock:
+            self.kept[reason] += 1
+            self._sequence += 1
+            sequence = self._sequence
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{sequence:06d}"
+        meta = {
+            "id": profile_id,
+            "reason": reason,
+            "durationMs": round(duration_ms, 3),
+            "samples": sum(capture.samples.values()),
+            "ticks": capture.ticks,
+            "intervalMs": self.interval_ms,
+            "at": time.time(),
+            **capture.meta,
+            **meta,
+        }
+        self._writer.submit(self._save, meta, capture.samples)
+        return meta
+
+    # ---------------- Storage ----------------
+    def _collapsed(self, samples):
+        names = self._names
+        lines = []
+        for (thread, stack), count in samples.most_common():
+            parts = [f"[{thread}]"]
+            for code in stack:
+                name = names.get(code)
+                if name is None:
+                    name = names[code] = frame_name(code)
+                parts.append(name)
+            lines.append(f"{';'.join(parts)} {count}\n")
+        return "".join(lines)
+
+    def _save(self, meta, samples):
+        try:
+            stem = os.path.join(self.directory, meta["id"])
+            with open(stem + ".collapsed", "w") as f:
+                f.write(self._collapsed(samples))
+            # Sidecar last: a profile is listed only once both files exist
+            tmp = f"{stem}.json.tmp"
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, stem + ".json")
+            self._prune()
+        except Exception as e:
+            print(f"⚠️ Could not save profile {meta['id']}: {e}")
+
+    def _prune(self):
+        ids = self._ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for ext in (".json", ".collapsed"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + ext))
+                except FileNotFoundError:
+                    pass
+
+    def _ids(self):
+        # Oldest first: ids start with the capture time
+        return sorted(f[:-5] for f in os.listdir(self.directory) if f.endswith(".json"))
+
+    def list(self, limit=50, route=None, reason=None):
+        out = []
+        for profile_id in reversed(self._ids()):
+            meta = self.meta(profile_id)
+            if meta is None or (route and meta.get("route") != route) or (reason and meta.get("reason") != reason):
+                continue
+            out.append(meta)
+            if len(out) >= limit:
+                break
+        return out
+
+    def meta(self, profile_id):
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + ".json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, profile_id, fmt="speedscope"):
+        """(meta, body) of a saved profile as "collapsed" text or "speedscope" JSON; None if unknown."""
+        meta = self.meta(profile_id)
+        if meta is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + ".collapsed")) as f:
+                collapsed = f.read()
+        except OSError:
+            return None
+        if fmt == "collapsed":
+            return meta, collapsed
+        return meta, json.dumps(to_speedscope(meta, collapsed))
+
+    def stats(self):
+        with self._lock:
+            kept, dropped, active = dict(self.kept), self.dropped, len(self._active)
+        return {
+            "sampleRate": self.sample_rate,
+            "slowMs": self.slow_ms,
+            "intervalMs": self.interval_ms,
+            "active": active,
+            "kept": kept,
+            "dropped": dropped,
+            "samplerSeconds": round(self.sample_seconds, 3),
+        }
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Bounded LRU cache (optional TTL) for deterministic model outputs.
+# Keys combine normalized/quantized inputs with a fingerprint of the
+# model files, so a retrained model never serves stale answers. An
+# optional SQLite file lets several worker processes share entries; it is
+# held to the same max_entries and TTL.
+
+
+def file_fingerprint(*paths):
+    h = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        try:
+            st = os.stat(path)
+            h.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode())
+        except OSError:
+            h.update(f"{path}:missing;".encode())
+    return h.hexdigest()
+
+
+def quantize(value, decimals):
+    value = round(float(value), decimals)
+    return value + 0.0  # folds -0.0 into 0.0
+
+
+def make_key(namespace, version, *parts):
+    return f"{namespace}|{version}|" + "|".join(repr(p) for p in parts)
+
+
+class _DiskBackend:
+    # Shared by every worker process, and bounded like the in-memory LRU:
+    # every prune_every writes (per process) expired rows are deleted and
+    # the least recently written rows beyond max_entries are dropped. A
+    # disk hit counts as a write, so entries in use stay.
+    def __init__(self, path, max_entries=4096):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_every = max(1, min(256, max_entries // 8))
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn = None
+        self._writes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def conn(self):
+        # SQLite connections must not cross fork(); each worker opens its own.
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, touched REAL NOT NULL DEFAULT 0)"
+            )
+            # Files written before the disk tier was bounded have no touched column
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(cache)")]
+            if "touched" not in columns:
+                self._conn.execute("ALTER TABLE cache ADD COLUMN touched REAL NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_touched ON cache (touched)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+            self._pid = os.getpid()
+            self._writes = 0
+            self._prune(time.time())
+        return self._conn
+
+    def get(self, key, now):
+        conn = self.conn
+        with self._lock:
+            row = conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                conn.execute("DELETE FROM cache WHERE key = ? AND expires <= ?", (key, now))
+                self.expirations += 1
+                return None
+            conn.execute("UPDATE cache SET touched = ? WHERE key = ?", (now, key))
+            self._wrote(now)
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, value, expires):
+        conn = self.conn
+        now = time.time()
+        with self._lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, touched) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires, now),
+            )
+            self._wrote(now)
+
+    def _wrote(self, now):
+        self._writes += 1
+        if self._writes >= self.prune_every:
+            self._writes = 0
+            self._prune(now)
+
+    def _prune(self, now):
+        conn = self._conn
+        self.expirations += conn.execute(
+            "DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (now,)
+        ).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.evictions += conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY touched LIMIT ?)", (excess,)
+            ).rowcount
+
+    def clear(self):
+        conn = self.conn
+        with self._lock:
+            conn.execute("DELETE FROM cache")
+
+
+class ResponseCache:
+    def __init__(self, max_entries=4096, ttl_s=None, disk_path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl_s if ttl_s and ttl_s > 0 else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = _DiskBackend(disk_path, self.max_entries) if disk_path else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        if self._disk is not None:
+            found = self._disk.get(key, now)
+            if found is not None:
+                value, expires = found
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value, expires)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._store(key, value, expires)
+        if self._disk is not None:
+            self._disk.put(key, value, expires)
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _store(self, key, value, expires):
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+                "diskBackend": self._disk is not None,
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hitRate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "diskEvictions": self._disk.evictions if self._disk is not None else 0,
+                "diskExpirations": self._disk.expirations if self._disk is not None else 0,
+            }
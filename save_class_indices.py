@@ -1,19 +1,14 @@
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from disease_data import list_dataset
 import json, os
 
 BASE_DIR = "D:/Agrifusion"
 DATASET_PATH = os.path.join(BASE_DIR, "dataset")
 CLASS_INDICES_PATH = os.path.join(BASE_DIR, "class_indices.json")
 
-datagen = ImageDataGenerator(rescale=1./255, validation_split=0.2)
-train_gen = datagen.flow_from_directory(
-    DATASET_PATH,
-    target_size=(224, 224),
-    batch_size=32,
-    subset='training'
-)
+# Same folder ordering as flow_from_directory, without decoding any image
+class_indices, _ = list_dataset(DATASET_PATH)
 
 with open(CLASS_INDICES_PATH, "w") as f:
-    json.dump(train_gen.class_indices, f)
+    json.dump(class_indices, f)
 
 print("✅ class_indices.json saved successfully!")
@@ -0,0 +1,114 @@
+# serve.py
+#
+# Production entry point for the Flask API (app.py keeps its debug server
+# for local development).
+#   python serve.py --workers 4 --threads 8 --bind 0.0.0.0:5001
+#
+# On Linux/macOS this runs gunicorn with preload_app: the scikit-learn
+# models are loaded once in the master before fork(), so every worker
+# shares their NumPy arrays copy-on-write. TensorFlow is not fork-safe, so
+# the disease model is loaded inside each worker after fork, with
+# intra/inter-op threads set to cores / workers so that workers don't
+# oversubscribe the CPU. On Windows it falls back to waitress (a single
+# process with a thread pool).
+
+import argparse
+import os
+import sys
+
+# TensorFlow must not start in the gunicorn master; each worker loads the
+# disease model itself after fork().
+os.environ["FAST_STARTUP"] = "1"
+
+
+def default_workers():
+    return max(1, min(4, (os.cpu_count() or 1)))
+
+
+def threads_per_worker(workers):
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    tf_threads = args.tf_threads or threads_per_worker(args.workers)
+
+    def post_fork(server, worker):
+        import config
+        from app import models
+
+        config.TF_INTRA_OP_THREADS = tf_threads
+        config.TF_INTER_OP_THREADS = max(1, min(2, tf_threads))
+        if not config.DISEASE_BACKEND_THREADS:
+            config.DISEASE_BACKEND_THREADS = tf_threads
+        if args.warm_disease:
+            models.preload("disease")
+        server.log.info(f"Worker {worker.pid}: TensorFlow intra-op threads = {tf_threads}")
+
+    class AgriFusionServer(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": args.bind,
+                "workers": args.workers,
+                "threads": args.threads,
+                "worker_class": "gthread",
+                "preload_app": True,
+                "timeout": args.timeout,
+                "graceful_timeout": args.timeout,
+                "post_fork": post_fork,
+                "accesslog": "-" if args.access_log else None,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app, models
+
+            # Runs once in the master: wait for the shared scikit-learn models
+            models.wait()
+            return app
+
+    AgriFusionServer().run()
+
+
+def run_waitress(args):
+    from waitress import serve
+
+    from app import app, models
+
+    models.wait()
+    if args.warm_disease:
+        models.preload("disease")
+    host, _, port = args.bind.rpartition(":")
+    print(f"🚀 Serving on http://{args.bind} with waitress ({args.threads} threads)")
+    serve(app, host=host or "0.0.0.0", port=int(port), threads=args.threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AgriFusion API with multiple workers")
+    parser.add_argument("--bind", default=os.environ.get("BIND", "0.0.0.0:5001"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_WORKERS", default_workers())))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", 8)),
+                        help="Request threads per worker")
+    parser.add_argument("--tf-threads", type=int, default=int(os.environ.get("WORKER_TF_THREADS", 0)),
+                        help="TensorFlow intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--timeout", type=int, default=120)
+    parser.add_argument("--no-warm-disease", dest="warm_disease", action="store_false",
+                        help="Load the disease model on the first request instead of at worker start")
+    parser.add_argument("--access-log", action="store_true")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "waitress"], default="auto")
+    args = parser.parse_args()
+
+    server = args.server
+    if server == "auto":
+        server = "waitress" if sys.platform == "win32" else "gunicorn"
+
+    if server == "gunicorn":
+        run_gunicorn(args)
+    else:
+        run_waitress(args)
+
+
+if __name__ == "__main__":
+    main()
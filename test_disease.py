@@ -1,29 +1,25 @@
 import tensorflow as tf
 import numpy as np
-from tensorflow.keras.preprocessing import image
-import json
+
+from disease_outputs import DiseaseLabels, apply_temperature, load_temperature, top_k
+from image_preprocessing import preprocess_image
 
 # 1️⃣ Load trained model
 model = tf.keras.models.load_model("models/plant_disease_prediction_model.h5")
 
-# 2️⃣ Load class indices
-with open("class_indices.json", "r") as f:
-    class_indices = json.load(f)
-class_names = [None] * len(class_indices)
-for k, v in class_indices.items():
-    class_names[v] = k
+# 2️⃣ Load class indices (and the calibration fitted in training, if any)
+labels = DiseaseLabels.from_file("class_indices.json")
+temperature = load_temperature("models/disease_calibration.json")
 
 # 3️⃣ Load and preprocess test image
 img_path = "potato-diseases.jpg"  # your test image
-img = image.load_img(img_path, target_size=(224, 224))
-img_array = image.img_to_array(img)
-img_array = np.expand_dims(img_array, axis=0) / 255.0
+img_array = np.expand_dims(preprocess_image(img_path), axis=0)  # same preprocessing as app.py
 
 # 4️⃣ Predict
-pred = model.predict(img_array)[0]
+pred = apply_temperature(model.predict(img_array)[0], temperature)
 
 # 5️⃣ Top 3 predictions
-top3_indices = pred.argsort()[-3:][::-1]
+top3_indices, top3_probs = top_k(pred, 3)
 print("Top 3 predictions:")
-for i in top3_indices:
-    print(f"{class_names[i]} -> Confidence: {pred[i]:.4f}")
+for i, p in zip(top3_indices, top3_probs):
+    print(f"{labels.name(i)} -> Confidence: {p:.4f}")
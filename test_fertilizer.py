@@ -2,16 +2,17 @@ import pickle
 import pandas as pd
 import os
 
+from feature_encoding import load_encoder
+
 # -----------------------------
 # STEP 1: Load trained model and encoders
 # -----------------------------
 try:
     with open("models/fertilizer_model.pkl", "rb") as f:
         model = pickle.load(f)
-    with open("models/soil_encoder.pkl", "rb") as f:
-        soil_encoder = pickle.load(f)
-    with open("models/crop_encoder.pkl", "rb") as f:
-        crop_encoder = pickle.load(f)
+    # Compiled the same way app.py does it
+    soil_encoder = load_encoder("models/soil_encoder.pkl", "soil")
+    crop_encoder = load_encoder("models/crop_encoder.pkl", "crop")
     print("✅ Fertilizer model and encoders loaded successfully!")
 except Exception as e:
     print("❌ Error loading model or encoders:", e)
@@ -32,8 +33,8 @@ sample = {
 # STEP 3: Encode input
 # -----------------------------
 try:
-    encoded_soil = soil_encoder.transform([sample["Soil Type"].lower()])[0]
-    encoded_crop = crop_encoder.transform([sample["Crop Type"].lower()])[0]
+    encoded_soil = soil_encoder.encode(sample["Soil Type"])
+    encoded_crop = crop_encoder.encode(sample["Crop Type"])
 except Exception as e:
     print("❌ Encoding error:", e)
     exit()
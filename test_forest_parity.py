@@ -0,0 +1,123 @@
+# test_forest_parity.py
+#
+# Checks that forest_engine.py reproduces scikit-learn bit for bit on the
+# crop and fertilizer RandomForests: predict_proba must be *identical*
+# (not just close) and labels must match, for batches and single rows.
+#   python test_forest_parity.py
+#
+# Inputs: every row of data/Crop_recommendation.csv and
+# data/Fertilizer_recommendation.csv, the same rows with one feature moved
+# onto / just beside a split threshold, and rows with missing values.
+# Both the engine compiled from the pickle and the models/*.forest export
+# (when present) are checked. Exits with status 1 on any mismatch.
+
+import os
+import sys
+import tempfile
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from forest_artifacts import export_forest, forest_path_for, load_forest
+from forest_engine import ForestEngine
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+CROP_FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph']
+
+
+def crop_rows():
+    df = pd.read_csv("data/Crop_recommendation.csv")
+    return df[CROP_FEATURES].to_numpy(dtype=np.float64)
+
+
+def fertilizer_rows():
+    df = pd.read_csv("data/Fertilizer_recommendation.csv")
+    df.columns = [c.strip() for c in df.columns]
+    soil_encoder = joblib.load("models/soil_encoder.pkl")
+    crop_encoder = joblib.load("models/crop_encoder.pkl")
+    soil = soil_encoder.transform(df["Soil Type"].str.lower())
+    crop = crop_encoder.transform(df["Crop Type"].str.lower())
+    return np.column_stack([soil, crop, df["Nitrogen"], df["Phosphorus"], df["Potassium"]]).astype(np.float64)
+
+
+def boundary_rows(X, engine, per_feature=200, seed=0):
+    # Rows with one feature exactly on a split threshold (as float32) and
+    # one float32 step either side of it
+    rng = np.random.default_rng(seed)
+    internal = ~engine.is_leaf
+    out = []
+    for j in range(X.shape[1]):
+        thresholds = engine.threshold[internal & (engine.feature == j)]
+        if not thresholds.size:
+            continue
+        picks = rng.choice(thresholds, size=per_feature).astype(np.float32)
+        for value in (picks, np.nextafter(picks, np.float32(-np.inf)), np.nextafter(picks, np.float32(np.inf))):
+            rows = X[rng.integers(0, len(X), per_feature)].copy()
+            rows[:, j] = value
+            out.append(rows)
+    return np.concatenate(out)
+
+
+def missing_rows(X, n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = X[rng.integers(0, len(X), n)].copy()
+    rows[np.arange(n), rng.integers(0, X.shape[1], n)] = np.nan
+    return rows
+
+
+def compare(name, model, engine, cases):
+    failures = 0
+    for case, X in cases.items():
+        expected = model.predict_proba(X)
+        labels = model.predict(X)
+
+        batch_ok = np.array_equal(expected, engine.predict_proba(X)) and np.array_equal(labels, engine.predict(X))
+        row_ok = all(
+            np.array_equal(expected[i], engine.predict_row_proba(X[i])) and engine.predict_row(X[i]) == labels[i]
+            for i in range(len(X))
+        )
+        ok = batch_ok and row_ok
+        failures += not ok
+        print(f"   {'✅' if ok else '❌'} {name:<24} {case:<9} {len(X):6d} rows  "
+              f"batch {'identical' if batch_ok else 'DIFFERS'}  single-row {'identical' if row_ok else 'DIFFERS'}")
+    return failures
+
+
+def main():
+    failures = 0
+    for name, pickle_path, rows in (
+        ("crop", "models/crop_model.pkl", crop_rows),
+        ("fertilizer", "models/fertilizer_model.pkl", fertilizer_rows),
+    ):
+        if not os.path.exists(pickle_path):
+            print(f"⚠️ {pickle_path} not found, skipped")
+            continue
+        model = joblib.load(pickle_path)
+        X = rows()
+        engine = ForestEngine.from_sklearn(model)
+        cases = {"csv": X, "boundary": boundary_rows(X, engine), "missing": missing_rows(X)}
+        print(f"📊 {name}: {model.n_estimators} trees, depth {engine.depth}")
+
+        failures += compare(f"{name} engine", model, engine, cases)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, os.path.basename(forest_path_for(pickle_path)))
+            export_forest(model, path)
+            failures += compare(f"{name} export", model, load_forest(path), cases)
+
+        shipped = forest_path_for(pickle_path)
+        if os.path.isdir(shipped):
+            failures += compare(f"{name} {os.path.basename(shipped)}", model,
+                                load_forest(shipped, source_path=pickle_path), cases)
+
+    if failures:
+        print(f"❌ {failures} parity check(s) failed")
+        sys.exit(1)
+    print("✅ Forest engine matches scikit-learn exactly")
+
+
+if __name__ == "__main__":
+    main()
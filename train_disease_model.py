@@ -3,12 +3,16 @@
 import os
 import json
 import matplotlib.pyplot as plt
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import numpy as np
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import ModelCheckpoint
 
+from disease_data import make_shard_train_val, make_train_val
+from image_cache import log_cache_stats
+from disease_outputs import fit_calibration, save_calibration
+
 # --------------------------------------------
 # 🌿 PATH CONFIGURATION
 # --------------------------------------------
@@ -16,37 +20,37 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATASET_PATH = r"D:\AgriFusionF\AgriFusion-AI\data"  # ✅ Update this path if needed
 MODEL_SAVE_PATH = os.path.join(BASE_DIR, "models", "plant_disease_prediction_model.h5")
 CLASS_INDICES_PATH = os.path.join(BASE_DIR, "class_indices.json")
-
-# --------------------------------------------
-# 🧩 IMAGE DATA GENERATOR (AUGMENTATION)
-# --------------------------------------------
-datagen = ImageDataGenerator(
-    rescale=1.0 / 255,
-    rotation_range=25,
-    zoom_range=0.25,
-    horizontal_flip=True,
-    width_shift_range=0.1,
-    height_shift_range=0.1,
-    shear_range=0.1,
-    validation_split=0.2
-)
-
-# --------------------------------------------
-# 🧠 TRAINING & VALIDATION GENERATORS
-# --------------------------------------------
-train_gen = datagen.flow_from_directory(
-    DATASET_PATH,
-    target_size=(224, 224),
-    batch_size=32,
-    subset="training"
-)
-
-val_gen = datagen.flow_from_directory(
-    DATASET_PATH,
-    target_size=(224, 224),
-    batch_size=32,
-    subset="validation"
-)
+CALIBRATION_PATH = os.path.join(BASE_DIR, "models", "disease_calibration.json")
+
+# --------------------------------------------
+# 🧩 TF.DATA INPUT PIPELINE (AUGMENTATION)
+# --------------------------------------------
+# Parallel decode + batch augmentation + prefetch (see disease_data.py).
+# Each image is decoded and resized once, into RAM up to TRAIN_CACHE_RAM_MB
+# and into TRAIN_CACHE_DIR on disk beyond that ("memory" keeps everything
+# in RAM); see image_cache.py. Cache stats are printed after every epoch
+# and appended to models/image_cache_stats.jsonl.
+# Set TRAIN_SHARDS_DIR to train from shards made by build_image_shards.py.
+shards_dir = os.environ.get("TRAIN_SHARDS_DIR")
+cache_setting = os.environ.get("TRAIN_CACHE_DIR", os.path.join(BASE_DIR, "cache", "images"))
+cache_dir = None if cache_setting == "memory" else cache_setting
+CACHE_STATS_PATH = os.path.join(BASE_DIR, "models", "image_cache_stats.jsonl")
+
+if shards_dir:
+    train_ds, val_ds, class_indices, image_caches = make_shard_train_val(
+        shards_dir,
+        batch_size=32,
+        validation_split=0.2
+    )
+else:
+    train_ds, val_ds, class_indices, image_caches = make_train_val(
+        DATASET_PATH,
+        batch_size=32,
+        validation_split=0.2,
+        cache_dir=cache_dir,
+        ram_mb=float(os.environ.get("TRAIN_CACHE_RAM_MB", 2048))
+    )
+num_classes = len(class_indices)
 
 # --------------------------------------------
 # 🧱 CNN MODEL ARCHITECTURE
@@ -65,7 +69,7 @@ model = Sequential([
     Flatten(),
     Dense(256, activation="relu"),
     Dropout(0.5),
-    Dense(train_gen.num_classes, activation="softmax")
+    Dense(num_classes, activation="softmax")
 ])
 
 # --------------------------------------------
@@ -92,10 +96,10 @@ checkpoint = ModelCheckpoint(
 # --------------------------------------------
 print("🚀 Training started...")
 history = model.fit(
-    train_gen,
-    validation_data=val_gen,
+    train_ds,
+    validation_data=val_ds,
     epochs=10,  # start with 10 for testing, increase to 25 later
-    callbacks=[checkpoint]
+    callbacks=[checkpoint] + ([log_cache_stats(image_caches, CACHE_STATS_PATH)] if image_caches else [])
 )
 print("✅ Training completed!")
 
@@ -106,9 +110,36 @@ model.save(MODEL_SAVE_PATH)
 print(f"✅ Model saved to: {MODEL_SAVE_PATH}")
 
 with open(CLASS_INDICES_PATH, "w") as f:
-    json.dump(train_gen.class_indices, f)
+    json.dump(class_indices, f)
 print(f"✅ Class indices saved to: {CLASS_INDICES_PATH}")
 
+# --------------------------------------------
+# 🎯 TEMPERATURE CALIBRATION
+# --------------------------------------------
+# One temperature fitted on the validation split (minimum NLL). app.py uses
+# it to report calibrated confidences; set CALIBRATE=0 to skip.
+if os.environ.get("CALIBRATE", "1").lower() not in ("0", "false", "no"):
+    val_probs, val_labels = [], []
+    for images, labels in val_ds:
+        val_probs.append(model.predict_on_batch(images))
+        val_labels.append(np.argmax(labels, axis=1))
+    calibration = fit_calibration(np.concatenate(val_probs), np.concatenate(val_labels))
+    save_calibration(calibration, CALIBRATION_PATH)
+    print(f"✅ Temperature {calibration['temperature']:.3f} saved to: {CALIBRATION_PATH} "
+          f"(NLL {calibration['nllBefore']:.4f} -> {calibration['nllAfter']:.4f}, "
+          f"ECE {calibration['eceBefore']:.4f} -> {calibration['eceAfter']:.4f})")
+
+# --------------------------------------------
+# 📦 OPTIONAL: TFLITE EXPORT FOR CPU SERVING
+# --------------------------------------------
+# Set EXPORT_TFLITE=1 (or run export_disease_model.py later) to also write
+# a .tflite copy for DISEASE_BACKEND=tflite.
+if os.environ.get("EXPORT_TFLITE", "").lower() in ("1", "true", "yes"):
+    from export_disease_model import export_tflite
+    tflite_path = os.path.splitext(MODEL_SAVE_PATH)[0] + ".tflite"
+    export_tflite(model, tflite_path, quantize="none")
+    print(f"✅ TFLite model saved to: {tflite_path}")
+
 # --------------------------------------------
 # 📊 PLOT ACCURACY AND LOSS
 # --------------------------------------------
@@ -0,0 +1,110 @@
+# train_forests.py
+#
+# Cross-validated hyperparameter search for the crop and fertilizer
+# RandomForests, run across all cores. Every (params, fold) fit is one
+# joblib task. Encoded features and fold splits are cached under
+# cache/training/ (keyed by the CSV's content hash), so reruns and extra
+# trials skip the CSV parsing and encoding. Each trial records CV
+# accuracy, fit time, compact model size and single-row latency on the
+# serving engine. The model that is saved is the fastest point of the
+# accuracy/latency Pareto front within --max-accuracy-drop of the best.
+#   python train_forests.py                          # both models, full grid
+#   python train_forests.py --model crop --trials 40 # random subset of the grid
+#   python train_forests.py --dry-run                # report only, keep models/
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+
+from forest_training import (
+    DATASETS, cv_folds, fit_final, holdout_split, load_dataset, pareto_front, param_candidates,
+    run_trial, save_model, select_model, summarize,
+)
+
+
+def format_params(params):
+    return ", ".join(f"{k}={v}" for k, v in params.items())
+
+
+def search(name, args):
+    start = time.perf_counter()
+    dataset = load_dataset(name)
+    train_idx, test_idx = holdout_split(dataset)
+    folds = cv_folds(dataset, train_idx, k=args.folds, seed=args.seed)
+    candidates = param_candidates(trials=args.trials, seed=args.seed)
+    print(f"📊 {name}: {len(dataset.y)} rows, {len(candidates)} candidates x {len(folds)} folds "
+          f"on {args.jobs if args.jobs > 0 else os.cpu_count()} worker(s) "
+          f"(data + folds ready in {time.perf_counter() - start:.2f} s)")
+
+    start = time.perf_counter()
+    # X and y are memory-mapped into the workers by joblib, not copied per task
+    fold_results = Parallel(n_jobs=args.jobs)(
+        delayed(run_trial)(params, dataset.X, dataset.y, tr, te, args.seed)
+        for params in candidates for tr, te in folds
+    )
+    print(f"   search took {time.perf_counter() - start:.1f} s")
+
+    results = [
+        summarize(params, fold_results[i * len(folds):(i + 1) * len(folds)])
+        for i, params in enumerate(candidates)
+    ]
+    front = pareto_front(results)
+    chosen = select_model(front, args.max_accuracy_drop)
+
+    print(f"   {'accuracy':>9} {'±':>6} {'row ms':>7} {'fit s':>6} {'size KB':>8}  params (★ = Pareto front)")
+    for r in sorted(results, key=lambda r: -r["accuracy"])[:args.show]:
+        mark = "★" if r in front else " "
+        print(f" {mark} {r['accuracy']:9.4f} {r['accuracyStd']:6.4f} {r['rowLatencyMs']:7.3f} "
+              f"{r['fitSeconds']:6.2f} {r['sizeBytes'] / 1024:8.0f}  {format_params(r['params'])}")
+    print(f"   selected: {format_params(chosen['params'])} "
+          f"(CV accuracy {chosen['accuracy']:.4f}, {chosen['rowLatencyMs']:.3f} ms/row)")
+
+    model = fit_final(dataset, chosen["params"], train_idx, seed=args.seed)
+    holdout = float(np.mean(model.predict(dataset.frame(test_idx)) == dataset.y[test_idx]))
+    print(f"   holdout accuracy {holdout:.4f}")
+
+    report = {
+        "model": name,
+        "csv": DATASETS[name]["csv"],
+        "csvDigest": dataset.digest,
+        "folds": len(folds),
+        "seed": args.seed,
+        "selected": chosen,
+        "holdoutAccuracy": holdout,
+        "paretoFront": front,
+        "trials": results,
+    }
+    if args.dry_run:
+        return report
+
+    path = save_model(name, model, dataset.encoders)
+    report_path = os.path.splitext(path)[0] + "_search.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Saved {path} (+ .forest export) and {report_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter search for the RandomForests")
+    parser.add_argument("--model", choices=list(DATASETS) + ["all"], default="all")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--trials", type=int, help="Random subset of the grid (default: full grid)")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel fits (-1 = all cores)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005,
+                        help="Accuracy the selected model may give up for speed")
+    parser.add_argument("--show", type=int, default=15, help="Trials to print")
+    parser.add_argument("--dry-run", action="store_true", help="Search and report without saving models")
+    args = parser.parse_args()
+
+    for name in (list(DATASETS) if args.model == "all" else [args.model]):
+        search(name, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
+from forest_artifacts import export_forest, forest_path_for
 import matplotlib
 matplotlib.use('Agg')   # non-GUI backend for saving plots
 import matplotlib.pyplot as plt
@@ -46,6 +47,10 @@ os.makedirs("models", exist_ok=True)
 joblib.dump(model, "models/crop_model.pkl")
 print("✅ Saved model to models/crop_model.pkl")
 
+# Compact memory-mapped copy that app.py loads (see forest_artifacts.py)
+export_forest(model, forest_path_for("models/crop_model.pkl"), source_path="models/crop_model.pkl")
+print("✅ Exported models/crop_model.forest")
+
 # 7) Plot Accuracy & Precision (optional)
 labels = [lab for lab in report.keys() if lab not in ('accuracy', 'macro avg', 'weighted avg')]
 precisions = [report[label]['precision'] for label in labels]
@@ -0,0 +1,371 @@
+# update_forests.py
+#
+# Incremental retraining of the crop and fertilizer RandomForests as new
+# field rows are appended to the CSVs.
+#
+# models/<model>.manifest.json records which rows the live model has
+# already seen: the byte length and content hash of the CSV prefix it was
+# trained on, and one hash per row. An update then parses and encodes only
+# the new rows. It warm-starts a few extra trees on them, mixed with a
+# replay sample of older rows drawn per class, so every class stays
+# represented by several rows. The number of new trees is proportional to
+# the share of new rows.
+#
+# Every update is saved as a new version under models/versions/<model>/
+# and then promoted to the live pickle + .forest export.
+#
+# A full refit (same hyperparameters, all rows) happens instead when:
+#   - rows were edited or removed
+#   - the new rows bring a label or category the model has never seen
+#   - the live pickle was replaced by another script
+#   - the forest has grown past --max-growth times its base size
+#
+#   python update_forests.py                        # both models
+#   python update_forests.py --model crop --dry-run
+#   python update_forests.py --adopt                # register the current models as v1
+#   python update_forests.py --full                 # force a full refit
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import math
+import os
+import shutil
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_artifacts import export_forest, forest_path_for
+from forest_training import CACHE_DIR, DATASETS, encode_frame, model_paths, save_model
+
+VERSIONS_DIR = os.path.join("models", "versions")
+MANIFEST_VERSION = 1
+
+
+def manifest_path(name):
+    return os.path.splitext(DATASETS[name]["model"])[0] + ".manifest.json"
+
+
+def version_dir(name, version):
+    return os.path.join(VERSIONS_DIR, name, f"v{version:04d}")
+
+
+def rows_cache_path(name, version):
+    return os.path.join(CACHE_DIR, f"{name}-rows-v{version:04d}.npz")
+
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtimeNs": st.st_mtime_ns}
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+# ---------------- CSV Rows ----------------
+class Rows:
+    def __init__(self, X, y, hashes):
+        self.X = X
+        self.y = y
+        self.hashes = hashes
+
+    def __len__(self):
+        return len(self.y)
+
+    def take(self, idx):
+        return Rows(self.X[idx], self.y[idx], self.hashes[idx])
+
+    def concat(self, other):
+        return Rows(np.concatenate([self.X, other.X]), np.concatenate([self.y, other.y]),
+                    np.concatenate([self.hashes, other.hashes]))
+
+
+def split_lines(text):
+    lines = text.splitlines()
+    return lines[0], [line for line in lines[1:] if line.strip()]
+
+
+def parse_rows(name, header, lines, encoders=None):
+    # One hash per raw CSV line, so hashing doesn't depend on how pandas infers dtypes
+    hashes = pd.util.hash_array(np.array([line.strip() for line in lines], dtype=object))
+    df = pd.read_csv(io.StringIO("\n".join([header] + lines)))
+    X, y, encoders = encode_frame(name, df, encoders)
+    return Rows(X, y, hashes), encoders
+
+
+def load_rows_cache(name, version):
+    path = rows_cache_path(name, version)
+    if not os.path.exists(path):
+        return None
+    cached = np.load(path, allow_pickle=False)
+    return Rows(cached["X"], cached["y"], cached["hashes"])
+
+
+def save_rows_cache(name, version, rows):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.savez(rows_cache_path(name, version), X=rows.X, y=rows.y, hashes=rows.hashes)
+    for old in glob.glob(os.path.join(CACHE_DIR, f"{name}-rows-v*.npz")):
+        if old != rows_cache_path(name, version):
+            os.remove(old)
+
+
+# ---------------- Versions ----------------
+def load_manifest(name):
+    path = manifest_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_encoders(name, directory=None):
+    return {k: joblib.load(p) for k, p in model_paths(name, directory).items() if k != "model"}
+
+
+def publish(name, model, encoders, manifest, keep):
+    # Write the version directory first, then swap each live file in with os.replace
+    directory = version_dir(name, manifest["version"])
+    shutil.rmtree(directory, ignore_errors=True)
+    save_model(name, model, encoders, directory=directory)
+
+    versioned = model_paths(name, directory)
+    live = model_paths(name)
+    for key in [k for k in live if k != "model"] + ["model"]:
+        if key == "model" or encoders:
+            tmp = f"{live[key]}.tmp-{os.getpid()}"
+            shutil.copyfile(versioned[key], tmp)
+            os.replace(tmp, live[key])
+    export_forest(model, forest_path_for(live["model"]), source_path=live["model"])
+
+    manifest["modelStamp"] = stamp(live["model"])
+    for path in (os.path.join(directory, "manifest.json"), manifest_path(name)):
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, path)
+
+    versions = sorted(glob.glob(os.path.join(VERSIONS_DIR, name, "v*")))
+    for old in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(old, ignore_errors=True)
+    return directory
+
+
+def new_manifest(name, previous, csv_bytes, csv_digest, rows, model, base_trees, entry):
+    history = (previous or {}).get("history", []) + [entry]
+    return {
+        "manifestVersion": MANIFEST_VERSION,
+        "model": name,
+        "version": entry["version"],
+        "updatedAt": entry["updatedAt"],
+        "csv": DATASETS[name]["csv"],
+        "csvBytes": csv_bytes,
+        "csvDigest": csv_digest,
+        "rows": len(rows),
+        "classes": [str(c) for c in model.classes_],
+        "baseTrees": base_trees,
+        "nEstimators": len(model.estimators_),
+        "params": {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        "history": history,
+    }
+
+
+# ---------------- Training ----------------
+def full_fit(name, header, lines, params, jobs):
+    rows, encoders = parse_rows(name, header, lines)
+    model = RandomForestClassifier(**{**params, "warm_start": False, "n_jobs": jobs})
+    model.fit(frame(name, rows.X), rows.y)
+    # Serving scores one row at a time; don't carry a parallel predict setting
+    model.n_jobs = None
+    return model, rows, encoders
+
+
+def frame(name, X):
+    # Fit and score on DataFrames so the models keep feature_names_in_
+    return pd.DataFrame(X, columns=DATASETS[name]["features"])
+
+
+def replay_sample(old, delta, ratio, classes, per_class, rng):
+    # warm_start re-derives classes_ from the fit data, so every known class
+    # has to appear, and with a few rows each: a window of one row per class
+    # would give trees that each see a handful of labels once. The window is
+    # ratio x the new rows, at least per_class x the classes, drawn per class
+    # in proportion to the older rows.
+    n = min(len(old), max(int(math.ceil(ratio * len(delta))), per_class * len(classes)))
+    labels, inverse, counts = np.unique(old.y, return_inverse=True, return_counts=True)
+    quota = np.minimum(counts, np.maximum(per_class, np.round(n * counts / len(old)).astype(np.int64)))
+    idx = np.concatenate([rng.choice(np.flatnonzero(inverse == i), size=q, replace=False)
+                          for i, q in enumerate(quota)])
+    return old.take(np.sort(idx))
+
+
+def trees_to_add(args, old, delta):
+    return max(args.min_trees, int(math.ceil(args.base_trees * len(delta) / (len(old) + len(delta)))))
+
+
+def warm_start(name, model, old, delta, added, args):
+    replay = replay_sample(old, delta, args.replay, model.classes_, args.replay_per_class,
+                           np.random.default_rng(args.seed))
+    window = delta.concat(replay)
+
+    classes = model.classes_.copy()
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + added, n_jobs=args.jobs)
+    model.fit(frame(name, window.X), window.y)
+    model.set_params(warm_start=False, n_jobs=None)
+    if not np.array_equal(model.classes_, classes):
+        raise RuntimeError(f"{name}: classes changed during warm start")
+    return len(window)
+
+
+def plan_delta(name, manifest, data, header, lines, encoders):
+    # -> ("incremental", old rows, new rows) or ("full", reason, None)
+    csv_bytes = manifest["csvBytes"]
+    old = load_rows_cache(name, manifest["version"])
+    appended = len(data) >= csv_bytes and digest(data[:csv_bytes]) == manifest["csvDigest"]
+
+    if appended:
+        if old is None:
+            # Rows cache was cleared: rebuild it from the already-trained prefix
+            _, old_lines = split_lines(data[:csv_bytes].decode("utf-8"))
+            old, _ = parse_rows(name, header, old_lines, encoders)
+        _, new_lines = split_lines(header + "\n" + data[csv_bytes:].decode("utf-8"))
+    else:
+        if old is None:
+            return "full", "CSV was rewritten and the rows cache is gone", None
+        # Rewritten file: new rows are the ones whose hash isn't accounted for yet
+        seen = Counter(old.hashes.tolist())
+        hashes = pd.util.hash_array(np.array([line.strip() for line in lines], dtype=object))
+        new_lines = []
+        for line, h in zip(lines, hashes.tolist()):
+            if seen[h] > 0:
+                seen[h] -= 1
+            else:
+                new_lines.append(line)
+        if any(count > 0 for count in seen.values()):
+            return "full", f"{sum(seen.values())} trained row(s) were edited or removed", None
+
+    if not new_lines:
+        return "incremental", old, None
+    try:
+        delta, _ = parse_rows(name, header, new_lines, encoders)
+    except ValueError as e:
+        return "full", f"new rows have an unseen category ({e})", None
+    unseen = np.setdiff1d(delta.y, np.asarray(manifest["classes"]))
+    if unseen.size:
+        return "full", f"new rows have unseen label(s) {', '.join(map(str, unseen))}", None
+    return "incremental", old, delta
+
+
+def update(name, args):
+    start = time.perf_counter()
+    spec = DATASETS[name]
+    with open(spec["csv"], "rb") as f:
+        data = f.read()
+    csv_digest = digest(data)
+    header, lines = split_lines(data.decode("utf-8"))
+    live_model = model_paths(name)["model"]
+    manifest = load_manifest(name)
+    args.base_trees = (manifest or {}).get("baseTrees") or spec["params"].get("n_estimators", 100)
+
+    entry = {"updatedAt": now(), "rowsAdded": 0, "treesAdded": 0}
+    reason = None
+    if args.adopt:
+        # Register the current model as trained on every row in the CSV
+        model = joblib.load(live_model)
+        rows, encoders = parse_rows(name, header, lines, load_encoders(name) or None)
+        entry.update(mode="adopted", rowsAdded=len(rows))
+        args.base_trees = len(model.estimators_)
+    elif manifest is None:
+        mode, reason = "full", "no manifest yet"
+    elif args.full:
+        mode, reason = "full", "--full"
+    elif not os.path.exists(live_model) or stamp(live_model) != manifest.get("modelStamp"):
+        mode, reason = "full", f"{live_model} was replaced outside update_forests.py"
+    elif csv_digest == manifest["csvDigest"]:
+        print(f"✅ {name}: up to date at v{manifest['version']} ({manifest['rows']} rows, "
+              f"{manifest['nEstimators']} trees) in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return manifest
+    else:
+        encoders = load_encoders(name) or None
+        mode, old, delta = plan_delta(name, manifest, data, header, lines, encoders)
+        if mode == "full":
+            reason = old
+        elif delta is None:
+            # Only blank lines or reordered rows: record the new CSV state, keep the model
+            model = joblib.load(live_model)
+            rows = old
+            entry.update(mode="rehashed")
+        else:
+            model = joblib.load(live_model)
+            added = trees_to_add(args, old, delta)
+            if len(model.estimators_) + added > args.base_trees * args.max_growth:
+                mode, reason = "full", f"forest would exceed {args.max_growth:g}x its {args.base_trees} base trees"
+            else:
+                accuracy = float(np.mean(model.predict(frame(name, delta.X)) == delta.y))
+                window = warm_start(name, model, old, delta, added, args)
+                rows = old.concat(delta)
+                entry.update(mode="incremental", rowsAdded=len(delta), treesAdded=added,
+                             windowRows=window, deltaAccuracyBefore=accuracy)
+
+    if not args.adopt and mode == "full":
+        params = dict(spec["params"])
+        if os.path.exists(live_model):
+            params = joblib.load(live_model).get_params()
+        params["n_estimators"] = args.base_trees
+        model, rows, encoders = full_fit(name, header, lines, params, args.jobs)
+        entry.update(mode="full", reason=reason, rowsAdded=len(rows), treesAdded=len(model.estimators_))
+
+    entry["version"] = (manifest or {}).get("version", 0) + 1
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    new = new_manifest(name, manifest, len(data), csv_digest, rows, model, args.base_trees, entry)
+
+    detail = f" ({reason})" if reason else ""
+    if "deltaAccuracyBefore" in entry:
+        detail += f", old model scored {entry['deltaAccuracyBefore']:.3f} on the new rows"
+    print(f"📊 {name}: {entry['mode']}{detail}: +{entry['rowsAdded']} rows, +{entry['treesAdded']} trees "
+          f"-> {new['rows']} rows, {new['nEstimators']} trees in {entry['seconds']:.2f} s")
+    if args.dry_run:
+        return new
+
+    directory = publish(name, model, encoders if entry["mode"] in ("full", "adopted") else None, new, args.keep)
+    save_rows_cache(name, new["version"], rows)
+    print(f"✅ {name}: v{new['version']} saved to {directory} and promoted to {live_model}")
+    return new
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally retrain the RandomForests on new CSV rows")
+    parser.add_argument("--model", choices=list(DATASETS) + ["all"], default="all")
+    parser.add_argument("--full", action="store_true", help="Refit on every row instead of warm-starting")
+    parser.add_argument("--adopt", action="store_true",
+                        help="Register the current models as trained on the current CSVs, without fitting")
+    parser.add_argument("--min-trees", type=int, default=5, help="Trees added per incremental update, at least")
+    parser.add_argument("--replay", type=float, default=3.0,
+                        help="Older rows replayed per new row in an incremental fit")
+    parser.add_argument("--replay-per-class", type=int, default=5,
+                        help="Older rows of each class replayed in an incremental fit, at least")
+    parser.add_argument("--max-growth", type=float, default=2.0,
+                        help="Full refit once the forest would exceed this multiple of its base size")
+    parser.add_argument("--keep", type=int, default=5, help="Versions kept under models/versions/")
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dry-run", action="store_true", help="Fit and report without saving")
+    args = parser.parse_args()
+
+    for name in (list(DATASETS) if args.model == "all" else [args.model]):
+        update(name, args)
+
+
+if __name__ == "__main__":
+    main()